@@ -0,0 +1,116 @@
+# check_startup.py
+# python3
+
+"""
+Check the startup budget of the bptool package: importing it, using its
+light routines (print_results, preprocess_csv), and running the
+command-line interface for --help or with invalid arguments must not
+import numpy, and must spend at most --budget_ms milliseconds (default
+50) importing modules beyond those the interpreter imports by itself.
+
+Each case is run in a fresh interpreter with python -X importtime, and
+the import time attributed to it is the sum of the "self" times of the
+modules it imports that a bare interpreter does not.  The fastest of
+--repeat runs is kept.
+    python benchmarks/check_startup.py
+exits with status 1 if any case is over budget or imports numpy.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Default largest import time allowed per case, in milliseconds.
+BUDGET_MS = 50.0
+
+# Each case is (name, interpreter arguments).
+CASES = [
+    ("import bptool", ["-c", "import bptool"]),
+    ("light routines", ["-c", "from bptool import print_results, "
+                              "preprocess_csv"]),
+    ("--help", ["-m", "bptool", "--help"]),
+    ("invalid arguments", ["-m", "bptool", "--contest_file", "x.bpc",
+                           "--path_to_csv", "x.csv"]),
+]
+
+
+def import_times(args):
+    """
+    Run the interpreter with args under -X importtime, and return the
+    pair (wall-clock seconds, dict mapping each module imported to its
+    "self" import time in microseconds).
+    """
+
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                          capture_output=True, text=True, cwd=REPO)
+    seconds = time.perf_counter() - start
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_us)
+    return seconds, times
+
+
+def measure(args, baseline, repeat):
+    """
+    Return the pair (milliseconds of import time beyond baseline, sorted
+    list of the modules imported beyond baseline), from the fastest of
+    repeat runs of the interpreter with args.
+    """
+
+    best = None
+    for _ in range(repeat):
+        _, times = import_times(args)
+        extra = {name: us for name, us in times.items()
+                 if name not in baseline}
+        ms = sum(extra.values()) / 1000.0
+        if best is None or ms < best[0]:
+            best = (ms, sorted(extra))
+    return best
+
+
+def main():
+    """
+    Parse command-line arguments, run the cases and report.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Check the startup budget of bptool.")
+    parser.add_argument("--budget_ms", type=float, default=BUDGET_MS,
+                        help="Largest import time allowed per case, in "
+                             "milliseconds.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of runs per case; the fastest is kept.")
+    args = parser.parse_args()
+
+    _, baseline = import_times(["-c", "pass"])
+    failures = []
+    print("{:<20s} {:>10s}  {}".format("case", "import ms", "modules"))
+    for name, case_args in CASES:
+        ms, modules = measure(case_args, baseline, args.repeat)
+        numpy_loaded = any(module == "numpy" or module.startswith("numpy.")
+                           for module in modules)
+        flag = ""
+        if numpy_loaded:
+            flag = "  IMPORTS NUMPY"
+        elif ms > args.budget_ms:
+            flag = "  OVER BUDGET"
+        if flag:
+            failures.append(name)
+        print("{:<20s} {:10.1f}  {}{}".format(name, ms, len(modules), flag))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+
+    main()
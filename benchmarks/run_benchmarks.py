@@ -0,0 +1,403 @@
+# run_benchmarks.py
+# python3
+
+"""
+Benchmarks for the simulation hot path of bptool.py.
+
+Synthetic elections are generated along several axes (number of
+counties, number of candidates, sample size, vote_for_n and number of
+trials), and the following routines are timed on them:
+    dirichlet_multinomial
+    compute_winner (given lists, or a Contest)
+    compute_win_probs (loop and vectorized engines)
+    preprocess_csv and load_csv_arrays
+    read_contest_file
+For each case the wall-clock time, the trials per second (where that
+makes sense) and the peak memory traced by tracemalloc are recorded.
+
+The results are written as JSON, together with the git commit, the
+Python and NumPy versions and the platform, so that runs of different
+commits can be compared:
+    python benchmarks/run_benchmarks.py --output before.json
+    ... change the code ...
+    python benchmarks/run_benchmarks.py --output after.json \\
+        --compare before.json
+The comparison lists every case that got slower by more than
+--threshold (default 20%) and by more than --min_slowdown seconds per
+run (default 5 ms), and exits with status 1 if there is any.  Cases
+faster than MIN_ROUND_SECONDS are run several times per timed round, so
+that their times are stable enough to compare.
+
+Use --suite full for the larger cases (up to 10000 counties and 50
+candidates); the default quick suite runs in well under a minute.
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import bptool  # noqa: E402
+
+
+##############################################################################
+## Synthetic elections
+##############################################################################
+
+def make_election(num_counties, num_candidates, sample_size, seed=0):
+    """
+    Generate a synthetic multi-county election.
+
+    Input Parameters:
+
+    -num_counties and num_candidates give the shape of the election.
+
+    -sample_size is the number of ballots sampled in each county.
+
+    -seed seeds the generator, so that every run benchmarks the same
+    election.
+
+    Returns:
+
+    -sample_tallies, total_num_votes and candidate_names, as for
+    bptool.compute_win_probs.  The candidates' vote shares decrease
+    geometrically, and each county has between 10 and 100 times as many
+    votes as it has sampled ballots.
+    """
+
+    rs = np.random.default_rng(seed)
+    shares = 0.8 ** np.arange(num_candidates)
+    shares /= shares.sum()
+    sample_tallies = rs.multinomial(sample_size, shares, size=num_counties)
+    total_num_votes = sample_size * rs.integers(10, 101, size=num_counties)
+    candidate_names = ["cand{}".format(j) for j in range(num_candidates)]
+    return sample_tallies, total_num_votes, candidate_names
+
+
+def write_election_csv(path, sample_tallies, total_num_votes,
+                       candidate_names):
+    """
+    Write an election in the csv format read by bptool.preprocess_csv.
+    """
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["County Name", "Total Votes"] + candidate_names)
+        for i, sample_tally in enumerate(sample_tallies):
+            writer.writerow(["county{}".format(i), int(total_num_votes[i])] +
+                            [int(k) for k in sample_tally])
+
+
+##############################################################################
+## Benchmark cases
+##############################################################################
+
+# Each case is (benchmark, parameters).  The trial counts are chosen so
+# that each case takes roughly a second or less on a laptop.
+QUICK_SUITE = [
+    ("dirichlet_multinomial", dict(counties=1, candidates=2, sample=100,
+                                   calls=20000)),
+    ("dirichlet_multinomial", dict(counties=1, candidates=20, sample=100,
+                                   calls=20000)),
+    ("compute_winner", dict(counties=10, candidates=5, sample=100,
+                            vote_for_n=1, trials=500)),
+    ("compute_winner", dict(counties=10, candidates=5, sample=100,
+                            vote_for_n=1, trials=500, contest=True)),
+    ("compute_win_probs", dict(counties=1, candidates=3, sample=100,
+                               vote_for_n=1, trials=10000, engine="loop")),
+    ("compute_win_probs", dict(counties=1, candidates=3, sample=100,
+                               vote_for_n=1, trials=100000,
+                               engine="vectorized")),
+    ("compute_win_probs", dict(counties=64, candidates=5, sample=50,
+                               vote_for_n=1, trials=200, engine="loop")),
+    ("compute_win_probs", dict(counties=64, candidates=5, sample=50,
+                               vote_for_n=1, trials=10000,
+                               engine="vectorized")),
+    ("compute_win_probs", dict(counties=64, candidates=5, sample=50,
+                               vote_for_n=2, trials=10000,
+                               engine="vectorized")),
+    ("compute_scenario_win_probs", dict(counties=64, candidates=5,
+                                        sample=50, vote_for_n=1,
+                                        trials=10000, priors="1,0.5,2")),
+    ("preprocess_csv", dict(counties=10000, candidates=10, sample=20)),
+    ("load_csv_arrays", dict(counties=10000, candidates=10, sample=20)),
+    ("read_contest_file", dict(counties=10000, candidates=10, sample=20)),
+]
+
+FULL_SUITE = QUICK_SUITE + [
+    ("dirichlet_multinomial", dict(counties=1, candidates=50, sample=1000,
+                                   calls=20000)),
+    ("compute_winner", dict(counties=1000, candidates=5, sample=20,
+                            vote_for_n=1, trials=20)),
+    ("compute_win_probs", dict(counties=1, candidates=50, sample=1000,
+                               vote_for_n=5, trials=100000,
+                               engine="vectorized")),
+    ("compute_win_probs", dict(counties=1000, candidates=5, sample=20,
+                               vote_for_n=1, trials=10000,
+                               engine="vectorized")),
+    ("compute_win_probs", dict(counties=10000, candidates=2, sample=5,
+                               vote_for_n=1, trials=2000,
+                               engine="vectorized")),
+    ("compute_win_probs", dict(counties=100, candidates=20, sample=100,
+                               vote_for_n=3, trials=10000,
+                               engine="vectorized")),
+    ("preprocess_csv", dict(counties=200000, candidates=30, sample=20)),
+    ("load_csv_arrays", dict(counties=200000, candidates=30, sample=20)),
+    ("read_contest_file", dict(counties=200000, candidates=30, sample=20)),
+]
+
+SUITES = {"quick": QUICK_SUITE, "full": FULL_SUITE}
+
+# Each timed round of a case runs it enough times to take at least this
+# many seconds; a single run of a millisecond case is mostly noise.
+MIN_ROUND_SECONDS = 0.1
+
+
+def run_case(benchmark, params, seed, temp_dir):
+    """
+    Run one benchmark case, and return the pair (seconds, trials), where
+    trials is the number of trials (or calls) done, or None if trials per
+    second is not meaningful for the benchmark.
+    """
+
+    sample_tallies, total_num_votes, candidate_names = make_election(
+        params["counties"], params["candidates"], params["sample"])
+
+    if benchmark == "dirichlet_multinomial":
+        rs = bptool.create_rs(seed)
+        sample_tally = list(sample_tallies[0])
+        total = int(total_num_votes[0])
+        start = time.perf_counter()
+        for _ in range(params["calls"]):
+            bptool.dirichlet_multinomial(sample_tally, total, rs)
+        return time.perf_counter() - start, params["calls"]
+
+    if benchmark == "compute_winner":
+        sample_tallies = [list(k) for k in sample_tallies]
+        total_num_votes = list(total_num_votes)
+        if params.get("contest"):
+            # Convert once, as compute_win_probs does, rather than on
+            # every call.
+            sample_tallies = bptool.Contest(sample_tallies, total_num_votes)
+        start = time.perf_counter()
+        for i in range(params["trials"]):
+            bptool.compute_winner(sample_tallies, total_num_votes,
+                                  params["vote_for_n"], seed + i)
+        return time.perf_counter() - start, params["trials"]
+
+    if benchmark == "compute_win_probs":
+        start = time.perf_counter()
+        bptool.compute_win_probs(sample_tallies, total_num_votes, seed,
+                                 params["trials"], candidate_names,
+                                 params["vote_for_n"],
+                                 engine=params["engine"])
+        return time.perf_counter() - start, params["trials"]
+
+    if benchmark == "compute_scenario_win_probs":
+        scenarios = [bptool.Scenario("prior " + prior, float(prior))
+                     for prior in params["priors"].split(",")]
+        start = time.perf_counter()
+        bptool.compute_scenario_win_probs(sample_tallies, total_num_votes,
+                                          seed, params["trials"],
+                                          candidate_names, scenarios,
+                                          params["vote_for_n"])
+        return time.perf_counter() - start, params["trials"]
+
+    if benchmark in ("preprocess_csv", "load_csv_arrays"):
+        path = os.path.join(temp_dir, "election_{}_{}.csv".format(
+            params["counties"], params["candidates"]))
+        if not os.path.exists(path):
+            write_election_csv(path, sample_tallies, total_num_votes,
+                               candidate_names)
+        start = time.perf_counter()
+        getattr(bptool, benchmark)(path)
+        return time.perf_counter() - start, None
+
+    if benchmark == "read_contest_file":
+        path = os.path.join(temp_dir, "election_{}_{}.bpc".format(
+            params["counties"], params["candidates"]))
+        if not os.path.exists(path):
+            bptool.write_contest_file(path, bptool.Contest(
+                sample_tallies, total_num_votes, candidate_names))
+        start = time.perf_counter()
+        bptool.read_contest_file(path)
+        return time.perf_counter() - start, None
+
+    raise ValueError("run_case: unknown benchmark {}.".format(benchmark))
+
+
+def measure(benchmark, params, seed, temp_dir, repeat):
+    """
+    Time a case in repeat rounds, keeping the fastest, then run it once
+    more under tracemalloc for its peak memory, and return a dict
+    describing the result.
+
+    A first, untimed run measures the case.  If it takes less than
+    MIN_ROUND_SECONDS, every round runs the case enough times to take
+    that long, and the seconds recorded are the mean per run.
+    """
+
+    seconds, trials = run_case(benchmark, params, seed, temp_dir)
+    runs_per_round = max(1, int(np.ceil(MIN_ROUND_SECONDS /
+                                        max(seconds, 1e-6))))
+
+    best_seconds = None
+    for _ in range(repeat):
+        round_seconds = 0.0
+        for _ in range(runs_per_round):
+            seconds, trials = run_case(benchmark, params, seed, temp_dir)
+            round_seconds += seconds
+        seconds = round_seconds / runs_per_round
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+
+    tracemalloc.start()
+    run_case(benchmark, params, seed, temp_dir)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {"benchmark": benchmark,
+              "params": params,
+              "seconds": best_seconds,
+              "runs_per_round": runs_per_round,
+              "peak_bytes": peak_bytes}
+    if trials is not None:
+        result["trials_per_sec"] = trials / best_seconds
+    return result
+
+
+def case_name(result):
+    """
+    Return a string identifying a case, used to match cases across runs.
+    """
+
+    params = ",".join("{}={}".format(k, result["params"][k])
+                      for k in sorted(result["params"]))
+    return "{}({})".format(result["benchmark"], params)
+
+
+##############################################################################
+## Reporting and comparison
+##############################################################################
+
+def environment():
+    """
+    Return a dict describing the code and machine benchmarked.
+    """
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit or None,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+def compare(results, baseline, threshold, min_slowdown=0.005):
+    """
+    Compare results with those of a baseline run, print a table of the
+    ratios of their times, and return the names of the cases that got
+    slower by more than threshold (a fraction) and by more than
+    min_slowdown seconds per run.  The absolute floor keeps timer and
+    scheduling noise on millisecond cases from counting as regressions.
+    """
+
+    baseline_seconds = {case_name(r): r["seconds"]
+                        for r in baseline["results"]}
+    regressions = []
+    print("{:<100s} {:>8s}".format("case", "ratio"))
+    for result in results:
+        name = case_name(result)
+        if name not in baseline_seconds:
+            continue
+        ratio = result["seconds"] / baseline_seconds[name]
+        flag = ""
+        slowdown = result["seconds"] - baseline_seconds[name]
+        if ratio > 1.0 + threshold and slowdown > min_slowdown:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:<100s} {:8.2f}{}".format(name, ratio, flag))
+    return regressions
+
+
+def main():
+    """
+    Parse command-line arguments, run the benchmarks and write results.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for the simulation hot path of bptool.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick",
+                        help="Which set of cases to run.")
+    parser.add_argument("--filter", default=None,
+                        help="Only run benchmarks whose name contains "
+                             "this string.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed rounds per case; the "
+                             "fastest is kept.")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Audit seed used in the simulations.")
+    parser.add_argument("--output", default=None,
+                        help="File to write the JSON results to.")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of an earlier run to compare "
+                             "against.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="With --compare: slowdown (as a fraction) "
+                             "above which a case counts as a regression.")
+    parser.add_argument("--min_slowdown", type=float, default=0.005,
+                        help="With --compare: slowdown in seconds per run "
+                             "below which a case never counts as a "
+                             "regression.")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for benchmark, params in SUITES[args.suite]:
+            if args.filter and args.filter not in benchmark:
+                continue
+            result = measure(benchmark, params, args.seed, temp_dir,
+                             args.repeat)
+            results.append(result)
+            print("{:<100s} {:9.4f} s {:>14s} {:8.1f} MB".format(
+                case_name(result), result["seconds"],
+                ("{:.0f}/s".format(result["trials_per_sec"])
+                 if "trials_per_sec" in result else ""),
+                result["peak_bytes"] / 2.0 ** 20))
+            sys.stdout.flush()
+
+    report = {"environment": environment(),
+              "suite": args.suite,
+              "repeat": args.repeat,
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold,
+                   args.min_slowdown):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,145 @@
+# bptool/__init__.py
+# Authors: Ronald L. Rivest, Mayuri Sridhar, Zara A Perumal
+# April 22, 2018
+# python3
+
+"""
+This package provides routines for computing the winning probabilities
+for various candidates, given audit sample data, using a Bayesian
+model, in a ballot-polling audit of a plurality election.  The
+election may be single-jurisdiction or multi-jurisdiction.  In this
+package we call a jurisdiction a "county" for convenience, although it
+may be a precinct or a state or something else, as long as you can
+sample from its collection of paper ballots.
+
+The Bayesian model uses a prior pseudocount of "+1" for each candidate
+(compute_scenario_win_probs compares the results of other pseudocounts).
+
+If this package is imported, rather than used stand-alone, then the procedure
+    compute_win_probs
+can compute the desired probability of each candidate winning a full recount,
+given sample tallies for each county.  Importing the package is cheap: each
+of its modules (and numpy) is only loaded when one of its names is first
+used, as in bptool.compute_win_probs or "from bptool import print_results".
+The tallies may be given as lists, or as a Contest, which holds them
+as numpy arrays together with the quantities derived from them; a
+Contest can be reused across calls without being converted again.
+
+For command-line usage, there are really two modes:
+
+(1) For single-county usage, give a command like:
+        python bptool.py 10000 60 50 30
+    (or equivalently, python -m bptool 10000 60 50 30)
+    where
+        10000 is the total number of votes cast in the county
+        60 50 30  are the votes seen for each candidate in the auditing so far
+
+(2) For multiple-county usage, give a command like
+        python bptool.py --path_to_csv test.csv
+    where test.csv is a file like:
+        county name, total votes, Alice, Bob
+        1, 1000, 30, 15
+        2, 2000, 40, 50
+    with one header line, then one line per county.  The field names
+    "county name" and "total votes" are required; the candidate names are
+    the candidate names for the contest being audited.
+
+There are optional parameters as well, to see the documentation of them, do
+    python bptool.py --h
+
+More description of Bayesian auditing methods can be found in:
+
+    A Bayesian Method for Auditing Elections
+    by Ronald L. Rivest and Emily Shen
+    EVN/WOTE'12 Proceedings
+    http://people.csail.mit.edu/rivest/pubs.html#RS12z
+
+    Bayesian Tabulation Audits: Explained and Extended
+    by Ronald L. Rivest 
+    2018
+    http://people.csail.mit.edu/rivest/pubs.html#Riv18a    
+
+    Bayesian Election Audits in One Page
+    by Ronald L. Rivest
+    2018
+    http://people.csail.mit.edu/rivest/pubs.html#Riv18b    
+"""
+
+import importlib
+
+# The public names of the package, by the module that defines them.
+# They are imported lazily, by __getattr__, on first use.
+_MODULE_NAMES = {
+    "rng": ["AuditStreams", "convert_int_to_32_bit_numpy_array", "create_rs",
+            "trial_blocks", "TRIALS_PER_BLOCK"],
+    "modes": ["ENGINES", "RNG_MODES"],
+    "instrumentation": ["PhaseTimer", "ProgressEvent"],
+    "contest": ["as_contest", "ComparisonStratum", "Contest",
+                "CONTEST_FILE_ALIGNMENT", "CONTEST_FILE_MAGIC",
+                "CONTEST_FILE_VERSION", "CSV_CHUNK_ROWS", "load_csv_arrays",
+                "read_comparison_csv", "read_contest_file",
+                "SCALAR_GAMMA_MAX_CANDIDATES", "write_contest_file"],
+    "simulation": ["compute_block_win_count", "compute_win_count",
+                   "compute_win_probs", "compute_winner",
+                   "dirichlet_multinomial", "dirichlet_multinomial_batch",
+                   "draw_comparison_tallies", "draw_comparison_tally",
+                   "draw_nonsample_tallies", "draw_nonsample_tally",
+                   "generate_nonsample_tally", "profiled_block_win_count",
+                   "simulate_block_vectorized", "top_n_candidates"],
+    "adaptive": ["ADAPTIVE_BATCH_TRIALS", "adaptive_stop",
+                 "all_block_batch_win_counts", "block_batch_win_counts",
+                 "compute_win_probs_adaptive", "wilson_interval"],
+    "state": ["AuditState", "simulate_county_vectorized"],
+    "cache": ["ResultCache"],
+    "batch": ["BatchContest", "read_batch_file", "run_batch",
+              "write_batch_results"],
+    "analytic": ["ANALYTIC_STREAM_KEY", "compute_win_probs_analytic",
+                 "regularized_incomplete_beta"],
+    "planning": ["level_upper_risk", "plan_sample_sizes",
+                 "PLANNING_STREAM_KEY", "upper_risk"],
+    "pooling": ["FULLY_AUDITED_STRATUM", "pool_counties", "PooledStratum"],
+    "rare": ["compute_rare_win_probs", "RARE_EVENT_MIN_PILOT_WINS",
+             "RARE_EVENT_STREAM_KEY", "RARE_EVENT_TILTS", "RareWinProb",
+             "rival_candidate", "tilt_shift", "tilted_alphas",
+             "tilted_block_win_moments", "tilted_final_tallies",
+             "tilted_win_moments"],
+    "scenarios": ["compute_scenario_win_probs",
+                  "draw_coupled_nonsample_tallies", "read_scenarios_file",
+                  "Scenario", "scenario_block_win_counts",
+                  "scenario_county_groups", "ScenarioSweep"],
+    "service": ["AuditClient", "AuditJob", "AuditServer", "HTTP_REASONS",
+                "parse_win_probs_request", "serve"],
+    "outcomes": ["record_trial_outcomes", "simulate_final_tallies_block",
+                 "trial_margins", "TrialOutcomes"],
+    "stats": ["compute_contest_stats", "contest_stats_block", "ContestStats"],
+    "textio": ["preprocess_csv", "print_contest_stats", "print_plan",
+               "print_pooling", "print_profile", "print_rare_win_probs",
+               "print_results", "print_scenarios"],
+    "cli": ["main"],
+}
+
+_NAME_MODULES = {name: module
+                 for module, names in _MODULE_NAMES.items()
+                 for name in names}
+
+__all__ = sorted(_NAME_MODULES)
+
+
+def __getattr__(name):
+    """
+    Import the module defining name, and return name's value from it.
+    The value is also stored in the package, so that this is only called
+    once per name.
+    """
+
+    if name not in _NAME_MODULES:
+        raise AttributeError("module {!r} has no attribute {!r}"
+                             .format(__name__, name))
+    module = importlib.import_module("." + _NAME_MODULES[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_NAME_MODULES))
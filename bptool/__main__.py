@@ -0,0 +1,13 @@
+# bptool/__main__.py
+# python3
+
+"""
+Run the command-line interface: python -m bptool ...
+"""
+
+from .cli import main
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,275 @@
+# bptool/adaptive.py
+# python3
+
+"""
+Adaptive (sequential) simulation, which stops once the win probabilities
+are known precisely enough.
+"""
+
+import concurrent.futures
+import functools
+import statistics
+
+import numpy as np
+
+from .contest import as_contest
+from .modes import ENGINES
+from .rng import AuditStreams, trial_blocks
+from .simulation import (compute_winner, simulate_block_vectorized,
+                         top_n_candidates)
+
+
+##############################################################################
+## Adaptive (sequential) simulation
+##############################################################################
+
+# Number of trials between two checks of the stopping rule of
+# compute_win_probs_adaptive, and so the least number of trials it runs.
+ADAPTIVE_BATCH_TRIALS = 250
+
+def wilson_interval(successes, trials, confidence):
+    """
+    Compute Wilson score confidence intervals for binomial proportions.
+
+    Input Parameters:
+
+    -successes is an integer or numpy array of integers, the number of
+    successes observed.
+
+    -trials is the (positive) number of trials.
+
+    -confidence is the confidence level of the interval, e.g. 0.95.
+
+    Returns:
+
+    -(low, high), two numpy arrays (or floats) with the shape of
+    successes, giving the ends of the interval for each proportion.
+    """
+
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2.0)
+    p = np.asarray(successes, dtype=np.float64) / trials
+    denominator = 1.0 + z * z / trials
+    center = (p + z * z / (2.0 * trials)) / denominator
+    half_width = (z / denominator *
+                  np.sqrt(p * (1.0 - p) / trials +
+                          z * z / (4.0 * trials * trials)))
+    return center - half_width, center + half_width
+
+
+def adaptive_stop(win_count, trials, vote_for_n, target_width,
+                  confidence, risk_limit):
+    """
+    Decide whether an adaptive run of compute_win_probs_adaptive may stop.
+
+    Input Parameters:
+
+    -win_count is a numpy array giving each candidate's number of wins
+    in the first trials trials.
+
+    -trials is the number of trials run so far.
+
+    -vote_for_n, target_width, confidence and risk_limit are as for
+    compute_win_probs_adaptive.
+
+    Returns:
+
+    -True if every candidate's confidence interval is at most
+    target_width wide, or if risk_limit is not None and, for each of the
+    vote_for_n candidates currently winning most often, the interval for
+    its upper risk (the probability that it loses) lies entirely on one
+    side of risk_limit; False otherwise.
+    """
+
+    low, high = wilson_interval(win_count, trials, confidence)
+    if np.all(high - low <= target_width):
+        return True
+    if risk_limit is None:
+        return False
+    leaders = np.argsort(win_count, kind="stable")[-vote_for_n:]
+    for leader in leaders:
+        # The upper risk is 1 - p, so its interval is [1 - high, 1 - low].
+        if 1.0 - high[leader] <= risk_limit <= 1.0 - low[leader]:
+            return False
+    return True
+
+
+def block_batch_win_counts(sample_tallies, total_num_votes, seed,
+                           num_trials, vote_for_n, engine, batch_trials,
+                           block_index):
+    """
+    Run the trials of one block (see trial_blocks) of an audit of
+    num_trials trials in consecutive batches of batch_trials trials (the
+    last one may be shorter), drawing every batch from the block's county
+    streams where the batch before left them, and yield the win counts of
+    each batch as it is done.
+
+    With the "loop" engine the trials are exactly those of
+    compute_block_win_count.  With the "vectorized" engine each batch is
+    simulated by simulate_block_vectorized, so the trials differ from
+    those of compute_block_win_count unless batch_trials is at least the
+    block size.  Either way, they only depend on the block and on
+    batch_trials.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, vote_for_n and
+    engine are as for compute_win_probs.
+
+    -batch_trials is the number of trials per batch.
+
+    -block_index is the index of the block to run.
+
+    Returns:
+
+    -a generator of pairs (trials, win_count), one per batch: trials is
+    the number of trials of the batch, and win_count the numpy array of
+    int64 giving the number of those trials in which each candidate was
+    among the top vote_for_n candidates.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    _, start, stop = trial_blocks(num_trials)[block_index]
+    county_rs = AuditStreams(seed).county_streams(block_index,
+                                                  contest.num_strata)
+    for batch_start in range(start, stop, batch_trials):
+        trials = min(batch_trials, stop - batch_start)
+        win_count = np.zeros(contest.num_candidates, dtype=np.int64)
+        if engine == "vectorized":
+            final_tallies = simulate_block_vectorized(contest, None, trials,
+                                                      county_rs)
+            winners = top_n_candidates(final_tallies, vote_for_n)
+            win_count += np.bincount(winners.ravel(),
+                                     minlength=contest.num_candidates)
+        else:
+            for _ in range(trials):
+                for winner in compute_winner(contest, None, vote_for_n, None,
+                                             county_rs=county_rs):
+                    win_count[winner] += 1
+        yield trials, win_count
+
+
+def all_block_batch_win_counts(*args):
+    """
+    Return the list of all the pairs yielded by block_batch_win_counts
+    with the same arguments, as a worker process does.
+    """
+
+    return list(block_batch_win_counts(*args))
+
+
+def compute_win_probs_adaptive(sample_tallies,
+                               total_num_votes,
+                               seed,
+                               num_trials,
+                               candidate_names,
+                               vote_for_n,
+                               target_width=0.01,
+                               confidence=0.95,
+                               risk_limit=None,
+                               engine="loop",
+                               workers=1,
+                               batch_trials=ADAPTIVE_BATCH_TRIALS):
+    """
+    Like compute_win_probs, but run the trials batch by batch and stop as
+    soon as the win probabilities are known well enough, as decided by
+    adaptive_stop: when every candidate's Wilson confidence interval is
+    at most target_width wide, or when the intervals show on which side
+    of risk_limit the leaders' upper risks lie.  At most num_trials
+    trials are run, and at least batch_trials (or num_trials, if it is
+    smaller), since the rule is checked after every batch.
+
+    The blocks are those of compute_win_probs with the same seed and
+    num_trials, each run in batches of batch_trials trials (see
+    block_batch_win_counts), and the stopping rule is checked after every
+    batch in order, so the result does not depend on workers: with
+    workers > 1, rounds of workers blocks are run in parallel and any
+    batches past the stopping point are discarded, while with one worker
+    the batches are only run until the stopping point.  With the "loop"
+    engine the trials run are the first trials_used trials of
+    compute_win_probs.
+
+    Note that checking the intervals after every block makes them
+    somewhat optimistic; a higher confidence compensates for this.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, candidate_names,
+    vote_for_n, engine and workers are as for compute_win_probs.  The
+    random numbers are always generated in "streams" mode.
+
+    -batch_trials is the number of trials between two checks of the
+    stopping rule.
+
+    -target_width is a float, the desired maximum width of the confidence
+    interval of each candidate's win probability.
+
+    -confidence is a float, the confidence level of the intervals.
+
+    -risk_limit is None or a float.  If it is given, the run also stops
+    once each leading candidate's upper risk is known, with the given
+    confidence, to be below or above risk_limit.
+
+    Returns:
+
+    -win_probs is as for compute_win_probs, computed from the trials run.
+
+    -trials_used is the number of trials actually run.
+    """
+
+    if engine not in ENGINES:
+        raise ValueError("compute_win_probs_adaptive: unknown engine {}; "
+                         "expected one of {}.".format(engine, ENGINES))
+    if workers < 1:
+        raise ValueError("compute_win_probs_adaptive: workers must be "
+                         "at least 1, not {}.".format(workers))
+    if not 0 < confidence < 1:
+        raise ValueError("compute_win_probs_adaptive: confidence {} "
+                         "is not between 0 and 1.".format(confidence))
+    if batch_trials < 1:
+        raise ValueError("compute_win_probs_adaptive: batch_trials must be "
+                         "at least 1, not {}.".format(batch_trials))
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    run_block = functools.partial(block_batch_win_counts,
+                                  contest, None, seed, num_trials,
+                                  vote_for_n, engine, batch_trials)
+    run_whole_block = functools.partial(all_block_batch_win_counts,
+                                        contest, None, seed, num_trials,
+                                        vote_for_n, engine, batch_trials)
+    blocks = trial_blocks(num_trials)
+
+    win_count = np.zeros(contest.num_candidates, dtype=np.int64)
+    trials_used = 0
+    executor = None
+    if workers > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+        for round_start in range(0, len(blocks), workers):
+            round_indices = range(round_start,
+                                  min(round_start + workers, len(blocks)))
+            if executor is None:
+                round_batches = map(run_block, round_indices)
+            else:
+                round_batches = executor.map(run_whole_block, round_indices)
+            stop = False
+            for batches in round_batches:
+                for batch_trials_done, batch_win_count in batches:
+                    win_count += batch_win_count
+                    trials_used += batch_trials_done
+                    if adaptive_stop(win_count, trials_used, vote_for_n,
+                                     target_width, confidence, risk_limit):
+                        stop = True
+                        break
+                if stop:
+                    break
+            if stop:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    win_probs = [(i + 1, int(win_count[i])/float(trials_used))
+                 for i in range(len(win_count))]
+    return win_probs, trials_used
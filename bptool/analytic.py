@@ -0,0 +1,182 @@
+# bptool/analytic.py
+# python3
+
+"""
+Analytic approximation of the win probabilities of single-county
+contests.
+"""
+
+import math
+
+import numpy as np
+
+from .contest import as_contest
+from .rng import AuditStreams
+from .simulation import compute_win_probs, top_n_candidates
+
+
+##############################################################################
+## Analytic approximation for single-county contests
+##############################################################################
+
+# Spawn key of the stream of the Dirichlet samples of
+# compute_win_probs_analytic; distinct from the simulation streams, so the
+# samples are independent of the check run's trials, and from
+# PLANNING_STREAM_KEY and RARE_EVENT_STREAM_KEY.
+ANALYTIC_STREAM_KEY = 2 ** 32 + 2
+
+
+def regularized_incomplete_beta(x, a, b):
+    """
+    Compute the regularized incomplete beta function I_x(a, b), i.e. the
+    probability that a Beta(a, b) random variable is at most x, by the
+    continued fraction of Numerical Recipes (Press et al., section 6.4),
+    evaluated with the modified Lentz method.
+
+    Input Parameters:
+
+    -x is a float between 0 and 1.
+
+    -a and b are positive floats.
+
+    Returns:
+
+    -the value of I_x(a, b), a float between 0 and 1.
+    """
+
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    # The continued fraction converges quickly for x < (a+1)/(a+b+2);
+    # otherwise use the symmetry I_x(a, b) = 1 - I_{1-x}(b, a).
+    if x > (a + 1.0) / (a + b + 2.0):
+        return 1.0 - regularized_incomplete_beta(1.0 - x, b, a)
+
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) +
+                 a * math.log(x) + b * math.log1p(-x))
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    fraction = d
+    for m in range(1, 100000):
+        # Even step.
+        numerator = m * (b - m) * x / ((a + 2*m - 1.0) * (a + 2*m))
+        d = 1.0 + numerator * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + numerator / c
+        c = c if abs(c) > tiny else tiny
+        fraction *= d * c
+        # Odd step.
+        numerator = -(a + m) * (a + b + m) * x / ((a + 2*m) * (a + 2*m + 1.0))
+        d = 1.0 + numerator * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + numerator / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        fraction *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return math.exp(log_front) * fraction / a
+
+
+def compute_win_probs_analytic(sample_tallies,
+                               total_num_votes,
+                               seed,
+                               candidate_names,
+                               vote_for_n,
+                               num_samples=100000,
+                               check_trials=1000):
+    """
+    Approximate the win probabilities of a single-county contest without
+    simulating the unsampled ballots one by one.
+
+    When the number of unsampled votes N is large, the Dirichlet-multinomial
+    simulation of dirichlet_multinomial is close to its continuous limit:
+    the final tally is sample_tally + N * p, where the vote shares p follow
+    the Dirichlet posterior with parameters sample_tally + 1.  For two
+    candidates (and vote_for_n 1), candidate 0 wins when p_0 exceeds
+    (s_1 - s_0 + N) / (2N), so its win probability is a Beta tail, which
+    is computed with regularized_incomplete_beta.  For more candidates,
+    num_samples vote-share vectors are drawn from the Dirichlet posterior
+    in one array operation, which is much cheaper than simulating the
+    ballots.
+
+    The error of the approximation is estimated by comparing it with
+    check_trials trials of the exact simulation (the "vectorized" engine
+    of compute_win_probs).
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, candidate_names and vote_for_n
+    are as for compute_win_probs; there must be exactly one county.
+
+    -num_samples is the number of Dirichlet samples used for more than
+    two candidates.
+
+    -check_trials is the number of exact trials run to estimate the error;
+    zero skips the check.
+
+    Returns:
+
+    -win_probs is as for compute_win_probs.
+
+    -error_estimate is a dict with keys "method" ("beta" or "dirichlet"),
+    "approximation_std_error" (the Monte Carlo standard error of the
+    approximation itself; zero for "beta"), "check_trials",
+    "max_abs_difference" (the largest difference between the approximate
+    and the exact simulated win probabilities, or None if check_trials is
+    zero) and "check_std_error" (the largest standard error of the exact
+    simulated win probabilities).
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if contest.num_counties != 1 or contest.comparison_strata:
+        raise ValueError("compute_win_probs_analytic: only single-county "
+                         "ballot-polling contests are supported, not {} "
+                         "counties and {} comparison strata."
+                         .format(contest.num_counties,
+                                 len(contest.comparison_strata)))
+    sample_tally = contest.sample_tallies[0]
+    nonsample_size = int(contest.nonsample_sizes[0])
+    num_candidates = contest.num_candidates
+    alphas = contest.alphas[0]
+
+    if num_candidates == 2 and vote_for_n == 1 and nonsample_size > 0:
+        method = "beta"
+        threshold = ((sample_tally[1] - sample_tally[0] + nonsample_size) /
+                     (2.0 * nonsample_size))
+        prob_0 = 1.0 - regularized_incomplete_beta(
+            threshold, float(alphas[0]), float(alphas[1]))
+        probs = np.array([prob_0, 1.0 - prob_0])
+        approximation_std_error = 0.0
+    else:
+        method = "dirichlet"
+        rs = AuditStreams(seed).stream(ANALYTIC_STREAM_KEY)
+        shares = rs.dirichlet(alphas, size=num_samples)
+        final_tallies = sample_tally + nonsample_size * shares
+        winners = top_n_candidates(final_tallies, vote_for_n)
+        probs = (np.bincount(winners.ravel(), minlength=num_candidates) /
+                 float(num_samples))
+        approximation_std_error = float(
+            np.sqrt(probs * (1.0 - probs) / num_samples).max())
+
+    max_abs_difference = None
+    check_std_error = None
+    if check_trials > 0:
+        check_probs = compute_win_probs(contest, None,
+                                        seed, check_trials, None,
+                                        vote_for_n, engine="vectorized")
+        check_probs = np.array([prob for _, prob in check_probs])
+        max_abs_difference = float(np.abs(probs - check_probs).max())
+        check_std_error = float(
+            np.sqrt(check_probs * (1.0 - check_probs) / check_trials).max())
+
+    win_probs = [(i + 1, float(probs[i])) for i in range(num_candidates)]
+    error_estimate = {"method": method,
+                      "approximation_std_error": approximation_std_error,
+                      "check_trials": check_trials,
+                      "max_abs_difference": max_abs_difference,
+                      "check_std_error": check_std_error}
+    return win_probs, error_estimate
@@ -0,0 +1,229 @@
+# bptool/batch.py
+# python3
+
+"""
+Running many contests in one process or pool of worker processes.
+"""
+
+import collections
+import concurrent.futures
+import csv
+import os
+
+import numpy as np
+
+from .contest import as_contest, load_csv_arrays
+from .rng import trial_blocks
+from .simulation import compute_block_win_count
+
+
+##############################################################################
+## Multi-contest batch runs
+##############################################################################
+
+# One contest of a batch run.  sample_tallies, total_num_votes,
+# candidate_names and vote_for_n are as for compute_win_probs.
+BatchContest = collections.namedtuple(
+    "BatchContest",
+    ["name", "sample_tallies", "total_num_votes", "candidate_names",
+     "vote_for_n"])
+
+
+def read_batch_file(path, vote_for_n=1):
+    """
+    Read the contests of a batch run from a file, which is either
+
+    (1) a manifest: a csv file with columns "contest" and "path", and
+        optionally "vote for n", with one line per contest; path is the
+        csv file of the contest, in the format of preprocess_csv, and is
+        relative to the directory of the manifest; or
+
+    (2) a long-format csv file with columns "contest", "county name",
+        "total votes", "candidate" and "votes", and optionally
+        "vote for n", with one line per (contest, county, candidate).
+        Candidates missing from a county have zero votes there.
+
+    Input Parameters:
+
+    -path is a string, the path of the file.
+
+    -vote_for_n is the vote_for_n of contests that do not give one.
+
+    Returns:
+
+    -contests is a list of BatchContest, in the order in which they first
+    appear in the file; their tallies are numpy arrays.
+    """
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [col.strip().lower() for col in next(reader, [])]
+        rows = [dict(zip(header, [field.strip() for field in row]))
+                for row in reader if row]
+
+    contests = []
+    if "path" in header:
+        for row in rows:
+            contest_path = os.path.join(os.path.dirname(path), row["path"])
+            sample_tallies, total_num_votes, candidate_names = \
+                load_csv_arrays(contest_path)
+            contests.append(BatchContest(
+                row["contest"], sample_tallies, total_num_votes,
+                candidate_names, int(row.get("vote for n") or vote_for_n)))
+        return contests
+
+    required = ["contest", "county name", "total votes", "candidate",
+                "votes"]
+    missing = [col for col in required if col not in header]
+    if missing:
+        raise ValueError("read_batch_file: {} is neither a manifest nor a "
+                         "long-format file; it lacks columns {}."
+                         .format(path, missing))
+    # contest name -> [counties, candidates, votes, totals, vote_for_n]
+    parts = collections.OrderedDict()
+    for row in rows:
+        counties, candidates, votes, totals, _ = parts.setdefault(
+            row["contest"],
+            [{}, {}, {}, {}, int(row.get("vote for n") or vote_for_n)])
+        county = counties.setdefault(row["county name"], len(counties))
+        candidate = candidates.setdefault(row["candidate"], len(candidates))
+        count = int(row["votes"])
+        if count < 0:
+            raise ValueError("read_batch_file: negative votes in contest "
+                             "{}, county {}.".format(row["contest"],
+                                                     row["county name"]))
+        votes[county, candidate] = votes.get((county, candidate), 0) + count
+        total = int(row["total votes"])
+        if totals.setdefault(county, total) != total:
+            raise ValueError("read_batch_file: inconsistent total votes "
+                             "for contest {}, county {}."
+                             .format(row["contest"], row["county name"]))
+    for name, (counties, candidates, votes, totals, n) in parts.items():
+        sample_tallies = np.zeros((len(counties), len(candidates)),
+                                  dtype=np.int64)
+        for (county, candidate), count in votes.items():
+            sample_tallies[county, candidate] = count
+        total_num_votes = np.array([totals[i] for i in range(len(counties))],
+                                   dtype=np.int64)
+        if np.any(sample_tallies.sum(axis=1) > total_num_votes):
+            raise ValueError("read_batch_file: contest {} has a county "
+                             "whose sample exceeds its total votes."
+                             .format(name))
+        contests.append(BatchContest(name, sample_tallies, total_num_votes,
+                                     list(candidates), n))
+    return contests
+
+
+# The contests of the batch run in progress, in each worker process of
+# run_batch; set once per worker by _init_batch_worker.
+_batch_contests = None
+
+
+def _init_batch_worker(contests):
+    global _batch_contests
+    _batch_contests = contests
+
+
+def _run_batch_block(contest_index, block_index, seed, num_trials,
+                     engine, rng_mode):
+    contest = _batch_contests[contest_index]
+    return compute_block_win_count(contest.sample_tallies, None, seed,
+                                   num_trials, contest.vote_for_n,
+                                   block_index, engine, rng_mode)
+
+
+def run_batch(contests, seed, num_trials, engine="loop", rng_mode="streams",
+              workers=1):
+    """
+    Compute the win probabilities of many contests in one process (or one
+    pool of workers processes).  Each contest gives the same results as
+    compute_win_probs with the same seed, num_trials, engine and
+    rng_mode.
+
+    With workers > 1, a single pool of processes is shared by all the
+    contests.  Each worker receives the contests' tallies once, when it
+    starts, and the blocks of trials of all the contests are then
+    scheduled largest contest first (by counties x candidates), so that
+    the pool stays busy until the end.
+
+    Input Parameters:
+
+    -contests is a list of BatchContest.
+
+    -seed, num_trials, engine, rng_mode and workers are as for
+    compute_win_probs.
+
+    Returns:
+
+    -results is a list giving, for each contest in order, its win_probs
+    as returned by compute_win_probs.
+    """
+
+    if engine == "vectorized" and rng_mode == "legacy":
+        raise ValueError("run_batch: the vectorized engine "
+                         "does not support rng_mode legacy.")
+    if seed is None and rng_mode == "streams":
+        seed = np.random.SeedSequence().entropy
+    # Each contest's tallies are converted to a Contest once, here.
+    contests = [contest._replace(
+                    sample_tallies=as_contest(contest.sample_tallies,
+                                              contest.total_num_votes,
+                                              contest.candidate_names),
+                    total_num_votes=None)
+                for contest in contests]
+    order = sorted(range(len(contests)),
+                   key=lambda i: contests[i].sample_tallies.alphas.size,
+                   reverse=True)
+    tasks = [(i, block_index)
+             for i in order
+             for block_index in range(len(trial_blocks(num_trials)))]
+
+    win_counts = [np.zeros(len(contest.candidate_names), dtype=np.int64)
+                  for contest in contests]
+    if workers <= 1:
+        _init_batch_worker(contests)
+        try:
+            for i, block_index in tasks:
+                win_counts[i] += _run_batch_block(i, block_index, seed,
+                                                  num_trials, engine,
+                                                  rng_mode)
+        finally:
+            _init_batch_worker(None)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=_init_batch_worker,
+                initargs=(contests,)) as executor:
+            futures = {executor.submit(_run_batch_block, i, block_index,
+                                       seed, num_trials, engine, rng_mode): i
+                       for i, block_index in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                win_counts[futures[future]] += future.result()
+
+    return [[(j + 1, int(win_count[j])/float(num_trials))
+             for j in range(len(win_count))]
+            for win_count in win_counts]
+
+
+def write_batch_results(output, contests, results):
+    """
+    Write the results of run_batch as one csv table, with columns
+    contest, candidate, vote for n and win probability.
+
+    Input Parameters:
+
+    -output is a writable text file.
+
+    -contests and results are the contests given to run_batch and the
+    results it returned.
+    """
+
+    writer = csv.writer(output)
+    writer.writerow(["contest", "candidate", "vote for n",
+                     "win probability"])
+    for contest, win_probs in zip(contests, results):
+        for candidate_index, prob in win_probs:
+            writer.writerow([contest.name,
+                             str(contest.candidate_names[candidate_index - 1])
+                             .strip(),
+                             contest.vote_for_n,
+                             "{:.6f}".format(prob)])
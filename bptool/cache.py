@@ -0,0 +1,189 @@
+# bptool/cache.py
+# python3
+
+"""
+A cache of the results of compute_win_probs, in memory and on disk.
+"""
+
+import collections
+import hashlib
+import json
+import os
+
+from .contest import as_contest
+from .rng import TRIALS_PER_BLOCK
+from .simulation import compute_win_probs
+
+
+##############################################################################
+## Result cache
+##############################################################################
+
+class ResultCache:
+    """
+    A memoization layer for compute_win_probs.  With a given seed, the
+    results of compute_win_probs are fully determined by its inputs, so
+    they can be cached: a call whose inputs hash to the same key as an
+    earlier call returns the earlier result without simulating.
+
+    The cache keeps a bounded in-memory LRU of results and, optionally,
+    an on-disk store: a directory holding one small JSON file per result,
+    whose least recently used files are deleted when the directory grows
+    beyond max_bytes.  Calls with seed None are never cached.
+
+    Input Parameters:
+
+    -max_entries is the number of results kept in memory.
+
+    -directory is None, or the path of a directory (created if needed)
+    in which results are also stored.
+
+    -max_bytes is the maximum total size of the files in directory.
+    """
+
+    # Part of every key, to be changed whenever the simulation changes
+    # so that results computed by older code are not reused.
+    VERSION = 1
+
+    def __init__(self, max_entries=256, directory=None, max_bytes=2 ** 26):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def key(cls, sample_tallies, total_num_votes, seed, num_trials,
+            vote_for_n, engine, rng_mode):
+        """
+        Return the canonical hash (a hex string) of the inputs of
+        compute_win_probs that determine its result.  Tallies given as
+        lists, as numpy arrays of any integer type or as a Contest hash
+        the same.
+        """
+
+        contest = as_contest(sample_tallies, total_num_votes)
+        inputs = {"version": cls.VERSION,
+                  "trials_per_block": TRIALS_PER_BLOCK,
+                  "sample_tallies": contest.sample_tallies.tolist(),
+                  "total_num_votes": contest.total_num_votes.tolist(),
+                  "seed": int(seed),
+                  "num_trials": int(num_trials),
+                  "vote_for_n": int(vote_for_n),
+                  "engine": engine,
+                  "rng_mode": rng_mode}
+        if contest.comparison_strata:
+            inputs["comparison_strata"] = [
+                {"reported_tally": stratum.reported_tally.tolist(),
+                 "sample_matrix": stratum.sample_matrix.tolist(),
+                 "match_pseudocount": stratum.match_pseudocount,
+                 "error_pseudocount": stratum.error_pseudocount}
+                for stratum in contest.comparison_strata]
+        if contest.prior is not None:
+            inputs["prior"] = contest.prior.tolist()
+        text = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Return the result stored under key, or None.
+        """
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".json")
+            try:
+                with open(path) as f:
+                    result = [tuple(pair) for pair in json.load(f)]
+            except (OSError, ValueError):
+                return None
+            os.utime(path)
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key, result):
+        """
+        Store result under key, evicting old results as needed.
+        """
+
+        self._remember(key, result)
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + ".json")
+            temp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(temp_path, "w") as f:
+                json.dump(result, f)
+            os.replace(temp_path, path)
+            self._evict_files()
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_files(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_bytes -= size
+
+    def stats(self):
+        """
+        Return a dict of the cache's hit and miss counts and its number
+        of results held in memory.
+        """
+
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory)}
+
+    def compute_win_probs(self, sample_tallies, total_num_votes, seed,
+                          num_trials, candidate_names, vote_for_n,
+                          engine="loop", rng_mode="streams", workers=1,
+                          progress=None, timer=None):
+        """
+        Same as the module-level compute_win_probs, but return a cached
+        result when there is one, and cache newly computed results.
+        progress and timer are only called when the result is computed,
+        not when it comes from the cache.
+        """
+
+        contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+        if seed is None:
+            return compute_win_probs(contest, None, seed,
+                                     num_trials, None, vote_for_n,
+                                     engine, rng_mode, workers,
+                                     progress=progress, timer=timer)
+        key = self.key(contest, None, seed, num_trials,
+                       vote_for_n, engine, rng_mode)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return list(result)
+        self.misses += 1
+        result = compute_win_probs(contest, None, seed,
+                                   num_trials, candidate_names, vote_for_n,
+                                   engine, rng_mode, workers,
+                                   progress=progress, timer=timer)
+        self.put(key, result)
+        return list(result)
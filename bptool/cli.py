@@ -0,0 +1,595 @@
+# bptool/cli.py
+# python3
+
+"""
+The command-line interface.  The heavy modules (and numpy) are only
+imported once the arguments have been parsed, so that --help and
+argument errors are quick.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from .modes import ENGINES, RNG_MODES
+from .textio import (print_contest_stats, print_plan, print_pooling,
+                     print_profile, print_rare_win_probs, print_results,
+                     print_scenarios)
+
+
+##############################################################################
+## Command-line interface
+##############################################################################
+
+def main():
+    """
+    Parse command-line arguments, compute and print answers.
+    """
+
+    parser = argparse.ArgumentParser(description=\
+                                     'Bayesian Audit Process For'
+                                     'A Single Contest '
+                                     'Across One or More Counties')
+
+    parser.add_argument("total_num_votes",
+                        nargs="?",
+                        help="(Optional: for single-county audits:)"
+                             "The total number of votes"
+                             "(including the already audited ones) "
+                             "that were cast in the election.")
+
+    parser.add_argument("single_county_tally",
+                        help="(Optional: for single-county audits:)"
+                             " the tally given as space separated numbers,"
+                             "e.g.  5 30 25",
+                        nargs="*",
+                        default=[],
+                        type=int)
+
+    parser.add_argument("--path_to_csv",
+                        help="If the election spans multiple counties, "
+                             "the sample tallies should be given in a csv file."
+                             "Give here the csv file pathname as an argument. "
+                             "In the header row, one of the column names "
+                             "of the csv file must be Total Votes and another "
+                             "can be County Name. Other columns are the names "
+                             "or identifiers for candidates.")
+
+    parser.add_argument("--contest_file",
+                        help="Binary contest file (written by "
+                             "--save_contest) to read the contest from, "
+                             "instead of --path_to_csv.  It is "
+                             "memory-mapped, so large contests load almost "
+                             "instantly and are shared by --workers.")
+
+    parser.add_argument("--save_contest",
+                        help="Write the contest given by --path_to_csv "
+                             "(and --comparison_csv), or on the command "
+                             "line, to this binary contest file, and exit.")
+
+    parser.add_argument("--comparison_csv",
+                        help="Csv file of counties audited by comparison "
+                             "with their cast-vote records, with columns "
+                             "County Name, Reported, Reported Votes and one "
+                             "per candidate, and one line per county and "
+                             "reported candidate (see read_comparison_csv). "
+                             "They are simulated together with the "
+                             "ballot-polling counties, if any.")
+
+    parser.add_argument("--match_pseudocount",
+                        help="With --comparison_csv: prior pseudocount of "
+                             "a sampled ballot matching its cast-vote "
+                             "record (default 1, as for every other "
+                             "outcome).",
+                        type=float,
+                        default=1)
+
+    parser.add_argument("--audit_seed",
+                        help="For reproducibility, we provide the option to "
+                             "seed the randomness in the audit. If the same "
+                             "seed is provided, the audit will return the "
+                             "same results.",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--num_trials",
+                        help="Bayesian audits work by simulating the data "
+                             "which hasn't been sampled to estimate the "
+                             "chance that each candidate would win a full "
+                             "hand recount. This argument specifies how "
+                             "many trials are done to compute these "
+                             "estimates.",
+                        type=int,
+                        default=10000)
+
+    parser.add_argument("--vote_for_n",
+                        help="If we want to simulate voting for multiple "
+                        "candidates at a time, we can use this parameter "
+                        "to specify how many candidates a single voter "
+                        "can vote for. The simulations will then count a candidate"
+                        "as a winner, each time they appear in the top N "
+                        "of the candidates, in the simulated elections.",
+                        type=int,
+                        default=1)
+
+    parser.add_argument("--engine",
+                        help="Simulation engine.  The default, loop, runs "
+                             "one trial at a time.  The vectorized engine "
+                             "runs the trials in large batches of array "
+                             "operations and is much faster for contests "
+                             "with many counties or trials; its results "
+                             "for a given seed differ from those of loop.  "
+                             "--plan, --analytic, --scenarios, "
+                             "--rare_event, --contest_stats, "
+                             "--record_outcomes and --state always use "
+                             "vectorized.",
+                        choices=ENGINES,
+                        default=None)
+
+    parser.add_argument("--rng_mode",
+                        help="How random numbers are generated.  The "
+                             "default, streams, gives each county an "
+                             "independent random stream derived from "
+                             "the audit seed.  Use legacy to reproduce "
+                             "exactly the results of earlier versions "
+                             "of this tool (loop engine only).",
+                        choices=RNG_MODES,
+                        default="streams")
+
+    parser.add_argument("--adaptive",
+                        help="Stop early, once the win probabilities are "
+                             "known well enough (see --target_width and "
+                             "--risk_limit), checking every 250 trials; "
+                             "--num_trials is then the maximum number of "
+                             "trials.",
+                        action="store_true")
+
+    parser.add_argument("--target_width",
+                        help="With --adaptive: stop once every candidate's "
+                             "confidence interval for its win probability "
+                             "is at most this wide.",
+                        type=float,
+                        default=0.01)
+
+    parser.add_argument("--confidence",
+                        help="With --adaptive: confidence level of the "
+                             "intervals.",
+                        type=float,
+                        default=0.95)
+
+    parser.add_argument("--risk_limit",
+                        help="With --adaptive: also stop once it is clear "
+                             "whether the leading candidate's upper risk "
+                             "(probability of losing) is below or above "
+                             "this limit.",
+                        type=float,
+                        default=None)
+
+    parser.add_argument("--state",
+                        help="Path of an audit state file (.npz) kept "
+                             "between rounds of the audit.  If it does not "
+                             "exist, it is created from --path_to_csv.  If "
+                             "it exists, --path_to_csv may give just the "
+                             "counties whose tallies changed, and only "
+                             "those counties are resimulated.  The seed "
+                             "and number of trials stored in the state "
+                             "are used.",
+                        default=None)
+
+    parser.add_argument("--cache_dir",
+                        help="Directory in which to cache results.  A run "
+                             "with the same tallies, seed, number of "
+                             "trials and options as a cached run prints "
+                             "the cached result without simulating.",
+                        default=None)
+
+    parser.add_argument("--batch",
+                        help="Audit many contests in one run.  Give a "
+                             "manifest csv file (columns contest, path "
+                             "and optionally vote for n) or a long-format "
+                             "csv file (columns contest, county name, "
+                             "total votes, candidate, votes and optionally "
+                             "vote for n).  A combined results table is "
+                             "written as csv.",
+                        default=None)
+
+    parser.add_argument("--batch_output",
+                        help="With --batch: file to write the results "
+                             "table to, instead of standard output.",
+                        default=None)
+
+    parser.add_argument("--analytic",
+                        help="For single-county audits: approximate the "
+                             "win probabilities from the Dirichlet "
+                             "posterior directly (a Beta tail for two "
+                             "candidates) instead of simulating the "
+                             "unsampled ballots, and report the error "
+                             "against a short exact simulation.",
+                        action="store_true")
+
+    parser.add_argument("--plan",
+                        help="Instead of the win probabilities, estimate "
+                             "how many more ballots each county should "
+                             "sample for the leading candidate's upper "
+                             "risk to fall below --risk_limit (default "
+                             "5%%).  --num_trials trials are used for each "
+                             "risk computed.",
+                        action="store_true")
+
+    parser.add_argument("--num_projections",
+                        help="With --plan: number of projected future "
+                             "samples.",
+                        type=int,
+                        default=100)
+
+    parser.add_argument("--serve",
+                        help="Run as a local HTTP/JSON service computing "
+                             "win probabilities (see AuditServer), until "
+                             "interrupted.",
+                        action="store_true")
+
+    parser.add_argument("--host",
+                        help="With --serve: address to listen on.",
+                        default="127.0.0.1")
+
+    parser.add_argument("--port",
+                        help="With --serve: port to listen on.",
+                        type=int,
+                        default=8000)
+
+    parser.add_argument("--progress",
+                        help="Report the progress of the simulation (trials "
+                             "done, trials per second and running win "
+                             "counts) on standard error after every block "
+                             "of trials.",
+                        action="store_true")
+
+    parser.add_argument("--profile",
+                        help="Time each phase of the simulation (seeding, "
+                             "gamma, multinomial, tally) and print the "
+                             "times on standard error.",
+                        action="store_true")
+
+    parser.add_argument("--stats_json",
+                        help="File to write run statistics to, as JSON: "
+                             "trials, elapsed time, trials per second, the "
+                             "progress events and (with --profile) the "
+                             "phase times.",
+                        default=None)
+
+    parser.add_argument("--record_outcomes",
+                        help="Directory to write the final tallies and "
+                             "margin of every trial to, as memory-mapped "
+                             ".npy files (see TrialOutcomes).  Uses the "
+                             "vectorized engine.",
+                        default=None)
+
+    parser.add_argument("--contest_stats",
+                        help="Compute in one simulation pass (vectorized "
+                             "engine) the win probabilities for each "
+                             "vote_for_n in --vote_for_ns, each "
+                             "candidate's rank distribution, the pairwise "
+                             "probabilities and the margin quantiles.",
+                        action="store_true")
+
+    parser.add_argument("--vote_for_ns",
+                        help="With --contest_stats: comma-separated values "
+                             "of vote_for_n, e.g. 1,2 (default: "
+                             "--vote_for_n).",
+                        default=None)
+
+    parser.add_argument("--scenarios",
+                        help="JSON file of variants of the contest (prior "
+                             "pseudocount, counties excluded, what-if "
+                             "sample tallies) to compare with common random "
+                             "numbers; see read_scenarios_file.",
+                        default=None)
+
+    parser.add_argument("--rare_event",
+                        help="Estimate each candidate's probability of "
+                             "winning by importance sampling, with its "
+                             "standard error; accurate for small "
+                             "probabilities from a few thousand trials.",
+                        action="store_true")
+
+    parser.add_argument("--pool_max_sample",
+                        help="Pool the counties with at most this many "
+                             "sampled ballots into one stratum before "
+                             "simulating (see pool_counties); fully "
+                             "audited counties are never simulated.",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--hierarchical_prior",
+                        help="With --pool_max_sample: give the pooled "
+                             "stratum a prior centered on the candidates' "
+                             "shares of all the samples.",
+                        action="store_true")
+
+    parser.add_argument("--workers",
+                        help="Number of processes to run the trials in. "
+                             "The results do not depend on this number.",
+                        type=int,
+                        default=1)
+
+    args = parser.parse_args()
+    if (args.path_to_csv is None and args.total_num_votes is None
+            and args.state is None and args.batch is None
+            and args.comparison_csv is None and args.contest_file is None
+            and not args.serve):
+        parser.print_help()
+        sys.exit()
+    if args.comparison_csv and (args.batch or args.state):
+        parser.error("--comparison_csv cannot be used with --batch "
+                     "or --state")
+    if args.pool_max_sample is not None and (args.batch or args.state):
+        parser.error("--pool_max_sample cannot be used with --batch "
+                     "or --state")
+    if args.contest_file and (args.path_to_csv or args.comparison_csv):
+        parser.error("--contest_file cannot be used with --path_to_csv "
+                     "or --comparison_csv")
+    # These modes always simulate with the vectorized engine and random
+    # streams.
+    for mode in ("plan", "analytic", "scenarios", "rare_event",
+                 "contest_stats", "record_outcomes", "state"):
+        if not getattr(args, mode):
+            continue
+        if args.rng_mode != "streams":
+            parser.error("--{} requires --rng_mode streams".format(mode))
+        if args.engine not in (None, "vectorized"):
+            parser.error("--{} always uses the vectorized engine"
+                         .format(mode))
+    # Only the plain computation of the win probabilities reports its
+    # progress and phase times, and caches its result.
+    for mode in ("plan", "analytic", "scenarios", "rare_event",
+                 "contest_stats", "record_outcomes", "adaptive", "batch",
+                 "state", "serve"):
+        if not getattr(args, mode):
+            continue
+        for option in ("progress", "profile", "stats_json", "cache_dir"):
+            if getattr(args, option):
+                parser.error("--{} cannot be used with --{}"
+                             .format(option, mode))
+    if args.engine is None:
+        args.engine = "loop"
+
+    # These modules import numpy, which takes most of the startup time,
+    # so they are only loaded once the arguments have been checked.
+    from .adaptive import compute_win_probs_adaptive
+    from .analytic import compute_win_probs_analytic
+    from .batch import read_batch_file, run_batch, write_batch_results
+    from .cache import ResultCache
+    from .contest import (Contest, load_csv_arrays, read_comparison_csv,
+                          read_contest_file, write_contest_file)
+    from .instrumentation import PhaseTimer
+    from .outcomes import TrialOutcomes, record_trial_outcomes
+    from .planning import plan_sample_sizes
+    from .pooling import pool_counties
+    from .rare import compute_rare_win_probs
+    from .scenarios import compute_scenario_win_probs, read_scenarios_file
+    from .service import serve
+    from .simulation import compute_win_probs
+    from .state import AuditState
+    from .stats import compute_contest_stats
+
+    if args.serve:
+        serve(args.host, args.port, args.workers)
+        return
+
+    if args.batch:
+        contests = read_batch_file(args.batch, args.vote_for_n)
+        results = run_batch(contests, args.audit_seed, args.num_trials,
+                            engine=args.engine, rng_mode=args.rng_mode,
+                            workers=args.workers)
+        if args.batch_output:
+            with open(args.batch_output, "w", newline="") as output:
+                write_batch_results(output, contests, results)
+        else:
+            write_batch_results(sys.stdout, contests, results)
+        return
+
+    if args.state:
+        if os.path.exists(args.state):
+            state = AuditState.load(args.state)
+            resimulated = []
+            if args.path_to_csv:
+                resimulated = state.update_from_csv(args.path_to_csv)
+        elif args.path_to_csv:
+            state = AuditState.from_csv(args.path_to_csv,
+                                        args.audit_seed, args.num_trials)
+            resimulated = state.county_names
+        else:
+            parser.error("--state {} does not exist; give --path_to_csv "
+                         "to create it".format(args.state))
+        state.save(args.state)
+        print_results(state.candidate_names,
+                      state.win_probs(args.vote_for_n), args.vote_for_n)
+        print("Resimulated {} of {} counties"
+              .format(len(resimulated), len(state.county_names)))
+        return
+
+    if args.contest_file:
+        contest = read_contest_file(args.contest_file)
+        candidate_names = contest.candidate_names
+        county_names = contest.county_names
+    elif args.path_to_csv:
+        # if sample tallies are in CSV file read that
+        sample_tallies, total_num_votes, candidate_names, county_names = \
+            load_csv_arrays(args.path_to_csv, return_county_names=True)
+    elif args.total_num_votes is not None:
+        # otherwise extract desired data from command line
+        total_num_votes = [int(args.total_num_votes)]
+        sample_tallies = [args.single_county_tally]
+        candidate_names = list(range(1, len(sample_tallies[0]) + 1))
+        county_names = ["1"]
+    else:
+        # a contest audited by comparison alone
+        sample_tallies, total_num_votes = [], []
+        candidate_names, county_names = None, []
+    if not args.contest_file:
+        comparison_strata = []
+        if args.comparison_csv:
+            comparison_strata, candidate_names = read_comparison_csv(
+                args.comparison_csv, candidate_names,
+                match_pseudocount=args.match_pseudocount)
+        # The tallies are converted to a Contest once, and used by every
+        # routine below.
+        contest = Contest(sample_tallies, total_num_votes, candidate_names,
+                          county_names, comparison_strata)
+
+    if args.pool_max_sample is not None:
+        num_counties = contest.num_counties
+        contest, report = pool_counties(
+            contest, None, max_sample_size=args.pool_max_sample,
+            hierarchical_prior=args.hierarchical_prior)
+        county_names = contest.county_names
+        print_pooling(report, num_counties, len(contest.simulated_counties),
+                      file=sys.stderr)
+
+    if args.save_contest:
+        write_contest_file(args.save_contest, contest)
+        print("Wrote {} to {}".format(contest, args.save_contest))
+        return
+
+    vote_for_n = args.vote_for_n
+
+    if args.plan:
+        risk_limit = 0.05 if args.risk_limit is None else args.risk_limit
+        plan = plan_sample_sizes(contest, None,
+                                 args.audit_seed, candidate_names,
+                                 vote_for_n, risk_limit=risk_limit,
+                                 num_projections=args.num_projections,
+                                 num_trials=args.num_trials)
+        print_plan(candidate_names, county_names, contest.sample_tallies,
+                   plan, risk_limit)
+        return
+
+    if args.analytic:
+        win_probs, error_estimate = compute_win_probs_analytic(
+            contest, None, args.audit_seed,
+            candidate_names, vote_for_n)
+        print_results(candidate_names, win_probs, vote_for_n)
+        print("Approximation ({}): largest difference from {} exact "
+              "trials {:.2f} % (their standard error {:.2f} %)"
+              .format(error_estimate["method"],
+                      error_estimate["check_trials"],
+                      100 * error_estimate["max_abs_difference"],
+                      100 * error_estimate["check_std_error"]))
+        return
+
+    if args.rare_event:
+        estimates = compute_rare_win_probs(contest, None,
+                                           args.audit_seed, args.num_trials,
+                                           candidate_names, vote_for_n,
+                                           workers=args.workers)
+        print_rare_win_probs(candidate_names, estimates, vote_for_n)
+        return
+
+    if args.scenarios:
+        scenarios = read_scenarios_file(args.scenarios, county_names)
+        sweep = compute_scenario_win_probs(contest, None,
+                                           args.audit_seed, args.num_trials,
+                                           candidate_names, scenarios,
+                                           vote_for_n, workers=args.workers)
+        print_scenarios(candidate_names, sweep)
+        return
+
+    if args.contest_stats:
+        if args.vote_for_ns:
+            vote_for_ns = [int(n) for n in args.vote_for_ns.split(",")]
+        else:
+            vote_for_ns = [vote_for_n]
+        quantiles = (0.05, 0.5, 0.95)
+        stats = compute_contest_stats(contest, None,
+                                      args.audit_seed, args.num_trials,
+                                      candidate_names, vote_for_ns,
+                                      quantiles, workers=args.workers)
+        print_contest_stats(candidate_names, stats, quantiles)
+        return
+
+    if args.record_outcomes:
+        win_probs = record_trial_outcomes(
+            contest, None, args.audit_seed,
+            args.num_trials, candidate_names, vote_for_n,
+            args.record_outcomes, workers=args.workers)
+        print_results(candidate_names, win_probs, vote_for_n)
+        outcomes = TrialOutcomes(args.record_outcomes)
+        print("Trial outcomes written to {}; margin quantiles "
+              "(5%, 50%, 95%): {}"
+              .format(args.record_outcomes,
+                      outcomes.quantiles([0.05, 0.5, 0.95])))
+        return
+
+    if args.adaptive:
+        if args.rng_mode != "streams":
+            parser.error("--adaptive requires --rng_mode streams")
+        win_probs, trials_used = compute_win_probs_adaptive(\
+                    contest,
+                    None,
+                    args.audit_seed,
+                    args.num_trials,
+                    candidate_names,
+                    vote_for_n,
+                    target_width=args.target_width,
+                    confidence=args.confidence,
+                    risk_limit=args.risk_limit,
+                    engine=args.engine,
+                    workers=args.workers)
+        print_results(candidate_names, win_probs, vote_for_n)
+        print("Trials used: {} of at most {}"
+              .format(trials_used, args.num_trials))
+        return
+
+    events = []
+    timer = PhaseTimer() if args.profile else None
+    def progress(event):
+        events.append(event)
+        if args.progress:
+            print("{:>10d} of {} trials  {:10.0f} trials/s  win counts {}"
+                  .format(event.trials_done, event.num_trials,
+                          event.trials_per_sec, list(event.win_count)),
+                  file=sys.stderr)
+
+    start_time = time.perf_counter()
+    if args.cache_dir:
+        win_probs = ResultCache(directory=args.cache_dir).compute_win_probs(\
+                        contest,
+                        None,
+                        args.audit_seed,
+                        args.num_trials,
+                        candidate_names,
+                        vote_for_n,
+                        engine=args.engine,
+                        rng_mode=args.rng_mode,
+                        workers=args.workers,
+                        progress=progress,
+                        timer=timer)
+    else:
+        win_probs = compute_win_probs(\
+                        contest,
+                        None,
+                        args.audit_seed,
+                        args.num_trials,
+                        candidate_names,
+                        vote_for_n,
+                        engine=args.engine,
+                        rng_mode=args.rng_mode,
+                        workers=args.workers,
+                        progress=progress,
+                        timer=timer)
+    elapsed = time.perf_counter() - start_time
+    print_results(candidate_names, win_probs, vote_for_n)
+
+    if timer is not None:
+        print_profile(timer, elapsed, file=sys.stderr)
+    if args.stats_json:
+        stats = {"num_trials": args.num_trials,
+                 "elapsed_seconds": elapsed,
+                 "trials_per_sec": (args.num_trials / elapsed
+                                    if elapsed > 0 else None),
+                 "progress": [event._asdict() for event in events],
+                 "phases": timer.stats() if timer is not None else None}
+        with open(args.stats_json, "w") as f:
+            json.dump(stats, f, indent=2)
@@ -0,0 +1,665 @@
+# bptool/contest.py
+# python3
+
+"""
+Contests: the array-backed Contest and its comparison (CVR) strata, and
+reading contests from csv files and binary contest files.
+"""
+
+import collections
+import csv
+import functools
+import itertools
+import json
+import os
+
+import numpy as np
+
+
+##############################################################################
+## Contests
+##############################################################################
+
+# Up to this many candidates, drawing the gamma variates of a single
+# trial one at a time is faster than one array call to numpy, whose fixed
+# overhead dominates for short arrays.
+SCALAR_GAMMA_MAX_CANDIDATES = 10
+
+
+class Contest:
+    """
+    The data of a contest being audited, stored as contiguous numpy
+    arrays, together with the quantities derived from them that every
+    trial of the simulation needs.  They are computed once, when the
+    contest is built, rather than once per county per trial.
+
+    Every routine of this module that takes sample_tallies and
+    total_num_votes also accepts a Contest in place of sample_tallies;
+    its total_num_votes (and candidate_names, where there is one) may
+    then be None.  Lists given to those routines are converted to a
+    Contest once, by as_contest.
+
+    Input Parameters:
+
+    -sample_tallies is a list of lists or a 2-d array; sample_tallies[i][j]
+    is the number of votes candidate j receives in the sample of county i.
+
+    -total_num_votes is a list or 1-d array giving the total number of
+    votes cast in each county.
+
+    -candidate_names is None or a list of the candidates' names; if None,
+    the candidates are named "1", "2", ...
+
+    -county_names is None or a list of the counties' names; if None,
+    the counties are named "1", "2", ...
+
+    -comparison_strata is None or a list of ComparisonStratum: counties
+    audited by comparison with their CVRs, simulated in the same trials
+    as the ballot-polling counties given by sample_tallies (of which
+    there may then be none).  Each stratum draws from the random stream
+    that follows those of the polling counties.
+
+    -prior is None, or the prior pseudocounts of the counties: a number,
+    or an array of shape (candidates,) or (counties, candidates), such as
+    pool_counties sets.  Added to the sample tallies, they must give
+    positive Dirichlet parameters.  None means pseudocount_for_prior for
+    every county and candidate.
+
+    Attributes:
+
+    -sample_tallies is a C-contiguous int64 array of shape
+    (counties, candidates).
+
+    -total_num_votes, sample_sizes and nonsample_sizes are int64 arrays
+    with one entry per county.
+
+    -alphas is a float64 array of the shape of sample_tallies, holding
+    the parameters of each county's Dirichlet posterior (the sample
+    tallies plus the prior pseudocount).
+
+    -prior is None or a float64 array of shape (counties, candidates).
+
+    -alpha_rows gives the rows of alphas in the form that
+    draw_nonsample_tally draws from fastest: lists of floats for up to
+    SCALAR_GAMMA_MAX_CANDIDATES candidates, and arrays for more.
+
+    -simulated_counties is the list of the indices of the counties with
+    unsampled votes; the others are fully audited, and are not simulated.
+
+    -sample_total is an int64 array giving each candidate's total number
+    of votes in the samples of all the counties and comparison strata.
+
+    -num_counties and num_candidates give the shape of the polling part
+    of the contest, and num_strata is the number of polling counties
+    plus the number of comparison strata: the number of random streams
+    a trial uses.
+
+    -path is None, or the path of the contest file whose memory-mapped
+    tallies the Contest uses (see read_contest_file).
+    """
+
+    pseudocount_for_prior = 1
+
+    def __init__(self, sample_tallies, total_num_votes,
+                 candidate_names=None, county_names=None,
+                 comparison_strata=None, prior=None):
+
+        comparison_strata = list(comparison_strata or [])
+        # Arrays that are already int64 and C-contiguous (such as the
+        # memory-mapped tallies of read_contest_file) are not copied.
+        sample_tallies = np.asarray(sample_tallies, dtype=np.int64,
+                                    order="C")
+        total_num_votes = np.asarray(total_num_votes, dtype=np.int64)
+        if sample_tallies.size == 0 and comparison_strata:
+            # A contest audited by comparison alone has no polling counties.
+            sample_tallies = sample_tallies.reshape(
+                0, comparison_strata[0].num_candidates)
+            total_num_votes = total_num_votes.reshape(0)
+        elif sample_tallies.ndim != 2 or sample_tallies.size == 0:
+            raise ValueError("Contest: sample_tallies must be a non-empty "
+                             "list of lists or 2-d array.")
+        num_counties, num_candidates = sample_tallies.shape
+        for stratum in comparison_strata:
+            if stratum.num_candidates != num_candidates:
+                raise ValueError("Contest: comparison stratum {} has {} "
+                                 "candidates, not {}.".format(
+                                     stratum.name, stratum.num_candidates,
+                                     num_candidates))
+        if total_num_votes.shape != (num_counties,):
+            raise ValueError("Contest: {} sample tallies but {} total "
+                             "numbers of votes.".format(
+                                 num_counties, total_num_votes.size))
+        if (sample_tallies < 0).any():
+            raise ValueError("Contest: sample tallies must be "
+                             "non-negative.")
+        sample_sizes = sample_tallies.sum(axis=1)
+        short = np.flatnonzero(sample_sizes > total_num_votes)
+        if short.size > 0:
+            i = short[0]
+            raise ValueError("total_num_votes {} less than sample_size {}."
+                             .format(total_num_votes[i], sample_sizes[i]))
+        if prior is not None:
+            prior = np.broadcast_to(np.asarray(prior, dtype=np.float64),
+                                    sample_tallies.shape).copy()
+            if not (sample_tallies + prior > 0).all():
+                raise ValueError("Contest: the prior pseudocounts must "
+                                 "give positive Dirichlet parameters.")
+        if candidate_names is None:
+            candidate_names = [str(j + 1) for j in range(num_candidates)]
+        if county_names is None:
+            county_names = [str(i + 1) for i in range(num_counties)]
+        if len(candidate_names) != num_candidates:
+            raise ValueError("Contest: {} candidate names for {} "
+                             "candidates.".format(len(candidate_names),
+                                                  num_candidates))
+        if len(county_names) != num_counties:
+            raise ValueError("Contest: {} county names for {} counties."
+                             .format(len(county_names), num_counties))
+
+        self.sample_tallies = sample_tallies
+        self.total_num_votes = total_num_votes
+        self.candidate_names = list(candidate_names)
+        self.county_names = list(county_names)
+        self.num_counties = num_counties
+        self.num_candidates = num_candidates
+        self.sample_sizes = sample_sizes
+        self.nonsample_sizes = total_num_votes - sample_sizes
+        self.comparison_strata = comparison_strata
+        self.prior = prior
+        self.path = None
+        self.num_strata = num_counties + len(comparison_strata)
+        self.sample_total = sample_tallies.sum(axis=0)
+        for stratum in comparison_strata:
+            self.sample_total += stratum.sample_total
+
+    @classmethod
+    def from_csv(cls, path_to_csv):
+        """
+        Return the Contest read from a csv file in the format described
+        at the top of this module.
+        """
+
+        (sample_tallies, total_num_votes, candidate_names,
+         county_names) = load_csv_arrays(path_to_csv,
+                                         return_county_names=True)
+        return cls(sample_tallies, total_num_votes, candidate_names,
+                   county_names)
+
+    def __len__(self):
+        return self.num_counties
+
+    # alphas, alpha_rows and simulated_counties are only computed when
+    # first used, so that loading a large contest (see read_contest_file)
+    # stays cheap.
+    @functools.cached_property
+    def alphas(self):
+        if self.prior is not None:
+            return self.sample_tallies + self.prior
+        return (self.sample_tallies +
+                self.pseudocount_for_prior).astype(np.float64)
+
+    @functools.cached_property
+    def alpha_rows(self):
+        if self.num_candidates <= SCALAR_GAMMA_MAX_CANDIDATES:
+            return self.alphas.tolist()
+        return list(self.alphas)
+
+    @functools.cached_property
+    def simulated_counties(self):
+        return np.flatnonzero(self.nonsample_sizes > 0).tolist()
+
+    def __reduce_ex__(self, protocol):
+        # A Contest read from a contest file is pickled (for instance, to
+        # be sent to a worker process) as the path of the file.
+        if self.path is not None:
+            return read_contest_file, (self.path,)
+        return super().__reduce_ex__(protocol)
+
+    def num_votes(self):
+        """
+        Return the total number of votes cast in the contest, in the
+        polling counties and the comparison strata.
+        """
+
+        return (int(self.total_num_votes.sum()) +
+                sum(stratum.total_num_votes
+                    for stratum in self.comparison_strata))
+
+    def __repr__(self):
+        if self.comparison_strata:
+            return ("Contest({} counties, {} comparison strata, "
+                    "{} candidates, {} votes)".format(
+                        self.num_counties, len(self.comparison_strata),
+                        self.num_candidates, self.num_votes()))
+        return "Contest({} counties, {} candidates, {} votes)".format(
+            self.num_counties, self.num_candidates, self.num_votes())
+
+
+def as_contest(sample_tallies, total_num_votes=None, candidate_names=None):
+    """
+    Return sample_tallies itself if it is a Contest, and otherwise the
+    Contest with the given sample_tallies, total_num_votes and
+    candidate_names.
+    """
+
+    if isinstance(sample_tallies, Contest):
+        return sample_tallies
+    return Contest(sample_tallies, total_num_votes, candidate_names)
+
+
+##############################################################################
+## Comparison (CVR) strata
+##############################################################################
+
+class ComparisonStratum:
+    """
+    A county audited by comparison with its cast-vote records (CVRs),
+    rather than by ballot polling.  Its ballots are grouped by the
+    candidate their CVR reports; for each reported candidate r, the
+    sampled ballots give a Dirichlet posterior over the shares of the
+    actual votes (as read from the paper ballots) among all the ballots
+    reported for r.  The unsampled ballots reported for r are simulated
+    from that posterior exactly as a polling county's unsampled ballots
+    are, so one trial of the stratum costs one Dirichlet multinomial
+    draw per reported candidate: proportional to the square of the
+    number of candidates, and independent of the number of ballots.
+
+    Input Parameters:
+
+    -name is a string naming the stratum (its county).
+
+    -reported_tally is a list of integers; reported_tally[r] is the number
+    of ballots whose CVR reports a vote for candidate r.
+
+    -sample_matrix is a list of lists; sample_matrix[r][a] is the number
+    of sampled ballots whose CVR reports candidate r and whose paper
+    ballot shows a vote for candidate a.  Its diagonal counts the
+    sampled ballots whose CVR is correct.
+
+    -match_pseudocount and error_pseudocount are the prior pseudocounts
+    of the diagonal and of the other entries of each row of the matrix;
+    they default to the "+1" prior used for ballot polling.  A larger
+    match_pseudocount expresses prior confidence in the CVRs.
+
+    Attributes:
+
+    -reported_tally, sample_matrix, name, num_candidates and the
+    pseudocounts are as given (the tallies as int64 arrays).
+
+    -nonsample_sizes is an int64 array giving, for each reported
+    candidate, the number of unsampled ballots reported for them.
+
+    -alphas is a float64 array of the shape of sample_matrix, whose row r
+    holds the parameters of the posterior for the ballots reported for r;
+    alpha_rows gives its rows in the form of Contest.alpha_rows.
+
+    -sample_total is an int64 array giving each candidate's number of
+    actual votes among the sampled ballots.
+
+    -total_num_votes is the number of ballots in the stratum.
+    """
+
+    def __init__(self, name, reported_tally, sample_matrix,
+                 match_pseudocount=1, error_pseudocount=1):
+
+        reported_tally = np.array(reported_tally, dtype=np.int64, ndmin=1)
+        sample_matrix = np.array(sample_matrix, dtype=np.int64, ndmin=2,
+                                 order="C")
+        num_candidates = len(reported_tally)
+        if sample_matrix.shape != (num_candidates, num_candidates):
+            raise ValueError("ComparisonStratum: stratum {} has {} "
+                             "candidates but a sample matrix of shape {}."
+                             .format(name, num_candidates,
+                                     sample_matrix.shape))
+        if (reported_tally < 0).any() or (sample_matrix < 0).any():
+            raise ValueError("ComparisonStratum: stratum {} has negative "
+                             "counts.".format(name))
+        nonsample_sizes = reported_tally - sample_matrix.sum(axis=1)
+        if (nonsample_sizes < 0).any():
+            raise ValueError("ComparisonStratum: stratum {} has more "
+                             "sampled than reported ballots for candidate "
+                             "{}.".format(name,
+                                          int(np.argmin(nonsample_sizes))))
+        if match_pseudocount <= 0 or error_pseudocount <= 0:
+            raise ValueError("ComparisonStratum: pseudocounts must be "
+                             "positive.")
+
+        self.name = name
+        self.reported_tally = reported_tally
+        self.sample_matrix = sample_matrix
+        self.num_candidates = num_candidates
+        self.match_pseudocount = match_pseudocount
+        self.error_pseudocount = error_pseudocount
+        self.nonsample_sizes = nonsample_sizes
+        self.alphas = sample_matrix + np.where(
+            np.eye(num_candidates, dtype=bool),
+            float(match_pseudocount), float(error_pseudocount))
+        if num_candidates <= SCALAR_GAMMA_MAX_CANDIDATES:
+            self.alpha_rows = self.alphas.tolist()
+        else:
+            self.alpha_rows = list(self.alphas)
+        self.sample_total = sample_matrix.sum(axis=0)
+        self.total_num_votes = int(reported_tally.sum())
+
+    def __repr__(self):
+        return "ComparisonStratum({}, {} ballots, {} sampled)".format(
+            self.name, self.total_num_votes, int(self.sample_matrix.sum()))
+
+
+def read_comparison_csv(path, candidate_names=None, match_pseudocount=1,
+                        error_pseudocount=1):
+    """
+    Read the comparison strata of a contest from a csv file like:
+        county name, reported, reported votes, Alice, Bob
+        3, Alice, 5000, 48, 2
+        3, Bob, 4000, 1, 39
+    with one line per (county, reported candidate).  "reported votes" is
+    the number of ballots of the county whose CVR reports that candidate,
+    and the candidate columns count the sampled ballots reported for them
+    by the vote their paper ballot shows.  A candidate with no line in a
+    county has no ballots reported for them there.
+
+    Input Parameters:
+
+    -path is a string, the path of the file.
+
+    -candidate_names is None or the candidate names of the rest of the
+    contest; if given, the file's candidate columns must be the same
+    candidates (compared without surrounding spaces), and the strata are
+    put in their order.
+
+    -match_pseudocount and error_pseudocount are as for ComparisonStratum.
+
+    Returns:
+
+    -strata is a list of ComparisonStratum, in the order in which the
+    counties first appear in the file.
+
+    -candidate_names is the list of candidate names.
+    """
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = [col.strip() for col in next(reader, [])]
+        rows = [[field.strip() for field in row] for row in reader if row]
+
+    fieldnames = [col.lower() for col in header]
+    required = ["county name", "reported", "reported votes"]
+    missing = [col for col in required if col not in fieldnames]
+    if missing:
+        raise ValueError("read_comparison_csv: {} lacks columns {}."
+                         .format(path, missing))
+    county_col, reported_col, votes_col = [fieldnames.index(col)
+                                           for col in required]
+    candidate_cols = [i for i in range(len(header))
+                      if i not in (county_col, reported_col, votes_col)]
+    if candidate_names is None:
+        candidate_names = [header[i] for i in candidate_cols]
+    names = [str(name).strip() for name in candidate_names]
+    if sorted(names) != sorted(header[i] for i in candidate_cols):
+        raise ValueError("read_comparison_csv: the candidates of {} are "
+                         "not those of the contest.".format(path))
+    candidate_cols = [candidate_cols[[header[i] for i in candidate_cols]
+                                     .index(name)] for name in names]
+
+    # county name -> (reported_tally, sample_matrix)
+    counties = collections.OrderedDict()
+    for row in rows:
+        reported_tally, sample_matrix = counties.setdefault(
+            row[county_col], (np.zeros(len(names), dtype=np.int64),
+                              np.zeros((len(names), len(names)),
+                                       dtype=np.int64)))
+        if row[reported_col] not in names:
+            raise ValueError("read_comparison_csv: unknown reported "
+                             "candidate {} in county {}."
+                             .format(row[reported_col], row[county_col]))
+        r = names.index(row[reported_col])
+        reported_tally[r] += int(row[votes_col])
+        sample_matrix[r] += [int(row[i]) for i in candidate_cols]
+    strata = [ComparisonStratum(name, reported_tally, sample_matrix,
+                                match_pseudocount, error_pseudocount)
+              for name, (reported_tally, sample_matrix) in counties.items()]
+    return strata, list(candidate_names)
+
+
+##############################################################################
+## Binary contest files
+##############################################################################
+
+# A contest file starts with CONTEST_FILE_MAGIC and the length of a JSON
+# header (as a little-endian uint64), followed by the header itself,
+# padded with spaces so that the data starts at a multiple of
+# CONTEST_FILE_ALIGNMENT bytes.  The data is the total number of votes
+# of each county, then the counties x candidates sample tallies in
+# row-major order, all as little-endian int64.
+CONTEST_FILE_MAGIC = b"BPCONTST"
+
+
+CONTEST_FILE_VERSION = 1
+
+
+CONTEST_FILE_ALIGNMENT = 64
+
+
+def write_contest_file(path, contest):
+    """
+    Write a Contest to a binary contest file, which read_contest_file
+    reads back without parsing any text but its names.
+
+    Input Parameters:
+
+    -path is a string, the path of the file to write.
+
+    -contest is a Contest; its comparison strata and prior, if any, are
+    stored in the header.
+    """
+
+    header = {"version": CONTEST_FILE_VERSION,
+              "num_counties": contest.num_counties,
+              "num_candidates": contest.num_candidates,
+              "candidate_names": [str(name)
+                                  for name in contest.candidate_names],
+              "county_names": [str(name) for name in contest.county_names]}
+    if contest.comparison_strata:
+        header["comparison_strata"] = [
+            {"name": str(stratum.name),
+             "reported_tally": stratum.reported_tally.tolist(),
+             "sample_matrix": stratum.sample_matrix.tolist(),
+             "match_pseudocount": stratum.match_pseudocount,
+             "error_pseudocount": stratum.error_pseudocount}
+            for stratum in contest.comparison_strata]
+    if contest.prior is not None:
+        header["prior"] = contest.prior.tolist()
+    text = json.dumps(header).encode("utf-8")
+    prefix_size = len(CONTEST_FILE_MAGIC) + 8
+    text += b" " * (-(prefix_size + len(text)) % CONTEST_FILE_ALIGNMENT)
+
+    with open(path, "wb") as f:
+        f.write(CONTEST_FILE_MAGIC)
+        f.write(np.uint64(len(text)).astype("<u8").tobytes())
+        f.write(text)
+        f.write(contest.total_num_votes.astype("<i8").tobytes())
+        f.write(contest.sample_tallies.astype("<i8").tobytes())
+
+
+def read_contest_file(path, mmap=True):
+    """
+    Read a Contest from a binary contest file written by
+    write_contest_file.
+
+    Input Parameters:
+
+    -path is a string, the path of the file.
+
+    -mmap is a Boolean, which defaults to True.  When it's set, the
+    tallies are memory-mapped rather than read: the Contest then refers
+    to the file, which must not change while it is in use.  Such a
+    Contest is sent to worker processes as its path, so every worker maps
+    the same pages instead of receiving a copy of the tallies.
+
+    Returns:
+
+    -contest is a Contest.
+    """
+
+    with open(path, "rb") as f:
+        magic = f.read(len(CONTEST_FILE_MAGIC))
+        if magic != CONTEST_FILE_MAGIC:
+            raise ValueError("read_contest_file: {} is not a contest file."
+                             .format(path))
+        header_size = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    if header.get("version") != CONTEST_FILE_VERSION:
+        raise ValueError("read_contest_file: {} has version {}, not {}."
+                         .format(path, header.get("version"),
+                                 CONTEST_FILE_VERSION))
+
+    num_counties = header["num_counties"]
+    num_candidates = header["num_candidates"]
+    offset = len(CONTEST_FILE_MAGIC) + 8 + header_size
+    count = num_counties * (num_candidates + 1)
+    if mmap and count > 0:
+        data = np.memmap(path, dtype="<i8", mode="r", offset=offset,
+                         shape=(count,))
+    else:
+        data = np.fromfile(path, dtype="<i8", count=count, offset=offset)
+    if len(data) != count:
+        raise ValueError("read_contest_file: {} is truncated."
+                         .format(path))
+    data = data.view(np.ndarray)
+    total_num_votes = data[:num_counties]
+    sample_tallies = data[num_counties:].reshape(num_counties,
+                                                 num_candidates)
+
+    comparison_strata = [
+        ComparisonStratum(stratum["name"], stratum["reported_tally"],
+                          stratum["sample_matrix"],
+                          stratum["match_pseudocount"],
+                          stratum["error_pseudocount"])
+        for stratum in header.get("comparison_strata", [])]
+    contest = Contest(sample_tallies, total_num_votes,
+                      header["candidate_names"], header["county_names"],
+                      comparison_strata, header.get("prior"))
+    if mmap:
+        contest.path = os.path.abspath(path)
+    return contest
+
+
+##############################################################################
+## Csv input
+##############################################################################
+
+# Number of csv rows that load_csv_arrays parses at a time.
+CSV_CHUNK_ROWS = 16384
+
+
+def load_csv_arrays(path_to_csv, chunk_rows=CSV_CHUNK_ROWS,
+                    return_county_names=False):
+    """
+    Fast version of preprocess_csv for large csv files, returning numpy
+    arrays instead of lists.  The file has the same format as for
+    preprocess_csv, except that quoted fields may not contain line breaks.
+
+    The column layout is worked out once, from the header.  The rows are
+    then read chunk_rows lines at a time; each chunk is parsed by
+    numpy.loadtxt straight into integers, checked with a few array
+    operations, and stored into int64 arrays allocated (from a count of
+    the lines in the file) before parsing begins.  The time and memory
+    used thus grow with the size of the arrays rather than with the
+    number of Python objects.
+
+    Input Parameters:
+
+    -path_to_csv is a string, representing the full path to the CSV
+    file, containing sample tallies.
+
+    -chunk_rows is the number of lines parsed at a time.
+
+    -return_county_names is a Boolean, which defaults to False.  If it is
+    True, the list of county names is returned as well.
+
+    Returns:
+
+    -sample_tallies is a numpy array of int64 of shape
+    (counties, candidates); sample_tallies[i, j] is the number of votes
+    candidate j received in the sample from county i.
+
+    -total_num_votes is a numpy array of int64 giving the total number
+    of votes cast in each county.
+
+    -candidate_names is an ordered list of strings, containing the name of
+    every candidate in the contest we are auditing.
+
+    -county_names (only if return_county_names is True) is a list of
+    strings giving the name of each county; if the file has no county
+    name column, the counties are named "1", "2", ... in file order.
+    """
+
+    with open(path_to_csv, newline="") as csvfile:
+        num_lines = sum(1 for _ in csvfile)
+        csvfile.seek(0)
+        header = next(csv.reader([csvfile.readline()]), None)
+        if header is None:
+            raise ValueError("load_csv_arrays: {} is empty."
+                             .format(path_to_csv))
+        fieldnames = [col.strip().lower() for col in header]
+        if "total votes" not in fieldnames:
+            raise ValueError("load_csv_arrays: {} has no Total Votes column."
+                             .format(path_to_csv))
+        total_col = fieldnames.index("total votes")
+        county_col = (fieldnames.index("county name")
+                      if "county name" in fieldnames else None)
+        candidate_cols = [i for i in range(len(header))
+                          if i not in (total_col, county_col)]
+        candidate_names = [header[i] for i in candidate_cols]
+        # Column 0 of each parsed chunk holds the total votes.
+        use_cols = [total_col] + candidate_cols
+
+        # Blank lines make this an overestimate, never an underestimate.
+        capacity = max(0, num_lines - 1)
+        sample_tallies = np.empty((capacity, len(candidate_cols)),
+                                  dtype=np.int64)
+        total_num_votes = np.empty(capacity, dtype=np.int64)
+        county_names = []
+        num_rows = 0
+        while True:
+            lines = list(itertools.islice(csvfile, chunk_rows))
+            if not lines:
+                break
+            try:
+                # No comment character: "#" may appear in county names.
+                chunk = np.loadtxt(lines, delimiter=",", quotechar='"',
+                                   comments=None, usecols=use_cols,
+                                   dtype=np.int64, ndmin=2)
+            except ValueError as e:
+                raise ValueError("load_csv_arrays: cannot parse {}: {}"
+                                 .format(path_to_csv, e))
+            chunk_totals = chunk[:, 0]
+            chunk_tallies = chunk[:, 1:]
+            sample_sizes = chunk_tallies.sum(axis=1)
+            bad = ((chunk_tallies < 0).any(axis=1) |
+                   (sample_sizes > chunk_totals))
+            if bad.any():
+                raise ValueError("load_csv_arrays: row {} of {} has a "
+                                 "negative count or a sample larger than "
+                                 "its total votes."
+                                 .format(num_rows + 1 + int(np.argmax(bad)),
+                                         path_to_csv))
+
+            stop = num_rows + len(chunk)
+            sample_tallies[num_rows:stop] = chunk_tallies
+            total_num_votes[num_rows:stop] = chunk_totals
+            if return_county_names:
+                if county_col is None:
+                    county_names.extend(
+                        str(i) for i in range(num_rows + 1, stop + 1))
+                else:
+                    county_names.extend(row[county_col].strip()
+                                        for row in csv.reader(lines) if row)
+            num_rows = stop
+
+    sample_tallies = sample_tallies[:num_rows]
+    total_num_votes = total_num_votes[:num_rows]
+    if return_county_names:
+        return sample_tallies, total_num_votes, candidate_names, county_names
+    return sample_tallies, total_num_votes, candidate_names
@@ -0,0 +1,71 @@
+# bptool/instrumentation.py
+# python3
+
+"""
+Instrumentation of the simulation: phase timers and progress events.
+"""
+
+import collections
+import time
+
+
+##############################################################################
+## Instrumentation
+##############################################################################
+
+class PhaseTimer:
+    """
+    Accumulates the time spent in each phase of the simulation, for
+    profiling.  The simulation routines accept an optional timer argument;
+    when it is None (the default) they only pay for a comparison with
+    None per phase.
+
+    The phases are:
+        "seeding"      creating random states or streams
+        "gamma"        drawing and normalizing the gamma variates
+        "multinomial"  drawing the multinomials
+        "tally"        adding up tallies and finding the winners
+    """
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+
+    def lap(self, phase, start):
+        """
+        Charge the time since start (a time.perf_counter() value) to
+        phase, and return the current time, to start the next phase.
+        """
+
+        now = time.perf_counter()
+        self.seconds[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def merge(self, other):
+        """
+        Add the times of another PhaseTimer to this one.
+        """
+
+        for phase in other.seconds:
+            self.seconds[phase] += other.seconds[phase]
+            self.calls[phase] += other.calls[phase]
+
+    def stats(self):
+        """
+        Return a dict mapping each phase to a dict with its total
+        "seconds" and its number of "calls".
+        """
+
+        return {phase: {"seconds": self.seconds[phase],
+                        "calls": self.calls[phase]}
+                for phase in sorted(self.seconds)}
+
+
+# The progress of compute_win_probs, passed to its progress callback after
+# every block of trials.  win_count is a tuple giving each candidate's
+# number of wins so far.
+ProgressEvent = collections.namedtuple(
+    "ProgressEvent",
+    ["trials_done", "num_trials", "elapsed_seconds", "trials_per_sec",
+     "win_count"])
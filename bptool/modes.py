@@ -0,0 +1,24 @@
+# bptool/modes.py
+# python3
+
+"""
+Names of the simulation engines and random number modes.  They are
+kept apart from the modules that implement them, which import numpy,
+so that the command-line interface can offer them cheaply.
+"""
+
+
+##############################################################################
+## Modes
+##############################################################################
+
+# Names of the ways of generating random numbers accepted by
+# compute_win_probs.  "streams" gives each (trial block, county) pair its
+# own independent stream (see AuditStreams).  "legacy" reseeds a
+# RandomState for every county in every trial, exactly as earlier versions
+# of this module did, so that archived audits can be reproduced.
+RNG_MODES = ("streams", "legacy")
+
+
+# Names of the simulation engines accepted by compute_win_probs.
+ENGINES = ("loop", "vectorized")
@@ -0,0 +1,287 @@
+# bptool/outcomes.py
+# python3
+
+"""
+Recording the outcome of every trial to disk, and reading it back.
+"""
+
+import concurrent.futures
+import functools
+import json
+import os
+
+import numpy as np
+
+from .contest import as_contest
+from .rng import AuditStreams, trial_blocks
+from .simulation import simulate_block_vectorized, top_n_candidates
+
+
+##############################################################################
+## Recording trial outcomes
+##############################################################################
+
+def simulate_final_tallies_block(sample_tallies, total_num_votes, seed,
+                                 num_trials, block_index):
+    """
+    Simulate the final tallies of the trials of one block of an audit,
+    exactly as compute_win_probs does with the "vectorized" engine.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed and num_trials are as for
+    compute_win_probs; seed may not be None.
+
+    -block_index is the index of the block (see trial_blocks).
+
+    Returns:
+
+    -final_tallies is a numpy array of int64 of shape
+    (trials in the block, candidates), as for simulate_block_vectorized.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    _, start, stop = trial_blocks(num_trials)[block_index]
+    county_rs = AuditStreams(seed).county_streams(block_index,
+                                                  contest.num_strata)
+    return simulate_block_vectorized(contest, None, stop - start, county_rs)
+
+
+def trial_margins(final_tallies):
+    """
+    Return, for each row of final_tallies, the margin of its trial: the
+    number of votes of the candidate with the most votes minus that of
+    the candidate with the second most (zero if there is only one
+    candidate).
+    """
+
+    if final_tallies.shape[1] < 2:
+        return np.zeros(len(final_tallies), dtype=final_tallies.dtype)
+    top_two = np.partition(final_tallies, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def record_trial_outcomes(sample_tallies,
+                          total_num_votes,
+                          seed,
+                          num_trials,
+                          candidate_names,
+                          vote_for_n,
+                          directory,
+                          workers=1):
+    """
+    Run compute_win_probs with the "vectorized" engine, and also stream
+    the final tallies and margin of every trial to disk, for later
+    analysis with TrialOutcomes.
+
+    The trials are written block by block into memory-mapped .npy files
+    in directory:
+        tallies.npy   (num_trials x candidates) final tallies
+        margins.npy   (num_trials) margins, as computed by trial_margins
+        outcomes.json the candidate names, seed and number of trials
+    The tallies are stored as int32 when the total number of votes allows
+    it, and as int64 otherwise.  Only one block of trials is held in
+    memory at a time (per worker), so num_trials may be in the millions.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, candidate_names,
+    vote_for_n and workers are as for compute_win_probs.
+
+    -directory is the path of the directory to write to; it is created
+    if needed.
+
+    Returns:
+
+    -win_probs is as for compute_win_probs (with the "vectorized"
+    engine, to which it is equal).
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    os.makedirs(directory, exist_ok=True)
+    candidate_names = contest.candidate_names
+    num_candidates = contest.num_candidates
+    dtype = np.int32 if contest.num_votes() < 2 ** 31 else np.int64
+    tallies = np.lib.format.open_memmap(
+        os.path.join(directory, "tallies.npy"), mode="w+", dtype=dtype,
+        shape=(num_trials, num_candidates))
+    margins = np.lib.format.open_memmap(
+        os.path.join(directory, "margins.npy"), mode="w+", dtype=dtype,
+        shape=(num_trials,))
+
+    blocks = trial_blocks(num_trials)
+    run_block = functools.partial(simulate_final_tallies_block,
+                                  contest, None, seed, num_trials)
+    win_count = np.zeros(num_candidates, dtype=np.int64)
+    workers = min(workers, len(blocks))
+    executor = None
+    try:
+        if workers <= 1:
+            results = map(run_block, range(len(blocks)))
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            results = executor.map(run_block, range(len(blocks)))
+        for (_, start, stop), final_tallies in zip(blocks, results):
+            tallies[start:stop] = final_tallies
+            margins[start:stop] = trial_margins(final_tallies)
+            winners = top_n_candidates(final_tallies, vote_for_n)
+            win_count += np.bincount(winners.ravel(),
+                                     minlength=num_candidates)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    tallies.flush()
+    margins.flush()
+    del tallies, margins
+
+    with open(os.path.join(directory, "outcomes.json"), "w") as f:
+        json.dump({"candidate_names": [str(name) for name in candidate_names],
+                   "seed": str(seed),
+                   "num_trials": num_trials}, f, indent=2)
+    return [(i + 1, int(win_count[i])/float(num_trials))
+            for i in range(num_candidates)]
+
+
+class TrialOutcomes:
+    """
+    Reader for the trial outcomes written by record_trial_outcomes.  The
+    files are memory-mapped, and every statistic is computed chunk by
+    chunk, so that the outcomes never need to fit in memory.
+
+    Input Parameters:
+
+    -directory is the directory written by record_trial_outcomes.
+
+    -chunk_trials is the number of trials processed at a time.
+    """
+
+    def __init__(self, directory, chunk_trials=2 ** 16):
+        with open(os.path.join(directory, "outcomes.json")) as f:
+            meta = json.load(f)
+        self.candidate_names = meta["candidate_names"]
+        self.seed = int(meta["seed"])
+        self.num_trials = meta["num_trials"]
+        self.chunk_trials = chunk_trials
+        self.tallies = np.load(os.path.join(directory, "tallies.npy"),
+                               mmap_mode="r")
+        self.margins = np.load(os.path.join(directory, "margins.npy"),
+                               mmap_mode="r")
+
+    def chunks(self, array, chunk_trials=None):
+        """
+        Yield consecutive chunks of the rows of array, as int64 arrays.
+        """
+
+        chunk_trials = chunk_trials or self.chunk_trials
+        for start in range(0, len(array), chunk_trials):
+            yield np.asarray(array[start:start + chunk_trials],
+                             dtype=np.int64)
+
+    def column(self, candidate):
+        """
+        Return the memory-mapped final tallies of one candidate (given by
+        index, from 0, or by name), or the margins if candidate is None.
+        """
+
+        if candidate is None:
+            return self.margins
+        if not isinstance(candidate, (int, np.integer)):
+            candidate = [str(name).strip() for name in
+                         self.candidate_names].index(str(candidate).strip())
+        return self.tallies[:, candidate]
+
+    def win_probs(self, vote_for_n=1):
+        """
+        Return the win probabilities, as for compute_win_probs.
+        """
+
+        win_count = np.zeros(len(self.candidate_names), dtype=np.int64)
+        for chunk in self.chunks(self.tallies):
+            winners = top_n_candidates(chunk, vote_for_n)
+            win_count += np.bincount(winners.ravel(),
+                                     minlength=len(win_count))
+        return [(i + 1, int(win_count[i])/float(self.num_trials))
+                for i in range(len(win_count))]
+
+    def pairwise_win_probs(self):
+        """
+        Return a (candidates x candidates) numpy array whose entry [i, j]
+        is the fraction of trials in which candidate i got more votes than
+        candidate j.
+        """
+
+        num_candidates = len(self.candidate_names)
+        beats = np.zeros((num_candidates, num_candidates), dtype=np.int64)
+        # Keep the (chunk x candidates x candidates) comparison small.
+        chunk_trials = max(1, 2 ** 22 // (num_candidates * num_candidates))
+        for chunk in self.chunks(self.tallies, chunk_trials):
+            beats += (chunk[:, :, None] > chunk[:, None, :]).sum(axis=0)
+        return beats / float(self.num_trials)
+
+    def value_range(self, candidate=None):
+        """
+        Return the pair (smallest, largest) of the final tallies of a
+        candidate, or of the margins if candidate is None.
+        """
+
+        low, high = None, None
+        for chunk in self.chunks(self.column(candidate)):
+            low = chunk.min() if low is None else min(low, chunk.min())
+            high = chunk.max() if high is None else max(high, chunk.max())
+        return int(low), int(high)
+
+    def histogram(self, candidate=None, bins=50):
+        """
+        Return a histogram (counts, bin_edges), as numpy.histogram does,
+        of the final tallies of a candidate, or of the margins if
+        candidate is None.
+        """
+
+        low, high = self.value_range(candidate)
+        edges = np.histogram_bin_edges([low, high], bins=bins)
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for chunk in self.chunks(self.column(candidate)):
+            counts += np.histogram(chunk, bins=edges)[0]
+        return counts, edges
+
+    def quantiles(self, qs, candidate=None):
+        """
+        Return the exact quantiles qs (fractions between 0 and 1) of the
+        final tallies of a candidate, or of the margins if candidate is
+        None.  The q quantile is the value of rank floor(q * (trials-1))
+        in sorted order.
+
+        Two passes are made over the data: the first counts the values
+        in a fine histogram, to find the bin holding each requested rank;
+        the second collects the values in those bins only, which are
+        then sorted.
+        """
+
+        values = self.column(candidate)
+        low, high = self.value_range(candidate)
+        num_bins = max(1, min(4096, high - low + 1))
+        edges = np.linspace(low, high + 1, num_bins + 1)
+        counts = np.zeros(num_bins, dtype=np.int64)
+        for chunk in self.chunks(values):
+            counts += np.histogram(chunk, bins=edges)[0]
+        cumulative = np.cumsum(counts)
+
+        ranks = [int(q * (self.num_trials - 1)) for q in qs]
+        wanted_bins = sorted(set(int(np.searchsorted(cumulative, rank,
+                                                     side="right"))
+                                 for rank in ranks))
+        collected = {b: [] for b in wanted_bins}
+        for chunk in self.chunks(values):
+            chunk_bins = np.searchsorted(edges, chunk, side="right") - 1
+            np.clip(chunk_bins, 0, num_bins - 1, out=chunk_bins)
+            for b in wanted_bins:
+                collected[b].append(chunk[chunk_bins == b])
+        result = []
+        for rank in ranks:
+            b = int(np.searchsorted(cumulative, rank, side="right"))
+            in_bin = np.sort(np.concatenate(collected[b]))
+            first_rank = cumulative[b] - counts[b]
+            result.append(int(in_bin[rank - first_rank]))
+        return result
@@ -0,0 +1,217 @@
+# bptool/planning.py
+# python3
+
+"""
+Planning the sample sizes needed to reach a risk limit.
+"""
+
+import numpy as np
+
+from .contest import as_contest
+from .rng import AuditStreams
+from .simulation import compute_win_probs, top_n_candidates
+
+
+##############################################################################
+## Sample-size planning
+##############################################################################
+
+# First element of the spawn keys (PLANNING_STREAM_KEY, projection, county)
+# of the streams used by plan_sample_sizes; larger than any trial block
+# index, so that these streams are distinct from the simulation streams.
+PLANNING_STREAM_KEY = 2 ** 32
+
+
+def upper_risk(win_probs, leaders):
+    """
+    Return the upper risk of a set of leading candidates: the largest
+    probability that one of them is not among the winners.
+
+    Input Parameters:
+
+    -win_probs is a list of pairs (i, p) as returned by compute_win_probs.
+
+    -leaders is a list of candidate indices (starting at 0).
+
+    Returns:
+
+    -a float, max over leaders i of 1 - p_i.
+    """
+
+    probs = dict(win_probs)
+    return max(1.0 - probs[i + 1] for i in leaders)
+
+
+def level_upper_risk(contest, extra, remaining, gammas, county_rs,
+                     num_trials, vote_for_n, leaders):
+    """
+    Return the upper risk of the leaders once the samples are extended by
+    extra, simulating the remaining votes of each county from the shares
+    given by its gamma variates.
+
+    Input Parameters:
+
+    -contest is the Contest being planned for.
+
+    -extra is the int64 array of shape (counties, candidates) of the extra
+    ballots, and remaining the array of the counties' numbers of votes
+    still unsampled.
+
+    -gammas is a dict mapping each simulated county to its float64 array
+    of shape (trials, candidates) of gamma variates, with shapes
+    contest.alphas plus extra.
+
+    -county_rs is a list giving one numpy.random.Generator per county.
+
+    -num_trials, vote_for_n and leaders are as for plan_sample_sizes and
+    upper_risk.
+
+    Returns:
+
+    -a float, the upper risk.
+    """
+
+    final_tallies = np.empty((num_trials, contest.num_candidates),
+                             dtype=np.int64)
+    final_tallies[:] = contest.sample_total + extra.sum(axis=0)
+    for i, county_gammas in gammas.items():
+        shares = county_gammas / county_gammas.sum(axis=1, keepdims=True)
+        final_tallies += county_rs[i].multinomial(remaining[i], shares)
+    winners = top_n_candidates(final_tallies, vote_for_n)
+    return max(1.0 - (winners == i).any(axis=1).mean() for i in leaders)
+
+
+def plan_sample_sizes(sample_tallies,
+                      total_num_votes,
+                      seed,
+                      candidate_names,
+                      vote_for_n,
+                      risk_limit=0.05,
+                      num_projections=100,
+                      num_trials=1000,
+                      fractions=None):
+    """
+    Estimate how many more ballots each county must sample for the upper
+    risk of the current leader(s) to fall below risk_limit.
+
+    The sample of each county is extended by the same fraction f of its
+    unsampled ballots, and f is searched among the increasing values in
+    fractions.  For each of num_projections projections, the future
+    ballots are simulated: each county's vote shares are drawn from the
+    Dirichlet posterior of its current sample (as in
+    dirichlet_multinomial), and the extra ballots for all the fractions
+    are drawn once, as nested increments, so that a larger sample always
+    extends a smaller one.  For each projection, the smallest fraction
+    whose extended sample gives an upper risk at most risk_limit is then
+    found by trying the fractions in increasing order.  Each upper risk is
+    estimated from num_trials trials whose posterior shares are drawn once
+    per projection: as the Dirichlet parameters of a fraction are those
+    of the fraction below plus the extra ballots in between, and the sum
+    of independent Gamma(a) and Gamma(b) variates is a Gamma(a + b)
+    variate, the gamma variates behind the shares of each fraction are
+    those of the fraction below plus independent increments.  So every
+    posterior is sampled exactly, and the comparisons between sample
+    sizes use common random numbers rather than fresh noise, without
+    rerunning compute_win_probs for each fraction.  Projections in which
+    the limit is not reached even with every ballot sampled count as
+    needing a full hand count.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, candidate_names and vote_for_n
+    are as for compute_win_probs.
+
+    -risk_limit is the upper risk to be reached.
+
+    -num_projections is the number of projected future samples.
+
+    -num_trials is the number of trials used for each upper risk.
+
+    -fractions is an increasing sequence of fractions of the unsampled
+    ballots, ending at 1; by default, 16 geometrically spaced values from
+    1/1024 to 1.
+
+    Returns:
+
+    -plan is a dict with keys
+        "leaders": the indices (from 0) of the vote_for_n candidates now
+            most likely to win, whose risk is to be limited;
+        "current_upper_risk": their upper risk with the current samples;
+        "expected_increment": a numpy array giving, for each county, the
+            expected number of additional ballots to sample;
+        "median_total_increment": the median over projections of the
+            total number of additional ballots;
+        "probability_reaching_limit": the fraction of projections in which
+            the limit is reached before every ballot is sampled.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if contest.comparison_strata:
+        raise ValueError("plan_sample_sizes: contests with comparison "
+                         "strata are not supported.")
+    sample_tallies = contest.sample_tallies
+    if fractions is None:
+        fractions = np.geomspace(1.0 / 1024, 1.0, 16)
+    fractions = np.asarray(fractions, dtype=np.float64)
+    if np.any(np.diff(fractions) <= 0) or fractions[-1] != 1.0:
+        raise ValueError("plan_sample_sizes: fractions must increase "
+                         "to 1.")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    num_counties, num_candidates = sample_tallies.shape
+    nonsample_sizes = contest.nonsample_sizes
+    # increments[l, i] is the number of extra ballots of county i at
+    # fraction l; level 0 is the current sample.
+    increments = np.zeros((len(fractions) + 1, num_counties), dtype=np.int64)
+    increments[1:] = np.round(np.outer(fractions, nonsample_sizes))
+
+    win_probs = compute_win_probs(contest, None, seed,
+                                  num_trials, None, vote_for_n,
+                                  engine="vectorized")
+    probs = np.array([prob for _, prob in win_probs])
+    leaders = [int(i) for i in
+               np.argsort(probs, kind="stable")[::-1][:vote_for_n]]
+    current_upper_risk = upper_risk(win_probs, leaders)
+
+    needed = np.zeros((num_projections, num_counties), dtype=np.int64)
+    reached = np.ones(num_projections, dtype=bool)
+    if current_upper_risk > risk_limit:
+        streams = AuditStreams(seed)
+        for j in range(num_projections):
+            # extra[l] is the (counties x candidates) tally of the extra
+            # ballots at level l, drawn as nested increments.
+            extra = np.zeros((len(increments), num_counties, num_candidates),
+                             dtype=np.int64)
+            county_rs = []
+            for i in range(num_counties):
+                rs = streams.stream(PLANNING_STREAM_KEY, j, i)
+                shares = rs.dirichlet(contest.alphas[i])
+                steps = np.diff(increments[:, i])
+                extra[1:, i] = np.cumsum(
+                    rs.multinomial(steps, shares), axis=0)
+                county_rs.append(rs)
+
+            # gammas[i] are the gamma variates of county i at the current
+            # level, with shapes contest.alphas[i] + extra[level, i].
+            remaining = nonsample_sizes - increments
+            size = (num_trials, num_candidates)
+            gammas = {i: county_rs[i].gamma(contest.alphas[i], size=size)
+                      for i in contest.simulated_counties}
+            reached[j] = False
+            needed[j] = nonsample_sizes
+            for level in range(1, len(increments)):
+                for i in gammas:
+                    gammas[i] += county_rs[i].gamma(
+                        extra[level, i] - extra[level - 1, i], size=size)
+                if level_upper_risk(contest, extra[level], remaining[level],
+                                    gammas, county_rs, num_trials,
+                                    vote_for_n, leaders) <= risk_limit:
+                    reached[j] = True
+                    needed[j] = increments[level]
+                    break
+
+    return {"leaders": leaders,
+            "current_upper_risk": current_upper_risk,
+            "expected_increment": needed.mean(axis=0),
+            "median_total_increment": float(np.median(needed.sum(axis=1))),
+            "probability_reaching_limit": float(reached.mean())}
@@ -0,0 +1,205 @@
+# bptool/pooling.py
+# python3
+
+"""
+Pooling counties with tiny samples into strata, so that contests with
+thousands of sparsely sampled precincts simulate cheaply.
+"""
+
+import collections
+
+import numpy as np
+
+from .contest import Contest, as_contest
+
+
+##############################################################################
+## Pooling sparsely sampled counties
+##############################################################################
+
+# One row of the report of pool_counties.
+#  -name is the name of the stratum in the pooled contest.
+#  -num_counties is the number of counties pooled into it.
+#  -total_num_votes and sample_size are its numbers of votes and of
+#   sampled votes.
+#  -draws_per_trial is the number of Dirichlet-multinomial draws the
+#   stratum costs per trial: 1, or 0 if it is fully audited.
+#  -draws_saved is the number of draws per trial saved by pooling, that
+#   is, num_counties - draws_per_trial.
+PooledStratum = collections.namedtuple(
+    "PooledStratum",
+    ["name", "num_counties", "total_num_votes", "sample_size",
+     "draws_per_trial", "draws_saved"])
+
+# The name of the stratum holding the fully audited counties.
+FULLY_AUDITED_STRATUM = "fully audited"
+
+
+# Bounds on the total Dirichlet parameter of a pooled stratum; the upper
+# one stands for a stratum whose unsampled votes are simply multinomial.
+POOLED_CONCENTRATION_BOUNDS = (1e-3, 1e9)
+
+
+def pooled_alphas(alphas, nonsample_sizes):
+    """
+    Return the parameters of the Dirichlet multinomial distribution that
+    stands for the sum of the unsampled votes of several counties, each
+    drawn from its own Dirichlet multinomial: the one with the same
+    expected tally, and the same total variance (summed over the
+    candidates), for the same number of unsampled votes.
+
+    A Dirichlet multinomial of n votes and parameters a (summing to A)
+    has mean n m, where m = a / A, and variance
+        n m (1 - m) (n + A) / (1 + A),
+    so with k the ratio of the counties' total variance to
+    n sum(m (1 - m)), A = (n - k) / (k - 1).
+
+    Input Parameters:
+
+    -alphas is a float64 array of shape (counties, candidates), the rows
+    of Contest.alphas of the counties.
+
+    -nonsample_sizes is the array of the counties' numbers of unsampled
+    votes.
+
+    Returns:
+
+    -a float64 array with one parameter per candidate.
+    """
+
+    nonsample_sizes = np.asarray(nonsample_sizes, dtype=np.float64)
+    concentrations = alphas.sum(axis=1, keepdims=True)
+    shares = alphas / concentrations
+    nonsample_size = nonsample_sizes.sum()
+    mean_shares = (nonsample_sizes[:, None] * shares).sum(axis=0) \
+        / nonsample_size
+    variance = (nonsample_sizes[:, None] * shares * (1 - shares)
+                * (nonsample_sizes[:, None] + concentrations)
+                / (1 + concentrations)).sum()
+    k = variance / (nonsample_size * (mean_shares * (1 - mean_shares)).sum())
+    low, high = POOLED_CONCENTRATION_BOUNDS
+    if k <= 1:
+        concentration = high
+    else:
+        concentration = min(max((nonsample_size - k) / (k - 1), low), high)
+    return concentration * mean_shares
+
+
+def pool_counties(sample_tallies,
+                  total_num_votes,
+                  candidate_names=None,
+                  max_sample_size=0,
+                  pool_keys=None,
+                  hierarchical_prior=False):
+    """
+    Return a smaller contest in which the counties (say, precincts) with
+    tiny samples are pooled into strata, and the fully audited counties
+    into one stratum that is not simulated.  Each pooled stratum has the
+    summed sample tallies and total number of votes of its counties, so
+    the contest's totals are preserved, and costs one draw per trial
+    instead of one per county.
+
+    Pooling is an approximation: the unsampled votes of a stratum are
+    drawn from the single Dirichlet multinomial with the same mean and
+    total variance as the sum of its counties' own draws (see
+    pooled_alphas), rather than county by county.  The pooled stratum's
+    Dirichlet parameters are its summed sample tally plus its entry of
+    the contest's prior, which may therefore be negative.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes and candidate_names are as for
+    compute_win_probs; sample_tallies may be a Contest, whose county
+    names, comparison strata and prior are kept.
+
+    -max_sample_size is the largest sample size (number of sampled
+    ballots) of a county that is pooled.
+
+    -pool_keys is None, or a list giving one string per county; the
+    pooled counties with the same key form one stratum, named
+    "pooled <key>".  None pools them all into one stratum, "pooled".
+
+    -hierarchical_prior is a Boolean, which defaults to False.  When it's
+    set, the pooled counties get, instead of a pseudocount of one vote per
+    candidate, a shared prior with the same total weight centered on the
+    candidates' shares of all the samples (an empirical-Bayes stand-in
+    for a hierarchical prior over the counties), which pulls their tiny
+    samples toward the contest-wide shares.
+
+    Returns:
+
+    -the pair (pooled, report): pooled is the pooled Contest, whose
+    counties are the unpooled counties (in order), then the pooled strata
+    and the fully audited stratum; report is a list of PooledStratum, one
+    per pooled or fully audited stratum.  A county that would be alone in
+    its pooled stratum is left unpooled.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    num_counties, num_candidates = contest.sample_tallies.shape
+    if pool_keys is None:
+        pool_keys = [None] * num_counties
+    if len(pool_keys) != num_counties:
+        raise ValueError("pool_counties: {} pool keys for {} counties."
+                         .format(len(pool_keys), num_counties))
+    # The posteriors of the pooled counties.
+    alphas = contest.alphas
+    if hierarchical_prior:
+        sample_total = contest.sample_tallies.sum(axis=0)
+        shared_prior = (num_candidates * (sample_total + 1.0) /
+                        (sample_total.sum() + num_candidates))
+        alphas = contest.sample_tallies + shared_prior
+
+    fully_audited = contest.nonsample_sizes == 0
+    pooled = ~fully_audited & (contest.sample_sizes <= max_sample_size)
+    strata = collections.OrderedDict()
+    for i in np.flatnonzero(pooled):
+        key = pool_keys[i]
+        name = "pooled" if key is None else "pooled {}".format(key)
+        strata.setdefault(name, []).append(i)
+    # A stratum of one county would save no draws, and only move the
+    # county to other random streams, so such counties are kept (with
+    # the posterior they would have had in the stratum).
+    priors = contest.alphas - contest.sample_tallies
+    for name in [name for name, members in strata.items()
+                 if len(members) == 1]:
+        i = strata.pop(name)[0]
+        pooled[i] = False
+        priors[i] = alphas[i] - contest.sample_tallies[i]
+    kept = np.flatnonzero(~(fully_audited | pooled))
+    if fully_audited.any():
+        strata[FULLY_AUDITED_STRATUM] = np.flatnonzero(fully_audited)
+
+    tallies = [contest.sample_tallies[kept]]
+    totals = [contest.total_num_votes[kept]]
+    priors = [priors[kept]]
+    names = [contest.county_names[i] for i in kept]
+    report = []
+    for name, members in strata.items():
+        members = np.asarray(members)
+        tallies.append(contest.sample_tallies[members].sum(axis=0)[None])
+        totals.append(contest.total_num_votes[members].sum(keepdims=True))
+        if name == FULLY_AUDITED_STRATUM:
+            # Not simulated, so any positive parameters will do.
+            draws_per_trial = 0
+            priors.append(np.full((1, num_candidates),
+                                  float(Contest.pseudocount_for_prior)))
+        else:
+            draws_per_trial = 1
+            priors.append(pooled_alphas(
+                alphas[members], contest.nonsample_sizes[members])[None]
+                          - tallies[-1])
+        names.append(name)
+        report.append(PooledStratum(
+            name, len(members), int(totals[-1][0]), int(tallies[-1].sum()),
+            draws_per_trial, len(members) - draws_per_trial))
+
+    prior = np.concatenate(priors)
+    if (contest.prior is None
+            and (prior == Contest.pseudocount_for_prior).all()):
+        prior = None
+    pooled_contest = Contest(np.concatenate(tallies),
+                             np.concatenate(totals),
+                             contest.candidate_names, names,
+                             contest.comparison_strata, prior)
+    return pooled_contest, report
@@ -0,0 +1,336 @@
+# bptool/rare.py
+# python3
+
+"""
+Estimating small win probabilities by importance sampling.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import math
+
+import numpy as np
+
+from .contest import as_contest
+from .rng import AuditStreams, trial_blocks
+from .simulation import top_n_candidates
+
+
+##############################################################################
+## Importance sampling for small win probabilities
+##############################################################################
+
+# First element of the spawn keys (RARE_EVENT_STREAM_KEY, county) of the
+# streams of the pilot runs of compute_rare_win_probs; distinct from the
+# simulation streams and from PLANNING_STREAM_KEY.
+RARE_EVENT_STREAM_KEY = 2 ** 32 + 1
+
+# The tilts tried by the pilot runs of compute_rare_win_probs.
+RARE_EVENT_TILTS = (0.0, 0.3, 0.4, 0.5, 0.6, 0.7)
+
+# The least number of wins a pilot run must see for its tilt to be chosen
+# by its estimated variance.
+RARE_EVENT_MIN_PILOT_WINS = 20
+
+# An estimate of compute_rare_win_probs.
+#  -candidate is the index (1, 2, ...) of the candidate, as in the pairs
+#   returned by compute_win_probs.
+#  -probability is the estimated probability that the candidate is among
+#   the top vote_for_n candidates in a full recount.
+#  -standard_error is the standard error of probability.
+#  -rival is the index (1, 2, ...) of the candidate the Dirichlet
+#   posteriors were tilted away from, or None.
+#  -tilt is the tilt used (0 for plain simulation).
+#  -wins is the number of trials in which the candidate won.
+RareWinProb = collections.namedtuple(
+    "RareWinProb",
+    ["candidate", "probability", "standard_error", "rival", "tilt", "wins"])
+
+
+def tilt_shift(alphas, candidate_index, rival_index, tilt):
+    """
+    Return the amount tilted_alphas moves from the rival's parameter to
+    the candidate's: the fraction tilt of their difference, or 0 in a
+    county where the candidate's parameter is already the larger.
+    Tilting those counties too would move votes away from the candidate
+    there, which only makes the candidate's wins rarer and the
+    likelihood ratios more variable.
+    """
+
+    if tilt == 0:
+        return 0.0
+    return max(tilt * (alphas[rival_index] - alphas[candidate_index]), 0.0)
+
+
+def tilted_alphas(alphas, candidate_index, rival_index, tilt):
+    """
+    Tilt the parameters of a county's Dirichlet posterior toward a
+    candidate, by moving the fraction tilt of the difference between the
+    rival's parameter and the candidate's from the one to the other (see
+    tilt_shift).  Tilt 0 leaves the parameters unchanged, and tilt 0.5
+    gives the two candidates the same expected share in the counties
+    where the rival leads; the total is unchanged.
+
+    Input Parameters:
+
+    -alphas is a float64 array, a row of Contest.alphas.
+
+    -candidate_index and rival_index are the (0-based) indices of the
+    candidates.
+
+    -tilt is a number between 0 and 1.
+
+    Returns:
+
+    -the pair (tilted, log_ratio_constant): tilted is the array of tilted
+    parameters, and log_ratio_constant is the logarithm of the ratio of
+    the normalizing constants of the tilted and the original Dirichlet
+    densities, as used by tilted_final_tallies.
+    """
+
+    tilted = np.array(alphas, dtype=np.float64)
+    shift = tilt_shift(alphas, candidate_index, rival_index, tilt)
+    tilted[candidate_index] += shift
+    tilted[rival_index] -= shift
+    log_ratio_constant = (math.lgamma(tilted[candidate_index])
+                          - math.lgamma(alphas[candidate_index])
+                          + math.lgamma(tilted[rival_index])
+                          - math.lgamma(alphas[rival_index]))
+    return tilted, log_ratio_constant
+
+
+def tilted_final_tallies(sample_tallies, total_num_votes, num_trials,
+                         county_rs, candidate_index, rival_index, tilt):
+    """
+    Simulate the final tallies of num_trials trials, as
+    simulate_block_vectorized does, but drawing each county's shares from
+    its tilted Dirichlet posterior (see tilted_alphas), and return the
+    likelihood ratio of each trial.
+
+    The likelihood ratio of a trial is the product over the counties of
+    the original Dirichlet density of the shares drawn over their tilted
+    density: as only the candidate's and the rival's parameters differ,
+        log ratio = sum over counties of
+                    log_ratio_constant - shift * log(share of candidate)
+                                       + shift * log(share of rival),
+    where shift is the amount moved by tilted_alphas (see tilt_shift).
+    The multinomial draws are not tilted, so do not enter the ratio.
+
+    Input Parameters:
+
+    -sample_tallies and total_num_votes are as for compute_win_probs.
+
+    -num_trials is the number of trials to simulate.
+
+    -county_rs is a list giving one numpy.random.Generator per county.
+
+    -candidate_index, rival_index and tilt are as for tilted_alphas; with
+    tilt 0 the draws are exactly those of simulate_block_vectorized.
+
+    Returns:
+
+    -the pair (final_tallies, log_weights): final_tallies is as returned
+    by simulate_block_vectorized, and log_weights is a float64 array
+    giving the logarithm of the likelihood ratio of each trial.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    final_tallies = np.empty((num_trials, contest.num_candidates),
+                             dtype=np.int64)
+    final_tallies[:] = contest.sample_total
+    log_weights = np.zeros(num_trials, dtype=np.float64)
+    for i in contest.simulated_counties:
+        alphas = contest.alphas[i]
+        shift = tilt_shift(alphas, candidate_index, rival_index, tilt)
+        if shift != 0:
+            alphas, log_ratio_constant = tilted_alphas(
+                alphas, candidate_index, rival_index, tilt)
+        rs = county_rs[i]
+        shares = rs.gamma(alphas, size=(num_trials, contest.num_candidates))
+        shares /= shares.sum(axis=1, keepdims=True)
+        if shift != 0:
+            log_weights += (log_ratio_constant
+                            - shift * np.log(shares[:, candidate_index])
+                            + shift * np.log(shares[:, rival_index]))
+        final_tallies += rs.multinomial(contest.nonsample_sizes[i], shares)
+    return final_tallies, log_weights
+
+
+def tilted_win_moments(sample_tallies, total_num_votes, num_trials,
+                       county_rs, vote_for_n, candidate_index, rival_index,
+                       tilt):
+    """
+    Simulate num_trials tilted trials (see tilted_final_tallies) and
+    return the triple (sum_weights, sum_squared_weights, wins): the sums,
+    over the trials in which the candidate is among the top vote_for_n
+    candidates, of the likelihood ratio and of its square, and the number
+    of those trials.
+    """
+
+    final_tallies, log_weights = tilted_final_tallies(
+        sample_tallies, total_num_votes, num_trials, county_rs,
+        candidate_index, rival_index, tilt)
+    winners = top_n_candidates(final_tallies, vote_for_n)
+    won = (winners == candidate_index).any(axis=1)
+    weights = np.exp(log_weights[won])
+    return (float(weights.sum()), float((weights ** 2).sum()),
+            int(won.sum()))
+
+
+def tilted_block_win_moments(sample_tallies, total_num_votes, seed,
+                             num_trials, vote_for_n, candidate_index,
+                             rival_index, tilt, block_index):
+    """
+    Run tilted_win_moments on the trials of one block (see trial_blocks),
+    with the block's county streams.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    _, start, stop = trial_blocks(num_trials)[block_index]
+    county_rs = AuditStreams(seed).county_streams(block_index,
+                                                  contest.num_counties)
+    return tilted_win_moments(contest, None, stop - start, county_rs,
+                              vote_for_n, candidate_index, rival_index, tilt)
+
+
+def rival_candidate(sample_tallies, total_num_votes, candidate_index,
+                    vote_for_n):
+    """
+    Return the (0-based) index of the candidate a candidate must beat to
+    be among the top vote_for_n: the vote_for_n-th of the other
+    candidates by expected final tally, or None if the candidate is
+    expected to win already (or always wins).
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    expected = contest.sample_total + (
+        contest.nonsample_sizes[:, None] * contest.alphas
+        / contest.alphas.sum(axis=1, keepdims=True)).sum(axis=0)
+    others = [j for j in np.argsort(-expected, kind="stable")
+              if j != candidate_index]
+    if len(others) < vote_for_n:
+        return None
+    rival_index = int(others[vote_for_n - 1])
+    if expected[candidate_index] >= expected[rival_index]:
+        return None
+    return rival_index
+
+
+def compute_rare_win_probs(sample_tallies,
+                           total_num_votes,
+                           seed,
+                           num_trials,
+                           candidate_names,
+                           vote_for_n,
+                           candidates=None,
+                           pilot_trials=1000,
+                           tilts=RARE_EVENT_TILTS,
+                           workers=1):
+    """
+    Estimate the probability that each candidate wins a full recount by
+    importance sampling, which gives small probabilities (say 1e-4, of
+    the trailing candidates) accurately from a few thousand trials, where
+    compute_win_probs would need millions before seeing a single win.
+
+    For each candidate, every county's Dirichlet posterior is tilted
+    toward the candidate and away from its rival (see rival_candidate and
+    tilted_alphas), and every win is weighted by its likelihood ratio
+    (see tilted_final_tallies), so the estimate is unbiased whatever the
+    tilt.  The tilt is the one of tilts whose pilot run of pilot_trials
+    trials gives the smallest estimated variance.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, candidate_names,
+    vote_for_n and workers are as for compute_win_probs.
+
+    -candidates is None, or a list of the indices (1, 2, ...) of the
+    candidates to estimate the probabilities of; None means all.
+
+    -pilot_trials is the number of trials of each pilot run.
+
+    -tilts is the sequence of tilts (between 0 and 1) to choose from;
+    including 0 lets candidates that are not rare winners be simulated
+    plainly, as the "vectorized" engine of compute_win_probs does.
+
+    Returns:
+
+    -estimates is a list of RareWinProb, one per candidate, in the order
+    of candidates.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if contest.comparison_strata:
+        raise ValueError("compute_rare_win_probs: contests with comparison "
+                         "strata are not supported.")
+    if candidates is None:
+        candidates = range(1, contest.num_candidates + 1)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    streams = AuditStreams(seed)
+    blocks = trial_blocks(num_trials)
+    workers = min(workers, len(blocks))
+
+    estimates = []
+    executor = None
+    try:
+        if workers > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        for candidate in candidates:
+            candidate_index = candidate - 1
+            if not 0 <= candidate_index < contest.num_candidates:
+                raise ValueError("compute_rare_win_probs: there is no "
+                                 "candidate {}.".format(candidate))
+            rival_index = rival_candidate(contest, None, candidate_index,
+                                          vote_for_n)
+            tilt = 0.0
+            if rival_index is not None and len(tilts) > 1:
+                # Every tilt is tried on the same pilot streams.
+                pilots = []
+                for pilot_tilt in tilts:
+                    county_rs = [
+                        streams.stream(RARE_EVENT_STREAM_KEY, i)
+                        for i in range(contest.num_counties)]
+                    sum_weights, sum_squared_weights, wins = \
+                        tilted_win_moments(contest, None, pilot_trials,
+                                           county_rs, vote_for_n,
+                                           candidate_index, rival_index,
+                                           pilot_tilt)
+                    mean = sum_weights / pilot_trials
+                    variance = sum_squared_weights / pilot_trials - mean ** 2
+                    # Tilts whose pilots saw too few wins to estimate
+                    # the variance come last, by number of wins.
+                    if wins >= RARE_EVENT_MIN_PILOT_WINS:
+                        pilots.append((0, variance, pilot_tilt))
+                    else:
+                        pilots.append((1, -wins, pilot_tilt))
+                _, _, tilt = min(pilots)
+            elif rival_index is not None:
+                tilt = tilts[0]
+
+            run_block = functools.partial(tilted_block_win_moments,
+                                          contest, None, seed, num_trials,
+                                          vote_for_n, candidate_index,
+                                          rival_index, tilt)
+            if executor is None:
+                results = map(run_block, range(len(blocks)))
+            else:
+                results = executor.map(run_block, range(len(blocks)))
+            sum_weights = sum_squared_weights = 0.0
+            wins = 0
+            for block_sums in results:
+                sum_weights += block_sums[0]
+                sum_squared_weights += block_sums[1]
+                wins += block_sums[2]
+            probability = sum_weights / num_trials
+            variance = max(sum_squared_weights / num_trials
+                           - probability ** 2, 0.0)
+            estimates.append(RareWinProb(
+                candidate, probability, math.sqrt(variance / num_trials),
+                None if rival_index is None else rival_index + 1,
+                tilt, wins))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return estimates
@@ -0,0 +1,153 @@
+# bptool/rng.py
+# python3
+
+"""
+Random number generation: the legacy per-trial seeding, and the
+independent per-(block, county) streams used by default.
+"""
+
+import numpy as np
+
+
+##############################################################################
+## Random number generation
+##############################################################################
+
+# This function is taken from audit-lab directly.
+def convert_int_to_32_bit_numpy_array(v):
+    """
+    Convert value v, which should be an arbitrarily large python integer
+    (or convertible to one) to a numpy array of 32-bit values,
+    since this format is needed to initialize a numpy.random.RandomState
+    object.  More precisely, the result is a numpy array of type int64,
+    but each value is between 0 and 2**32-1, inclusive.
+
+    Example: input 2**64 + 5 yields np.array([5, 0, 1], dtype=int)
+
+    Input Parameters:
+
+    -v is an integer, representing the audit seed that's being
+    passed in. We expect v to be non-negative.
+
+    Returns:
+
+    -numpy array created deterministically from v that will
+    be used to initialize the Numpy RandomState.
+    """
+
+    v = int(v)
+    if v < 0:
+        raise ValueError(("convert_int_to_32_bit_numpy_array: "
+                          "{} is not a nonnegative integer, "
+                          "or convertible to one.").format(v))
+    v_parts = []
+    radix = 2 ** 32
+    while v > 0:
+        v_parts.append(v % radix)
+        v = v // radix
+    # note: v_parts will be empty list if v==0, that is OK
+    return np.array(v_parts, dtype=np.int64)
+
+
+def create_rs(seed):
+    """
+    Create and return a Numpy RandomState object for a given seed.
+    The input seed should be a python integer, arbitrarily large.
+    The purpose of this routine is to make all the audit actions reproducible.
+
+    Input Parameters:
+
+    -seed is an integer or None. Assuming that it isn't None, we
+    convert it into a Numpy Array.
+
+    Returns:
+
+    -a Numpy RandomState object, based on the seed, or the clock
+    time if the seed is None.
+    """
+
+    if seed is not None:
+        seed = convert_int_to_32_bit_numpy_array(seed)
+    return np.random.RandomState(seed)
+
+
+# Number of consecutive trials that share one set of county streams.
+# Changing it changes the results obtained for a given seed.
+TRIALS_PER_BLOCK = 2000
+
+
+def trial_blocks(num_trials):
+    """
+    Split the trials of an audit into blocks of TRIALS_PER_BLOCK
+    consecutive trials (the last block may be shorter).
+
+    Input Parameters:
+
+    -num_trials is the total number of trials.
+
+    Returns:
+
+    -a list of triples (block_index, start, stop); block block_index
+    consists of trials start, start+1, ..., stop-1.
+    """
+
+    return [(block_index, start, min(start + TRIALS_PER_BLOCK, num_trials))
+            for block_index, start
+            in enumerate(range(0, num_trials, TRIALS_PER_BLOCK))]
+
+
+class AuditStreams:
+    """
+    Independent, reproducible random number streams for an audit.
+
+    All streams are derived from the audit seed with a Numpy SeedSequence.
+    The stream for trial block b and county i is a numpy.random.Generator
+    seeded with the SeedSequence whose spawn key is (b, i), which is what
+        SeedSequence(seed).spawn(b + 1)[b].spawn(i + 1)[i]
+    returns.  Thus any stream can be created directly, without creating
+    the others, and distinct (block, county) pairs get statistically
+    independent streams.
+
+    Input Parameters:
+
+    -seed is a non-negative integer or None.  If it is None, fresh entropy
+    is taken from the operating system, and the streams are not
+    reproducible.
+    """
+
+    def __init__(self, seed):
+        if seed is not None:
+            seed = int(seed)
+            if seed < 0:
+                raise ValueError("AuditStreams: seed {} is not a "
+                                 "nonnegative integer.".format(seed))
+        self.seed_sequence = np.random.SeedSequence(seed)
+
+    def county_stream(self, block_index, county_index):
+        """
+        Return a new numpy.random.Generator for the given trial block
+        and county.
+        """
+
+        return self.stream(block_index, county_index)
+
+    def stream(self, *spawn_key):
+        """
+        Return a new numpy.random.Generator for the given spawn key, a
+        tuple of non-negative integers.  Keys of two integers are the
+        (block, county) keys of county_stream; other routines needing
+        streams of their own use keys that cannot collide with those.
+        """
+
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy,
+                                               spawn_key=spawn_key)
+        return np.random.Generator(np.random.PCG64(seed_sequence))
+
+    def county_streams(self, block_index, num_counties):
+        """
+        Return a list of the num_counties county streams for the given
+        trial block.
+        """
+
+        return [self.county_stream(block_index, i)
+                for i in range(num_counties)]
@@ -0,0 +1,385 @@
+# bptool/scenarios.py
+# python3
+
+"""
+Comparing variants of a contest (scenarios) with common random numbers.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import json
+import time
+
+import numpy as np
+
+from .contest import Contest, as_contest
+from .rng import AuditStreams, trial_blocks
+from .simulation import top_n_candidates
+
+
+##############################################################################
+## Scenario sweeps with common random numbers
+##############################################################################
+
+# A variant of a contest.
+#  -name is a string.
+#  -prior_pseudocount is the positive pseudocount added to every sample
+#   tally to give the Dirichlet posterior (1 in the rest of this package).
+#   If the contest has a prior of its own (see Contest), the scenario's
+#   prior is the contest's plus prior_pseudocount - 1, so the default
+#   scenario keeps the contest's prior.
+#  -excluded_counties is a sequence of indices of counties left out of
+#   the contest altogether: neither their sampled nor their unsampled
+#   votes are counted.
+#  -tally_changes is None, or a dict mapping county indices to the sample
+#   tallies (lists of integers, one per candidate) used in place of the
+#   contest's, as in "what if the sample of this county had been ...".
+Scenario = collections.namedtuple(
+    "Scenario",
+    ["name", "prior_pseudocount", "excluded_counties", "tally_changes"],
+    defaults=(1, (), None))
+
+# The results of compute_scenario_win_probs.
+#  -num_trials is the number of trials.
+#  -scenario_names is the list of the scenarios' names.
+#  -win_probs is a (scenarios x candidates) numpy array; win_probs[s, j]
+#   is the estimated probability that candidate j wins in scenario s.
+#  -standard_errors is the array of the standard errors of win_probs.
+#  -difference_standard_errors is a (scenarios x scenarios x candidates)
+#   numpy array; difference_standard_errors[s, r, j] is the standard error
+#   of win_probs[s, j] - win_probs[r, j], estimated from the paired trials.
+ScenarioSweep = collections.namedtuple(
+    "ScenarioSweep",
+    ["num_trials", "scenario_names", "win_probs", "standard_errors",
+     "difference_standard_errors"])
+
+
+def draw_coupled_nonsample_tallies(alphas, nonsample_sizes, num_trials, rs,
+                                   timer=None):
+    """
+    Draw num_trials simulations of the unsampled votes of one county
+    under several Dirichlet posteriors at once, with common random
+    numbers: the posteriors share their gamma variates as far as the
+    additivity of the gamma distribution allows.
+
+    For each candidate, the posteriors are sorted by their parameter
+    a_1 <= a_2 <= ..., and the gamma variates are
+        G_1 ~ Gamma(a_1),  G_k = G_(k-1) + Gamma(a_k - a_(k-1)),
+    so each has the right distribution, and posteriors with equal
+    parameters get equal variates.  The multinomial draws are made
+    separately for each posterior; when the unsampled votes far outnumber
+    the sampled ones their variance is small next to that of the
+    Dirichlet.  With a single posterior, the draws are exactly those of
+    draw_nonsample_tallies.
+
+    Input Parameters:
+
+    -alphas is a float64 array of shape (posteriors, candidates) giving
+    the parameters of each posterior.
+
+    -nonsample_sizes is an int64 array giving the number of unsampled
+    votes under each posterior.
+
+    -num_trials is the number of simulations to draw.
+
+    -rs is a numpy.random.Generator used for all the random draws.
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -nonsample_tallies is a numpy array of int64 of shape
+    (num_trials, posteriors, candidates).
+    """
+
+    if timer is not None:
+        start = time.perf_counter()
+    num_posteriors, num_candidates = alphas.shape
+    gamma_sample = rs.gamma(alphas.min(axis=0),
+                            size=(num_trials, num_candidates))[:, None, :]
+    if num_posteriors > 1:
+        order = np.argsort(alphas, axis=0, kind="stable")
+        increments = rs.standard_gamma(
+            np.diff(np.take_along_axis(alphas, order, axis=0), axis=0),
+            size=(num_trials, num_posteriors - 1, num_candidates))
+        sorted_sample = np.concatenate(
+            [gamma_sample, gamma_sample + np.cumsum(increments, axis=1)],
+            axis=1)
+        gamma_sample = np.take_along_axis(
+            sorted_sample, np.argsort(order, axis=0)[None], axis=1)
+    gamma_sample /= gamma_sample.sum(axis=2, keepdims=True)
+    if timer is not None:
+        start = timer.lap("gamma", start)
+
+    multinomial_sample = rs.multinomial(nonsample_sizes, gamma_sample)
+    if timer is not None:
+        timer.lap("multinomial", start)
+    return multinomial_sample
+
+
+def scenario_county_groups(sample_tallies, total_num_votes, scenarios):
+    """
+    Work out, for every county, which scenarios share a posterior, so
+    that each distinct posterior of a county is simulated once per trial.
+
+    Input Parameters:
+
+    -sample_tallies and total_num_votes are as for compute_win_probs.
+
+    -scenarios is a list of Scenario.
+
+    Returns:
+
+    -the pair (county_groups, sample_totals).  county_groups has one
+    triple (alphas, nonsample_sizes, scenario_groups) per county:
+    alphas and nonsample_sizes are as for draw_coupled_nonsample_tallies,
+    and scenario_groups[s] is the index of scenario s's posterior, or -1
+    if scenario s excludes the county.  sample_totals is a (scenarios x
+    candidates) int64 array giving each candidate's total number of
+    votes in the samples of each scenario.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    num_scenarios = len(scenarios)
+    tallies = np.repeat(contest.sample_tallies[None], num_scenarios, axis=0)
+    included = np.ones((num_scenarios, contest.num_counties), dtype=bool)
+    priors = np.empty(num_scenarios, dtype=np.float64)
+    for s, scenario in enumerate(scenarios):
+        if not scenario.prior_pseudocount > 0:
+            raise ValueError("scenario_county_groups: scenario {} has prior "
+                             "pseudocount {}; it must be positive."
+                             .format(scenario.name,
+                                     scenario.prior_pseudocount))
+        priors[s] = scenario.prior_pseudocount
+        changes = dict(scenario.tally_changes or {})
+        for i in list(scenario.excluded_counties) + list(changes):
+            if not 0 <= i < contest.num_counties:
+                raise ValueError("scenario_county_groups: scenario {} "
+                                 "refers to county {}, but there are {} "
+                                 "counties.".format(scenario.name, i,
+                                                    contest.num_counties))
+        included[s, list(scenario.excluded_counties)] = False
+        for i, tally in changes.items():
+            tally = np.asarray(tally, dtype=np.int64)
+            if (tally.shape != (contest.num_candidates,)
+                    or (tally < 0).any()
+                    or tally.sum() > contest.total_num_votes[i]):
+                raise ValueError("scenario_county_groups: scenario {} "
+                                 "gives county {} the sample tally {}, "
+                                 "which is not valid for {} candidates "
+                                 "and {} votes.".format(
+                                     scenario.name, i, tally.tolist(),
+                                     contest.num_candidates,
+                                     contest.total_num_votes[i]))
+            tallies[s, i] = tally
+    nonsample_sizes = contest.total_num_votes - tallies.sum(axis=2)
+    if contest.prior is None:
+        alphas = tallies + priors[:, None, None]
+    else:
+        alphas = (tallies + contest.prior +
+                  (priors - Contest.pseudocount_for_prior)[:, None, None])
+        invalid = np.argwhere((alphas <= 0).any(axis=2) & included)
+        if len(invalid):
+            s, i = invalid[0]
+            raise ValueError("scenario_county_groups: scenario {} gives "
+                             "county {} non-positive Dirichlet parameters "
+                             "{}.".format(scenarios[s].name, i,
+                                          alphas[s, i].tolist()))
+    sample_totals = (tallies * included[:, :, None]).sum(axis=1)
+
+    county_groups = []
+    for i in range(contest.num_counties):
+        scenario_groups = np.full(num_scenarios, -1, dtype=np.int64)
+        members = np.flatnonzero(included[:, i])
+        if members.size == 0:
+            county_groups.append((alphas[:0, i], nonsample_sizes[:0, i],
+                                  scenario_groups))
+            continue
+        rows = np.column_stack([nonsample_sizes[members, i],
+                                alphas[members, i]])
+        unique_rows, inverse = np.unique(rows, axis=0, return_inverse=True)
+        scenario_groups[members] = inverse.ravel()
+        county_groups.append((np.ascontiguousarray(unique_rows[:, 1:]),
+                              unique_rows[:, 0].astype(np.int64),
+                              scenario_groups))
+    return county_groups, sample_totals
+
+
+def scenario_block_win_counts(sample_tallies, total_num_votes, seed,
+                              num_trials, county_groups, sample_totals,
+                              vote_for_n, block_index):
+    """
+    Simulate one block of trials (see trial_blocks) of every scenario,
+    from the same random streams as the "vectorized" engine of
+    compute_win_probs, and count the wins.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials and vote_for_n are
+    as for compute_win_probs.
+
+    -county_groups and sample_totals are as returned by
+    scenario_county_groups.
+
+    -block_index is the index of the block to run.
+
+    Returns:
+
+    -the pair (win_count, joint_win_count) of int64 arrays:
+    win_count[s, j] is the number of trials of the block in which
+    candidate j is among the top vote_for_n candidates of scenario s, and
+    joint_win_count[s, r, j] the number in which it is in both
+    scenarios s and r.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    _, start, stop = trial_blocks(num_trials)[block_index]
+    block_trials = stop - start
+    num_scenarios, num_candidates = sample_totals.shape
+    county_rs = AuditStreams(seed).county_streams(block_index,
+                                                  contest.num_counties)
+    final_tallies = np.empty((num_scenarios, block_trials, num_candidates),
+                             dtype=np.int64)
+    final_tallies[:] = sample_totals[:, None, :]
+    for i, (alphas, nonsample_sizes, scenario_groups) in \
+            enumerate(county_groups):
+        if not nonsample_sizes.any():
+            # Excluded or fully audited in every scenario.
+            continue
+        nonsample_tallies = draw_coupled_nonsample_tallies(
+            alphas, nonsample_sizes, block_trials, county_rs[i])
+        members = np.flatnonzero(scenario_groups >= 0)
+        final_tallies[members] += nonsample_tallies[
+            :, scenario_groups[members]].transpose(1, 0, 2)
+
+    winners = top_n_candidates(final_tallies, vote_for_n)
+    wins = np.zeros(final_tallies.shape, dtype=np.int64)
+    np.put_along_axis(wins, winners, 1, axis=2)
+    joint_win_count = np.einsum("stj,rtj->srj", wins, wins)
+    return wins.sum(axis=1), joint_win_count
+
+
+def compute_scenario_win_probs(sample_tallies,
+                               total_num_votes,
+                               seed,
+                               num_trials,
+                               candidate_names,
+                               scenarios,
+                               vote_for_n=1,
+                               workers=1):
+    """
+    Estimate the win probabilities of several variants of a contest
+    (different prior pseudocounts, counties excluded, what-if sample
+    tallies) from the same trials.  Every scenario is simulated from the
+    same random streams, and the scenarios' posteriors share their gamma
+    variates (see draw_coupled_nonsample_tallies), so the differences
+    between scenarios are estimated with much less Monte Carlo noise than
+    separate runs of compute_win_probs would give them.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, candidate_names,
+    vote_for_n and workers are as for compute_win_probs.
+
+    -scenarios is a non-empty list of Scenario.  A single scenario with
+    the default fields gives the results of compute_win_probs with the
+    "vectorized" engine.
+
+    Returns:
+
+    -sweep is a ScenarioSweep.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if contest.comparison_strata:
+        raise ValueError("compute_scenario_win_probs: contests with "
+                         "comparison strata are not supported.")
+    if not scenarios:
+        raise ValueError("compute_scenario_win_probs: no scenarios given.")
+    county_groups, sample_totals = scenario_county_groups(contest, None,
+                                                          scenarios)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    num_scenarios, num_candidates = sample_totals.shape
+    blocks = trial_blocks(num_trials)
+    run_block = functools.partial(scenario_block_win_counts, contest, None,
+                                  seed, num_trials, county_groups,
+                                  sample_totals, vote_for_n)
+    win_count = np.zeros((num_scenarios, num_candidates), dtype=np.int64)
+    joint_win_count = np.zeros((num_scenarios, num_scenarios,
+                                num_candidates), dtype=np.int64)
+    workers = min(workers, len(blocks))
+    executor = None
+    try:
+        if workers <= 1:
+            results = map(run_block, range(len(blocks)))
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            results = executor.map(run_block, range(len(blocks)))
+        for block_win_count, block_joint_win_count in results:
+            win_count += block_win_count
+            joint_win_count += block_joint_win_count
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    win_probs = win_count / float(num_trials)
+    joint_win_probs = joint_win_count / float(num_trials)
+    standard_errors = np.sqrt(win_probs * (1 - win_probs) / num_trials)
+    # The difference of two win indicators has mean p_s - p_r and second
+    # moment p_s + p_r - 2 p_sr, where p_sr is the joint win probability.
+    differences = win_probs[:, None, :] - win_probs[None, :, :]
+    difference_variances = (win_probs[:, None, :] + win_probs[None, :, :]
+                            - 2 * joint_win_probs - differences ** 2)
+    difference_standard_errors = np.sqrt(
+        np.maximum(difference_variances, 0) / num_trials)
+    return ScenarioSweep(num_trials, [scenario.name for scenario in scenarios],
+                         win_probs, standard_errors,
+                         difference_standard_errors)
+
+
+def read_scenarios_file(path, county_names):
+    """
+    Read a list of scenarios from a JSON file holding a list of objects
+    such as
+        {"name": "without county 2, prior 0.5",
+         "prior_pseudocount": 0.5,
+         "exclude": ["2"],
+         "tallies": {"1": [35, 10]}}
+    where every field but "name" is optional, and counties are given by
+    name.
+
+    Input Parameters:
+
+    -path is a string, the path of the file.
+
+    -county_names is the list of the names of the contest's counties.
+
+    Returns:
+
+    -scenarios is a list of Scenario.
+    """
+
+    with open(path) as f:
+        entries = json.load(f)
+    county_index = {str(name).strip(): i
+                    for i, name in enumerate(county_names)}
+    scenarios = []
+    for entry in entries:
+        unknown = [str(name) for name in
+                   list(entry.get("exclude", []))
+                   + list(entry.get("tallies", {}))
+                   if str(name).strip() not in county_index]
+        if unknown:
+            raise ValueError("read_scenarios_file: scenario {} refers to "
+                             "unknown counties {}.".format(entry.get("name"),
+                                                           unknown))
+        scenarios.append(Scenario(
+            str(entry["name"]),
+            entry.get("prior_pseudocount", 1),
+            [county_index[str(name).strip()]
+             for name in entry.get("exclude", [])],
+            {county_index[str(name).strip()]: tally
+             for name, tally in entry.get("tallies", {}).items()}))
+    return scenarios
@@ -0,0 +1,435 @@
+# bptool/service.py
+# python3
+
+"""
+An HTTP/JSON service computing win probabilities, and its client.
+"""
+
+import asyncio
+import concurrent.futures
+import http.client
+import json
+import sys
+
+import numpy as np
+
+from .cache import ResultCache
+from .contest import Contest
+from .modes import ENGINES, RNG_MODES
+from .rng import trial_blocks
+from .simulation import compute_block_win_count
+
+
+##############################################################################
+## Audit service (HTTP/JSON)
+##############################################################################
+
+# HTTP reason phrases of the status codes used by AuditServer.
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+
+
+def parse_win_probs_request(body):
+    """
+    Parse and check the JSON body of a request to the /win_probs endpoint
+    of AuditServer.
+
+    Input Parameters:
+
+    -body is the request body, as bytes.  It should be a JSON object with
+    keys "sample_tallies" and "total_num_votes" (as for
+    compute_win_probs), and optionally "seed" (default 1), "num_trials"
+    (default 10000), "vote_for_n" (default 1), "engine" (default
+    "vectorized"), "rng_mode" (default "streams") and "stream" (default
+    false; if true, progress is streamed, see AuditServer).
+
+    Returns:
+
+    -request is a dict with all of the above keys, and "contest", the
+    Contest built from the tallies; the tallies are numpy arrays.
+    A ValueError is raised if the request is invalid.
+    """
+
+    try:
+        data = json.loads(body.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError("request body is not valid JSON")
+    if not isinstance(data, dict):
+        raise ValueError("request body is not a JSON object")
+    for required in ("sample_tallies", "total_num_votes"):
+        if required not in data:
+            raise ValueError("request lacks {}".format(required))
+    request = {"seed": 1, "num_trials": 10000, "vote_for_n": 1,
+               "engine": "vectorized", "rng_mode": "streams",
+               "stream": False}
+    request.update(data)
+    try:
+        sample_tallies = np.array(request["sample_tallies"], dtype=np.int64)
+        total_num_votes = np.array(request["total_num_votes"],
+                                   dtype=np.int64)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("tallies must be integers")
+    if (sample_tallies.ndim != 2 or sample_tallies.shape[1] == 0 or
+            total_num_votes.shape != sample_tallies.shape[:1]):
+        raise ValueError("sample_tallies must have one row per county, "
+                         "and total_num_votes one entry per county")
+    if (np.any(sample_tallies < 0) or
+            np.any(sample_tallies.sum(axis=1) > total_num_votes)):
+        raise ValueError("a county has a negative count or a sample "
+                         "larger than its total votes")
+    if request["engine"] not in ENGINES:
+        raise ValueError("unknown engine {}".format(request["engine"]))
+    if request["rng_mode"] not in RNG_MODES:
+        raise ValueError("unknown rng_mode {}".format(request["rng_mode"]))
+    if request["engine"] == "vectorized" and request["rng_mode"] == "legacy":
+        raise ValueError("the vectorized engine does not support "
+                         "rng_mode legacy")
+    if request["seed"] is None:
+        request["seed"] = np.random.SeedSequence().entropy
+    for key in ("seed", "num_trials", "vote_for_n"):
+        # JSON true and false are Python ints too.
+        if (isinstance(request[key], bool) or
+                not isinstance(request[key], int) or request[key] < 0):
+            raise ValueError("{} must be a non-negative integer".format(key))
+    if request["num_trials"] == 0 or request["vote_for_n"] == 0:
+        raise ValueError("num_trials and vote_for_n must be positive")
+    request["sample_tallies"] = sample_tallies
+    request["total_num_votes"] = total_num_votes
+    request["contest"] = Contest(sample_tallies, total_num_votes)
+    return request
+
+
+class AuditJob:
+    """
+    A computation of AuditServer in progress, shared by all the requests
+    with the same inputs.  Progress events are put on the queue of every
+    subscribed request; the last event holds the result (or the error).
+    """
+
+    def __init__(self, num_trials):
+        self.num_trials = num_trials
+        self.trials_done = 0
+        self.subscribers = []
+        self.result = asyncio.get_running_loop().create_future()
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+class AuditServer:
+    """
+    A long-running local service computing win probabilities over a small
+    HTTP/JSON API, so that clients such as dashboards need not pay for
+    starting Python and importing NumPy on every request.
+
+    The server runs on an asyncio event loop; the simulations run in a
+    bounded pool of workers processes, block by block (see trial_blocks),
+    so that the event loop is never blocked.  Concurrent requests with
+    identical inputs are coalesced into a single computation, and
+    finished results are kept in a ResultCache.
+
+    Endpoints:
+
+        GET /health returns {"status": "ok", "jobs": <jobs running>}.
+
+        POST /win_probs takes a JSON request as described in
+        parse_win_probs_request, and returns
+            {"win_probs": [[i, p], ...], "num_trials": <num_trials>}
+        with win_probs as for compute_win_probs.  If the request has
+        "stream": true, the response is instead a stream of JSON lines
+        (application/x-ndjson), one per block of trials done,
+            {"trials_done": <trials>, "num_trials": <num_trials>}
+        followed by a last line with the result as above.
+
+    Errors are reported with status 400 (bad request), 500 (failure of the
+    computation itself) or 503 (too many jobs), and a body
+    {"error": <message>}.
+
+    Input Parameters:
+
+    -workers is the number of worker processes.
+
+    -max_jobs is the maximum number of distinct computations in progress.
+
+    -cache_entries is the number of results kept in memory.
+    """
+
+    def __init__(self, workers=1, max_jobs=64, cache_entries=256):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.cache = ResultCache(max_entries=cache_entries)
+        self.jobs = {}
+        self.executor = None
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """
+        Start the worker pool and listen on host and port.
+        """
+
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 host, port)
+        return self.server
+
+    async def serve_forever(self, host="127.0.0.1", port=8000):
+        """
+        Start the server and serve requests until cancelled.
+        """
+
+        await self.start(host, port)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve one HTTP request on a connection, then close it.
+        """
+
+        try:
+            try:
+                request_line = await reader.readline()
+                method, path = request_line.decode("latin-1").split()[:2]
+                content_length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        content_length = int(value)
+                body = await reader.readexactly(content_length)
+            except (ValueError, asyncio.IncompleteReadError):
+                await self.send_json(writer, 400,
+                                     {"error": "malformed request"})
+                return
+
+            if path == "/health":
+                await self.send_json(writer, 200,
+                                     {"status": "ok",
+                                      "jobs": len(self.jobs)})
+            elif path != "/win_probs":
+                await self.send_json(writer, 404, {"error": "not found"})
+            elif method != "POST":
+                await self.send_json(writer, 405,
+                                     {"error": "use POST"})
+            else:
+                await self.handle_win_probs(writer, body)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def send_json(self, writer, status, data):
+        body = json.dumps(data).encode("utf-8")
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n"
+                     "Content-Length: {}\r\nConnection: close\r\n\r\n"
+                     .format(status, HTTP_REASONS[status], len(body))
+                     .encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle_win_probs(self, writer, body):
+        """
+        Serve a POST /win_probs request.
+        """
+
+        try:
+            request = parse_win_probs_request(body)
+        except ValueError as e:
+            await self.send_json(writer, 400, {"error": str(e)})
+            return
+        key = ResultCache.key(request["contest"], None, request["seed"],
+                              request["num_trials"], request["vote_for_n"],
+                              request["engine"], request["rng_mode"])
+
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.hits += 1
+            job = None
+        elif key in self.jobs:
+            job = self.jobs[key]
+        elif len(self.jobs) >= self.max_jobs:
+            await self.send_json(writer, 503, {"error": "too many jobs"})
+            return
+        else:
+            self.cache.misses += 1
+            job = AuditJob(request["num_trials"])
+            self.jobs[key] = job
+            asyncio.ensure_future(self.run_job(key, job, request))
+
+        if not request["stream"]:
+            if job is not None:
+                try:
+                    result = await asyncio.shield(job.result)
+                except ValueError as e:
+                    await self.send_json(writer, 400, {"error": str(e)})
+                    return
+                except Exception as e:
+                    await self.send_json(writer, 500, {"error": str(e)})
+                    return
+            await self.send_json(writer, 200,
+                                 {"win_probs": result,
+                                  "num_trials": request["num_trials"]})
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\n"
+                     b"Connection: close\r\n\r\n")
+        if job is None:
+            events = [{"win_probs": result,
+                       "num_trials": request["num_trials"]}]
+        else:
+            queue = asyncio.Queue()
+            job.subscribers.append(queue)
+            events = None
+            queue.put_nowait({"trials_done": job.trials_done,
+                              "num_trials": job.num_trials})
+        while True:
+            event = events.pop(0) if events is not None else await queue.get()
+            line = json.dumps(event).encode("utf-8") + b"\n"
+            writer.write("{:x}\r\n".format(len(line)).encode("latin-1") +
+                         line + b"\r\n")
+            await writer.drain()
+            if "win_probs" in event or "error" in event:
+                break
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def run_job(self, key, job, request):
+        """
+        Run the blocks of trials of a job in the worker pool, publishing
+        progress as each block finishes, and finally the result.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        async def run_block(block_index, start, stop):
+            win_count = await loop.run_in_executor(
+                self.executor, compute_block_win_count,
+                request["contest"], None,
+                request["seed"], request["num_trials"],
+                request["vote_for_n"], block_index, request["engine"],
+                request["rng_mode"])
+            return stop - start, win_count
+
+        try:
+            win_count = np.zeros(request["contest"].num_candidates,
+                                 dtype=np.int64)
+            for block in asyncio.as_completed(
+                    [run_block(*block)
+                     for block in trial_blocks(request["num_trials"])]):
+                block_trials, block_win_count = await block
+                win_count += block_win_count
+                job.trials_done += block_trials
+                job.publish({"trials_done": job.trials_done,
+                             "num_trials": job.num_trials})
+            result = [(i + 1, int(win_count[i])/float(job.num_trials))
+                      for i in range(len(win_count))]
+            self.cache.put(key, result)
+            job.result.set_result(result)
+            job.publish({"win_probs": result, "num_trials": job.num_trials})
+        except Exception as e:
+            # A ValueError is a problem with the request, reported with
+            # status 400; anything else (say, a broken worker pool) is
+            # the server's, reported with status 500.
+            job.result.set_exception(e)
+            job.publish({"error": str(e)})
+            # The exception is reported to the requests; do not log it.
+            job.result.exception()
+        finally:
+            del self.jobs[key]
+
+
+def serve(host="127.0.0.1", port=8000, workers=1):
+    """
+    Run an AuditServer on host and port until interrupted.
+    """
+
+    print("BPTOOL serving on http://{}:{}/ with {} worker(s)"
+          .format(host, port, workers))
+    sys.stdout.flush()
+    try:
+        asyncio.run(AuditServer(workers).serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+class AuditClient:
+    """
+    A client for AuditServer, for use by dashboards and scripts (and for
+    testing the server).
+
+    Input Parameters:
+
+    -host and port locate the server.
+
+    -timeout is the socket timeout in seconds, or None.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8000, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _post(self, path, data):
+        connection = http.client.HTTPConnection(self.host, self.port,
+                                                timeout=self.timeout)
+        connection.request("POST", path, json.dumps(data),
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            message = json.loads(response.read().decode("utf-8"))["error"]
+            connection.close()
+            if response.status == 400:
+                raise ValueError(message)
+            raise RuntimeError("server error {}: {}"
+                               .format(response.status, message))
+        return connection, response
+
+    def win_probs(self, sample_tallies, total_num_votes, seed=1,
+                  num_trials=10000, vote_for_n=1, engine="vectorized",
+                  rng_mode="streams", progress=None):
+        """
+        Ask the server for the win probabilities of a contest.
+
+        Input Parameters:
+
+        -sample_tallies, total_num_votes, seed, num_trials, vote_for_n,
+        engine and rng_mode are as for compute_win_probs (but note the
+        default engine).
+
+        -progress is None, or a function called with each progress event
+        (a dict with keys "trials_done" and "num_trials").
+
+        Returns:
+
+        -win_probs, as returned by compute_win_probs.
+        """
+
+        data = {"sample_tallies": [[int(k) for k in sample_tally]
+                                   for sample_tally in sample_tallies],
+                "total_num_votes": [int(k) for k in total_num_votes],
+                "seed": seed, "num_trials": num_trials,
+                "vote_for_n": vote_for_n, "engine": engine,
+                "rng_mode": rng_mode, "stream": progress is not None}
+        connection, response = self._post("/win_probs", data)
+        try:
+            if progress is None:
+                result = json.loads(response.read().decode("utf-8"))
+            else:
+                for line in response:
+                    result = json.loads(line.decode("utf-8"))
+                    if "error" in result:
+                        raise ValueError(result["error"])
+                    if "win_probs" in result:
+                        break
+                    progress(result)
+        finally:
+            connection.close()
+        return [tuple(pair) for pair in result["win_probs"]]
@@ -0,0 +1,706 @@
+# bptool/simulation.py
+# python3
+
+"""
+The simulation of the Bayesian audit: the loop and vectorized engines,
+and compute_win_probs.
+"""
+
+import concurrent.futures
+import functools
+import time
+
+import numpy as np
+
+from .contest import Contest, SCALAR_GAMMA_MAX_CANDIDATES, as_contest
+from .instrumentation import PhaseTimer, ProgressEvent
+from .modes import ENGINES, RNG_MODES
+from .rng import AuditStreams, create_rs, trial_blocks
+
+
+##############################################################################
+## Main computational routines
+##############################################################################
+
+def dirichlet_multinomial(sample_tally, total_num_votes, rs, timer=None):
+    """
+    Return a sample according to the Dirichlet multinomial distribution,
+    given a sample tally, the number of votes in the election,
+    and a random state. There is an additional pseudocount of
+    one vote per candidate in this simulation.
+
+    Input Parameters:
+
+    -sample_tally is a list of integers, where the i'th index
+    in sample_tally corresponds to the number of votes that candidate
+    i received in the sample.
+
+    -total_num_votes is an integer representing the number of
+    ballots that were cast in this election within the county.
+
+    -rs is a Numpy RandomState object that is used for any
+    random functions in the simulation of the remaining votes. In particular,
+    the gamma functions are made deterministic using this state.
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -multinomial_sample is a list of integers, which sums up
+    to the total_num_votes - sample_size. The i'th index represents the
+    simulated number of votes for candidate i in the remaining, unsampled
+    votes.
+    """
+
+    sample_tally = np.asarray(sample_tally, dtype=np.int64)
+    sample_size = int(sample_tally.sum())
+    if sample_size > total_num_votes:
+        raise ValueError("total_num_votes {} less than sample_size {}."
+                         .format(total_num_votes, sample_size))
+
+    nonsample_size = total_num_votes - sample_size
+    sample_with_prior = (sample_tally +
+                         Contest.pseudocount_for_prior).astype(np.float64)
+    if len(sample_with_prior) <= SCALAR_GAMMA_MAX_CANDIDATES:
+        sample_with_prior = sample_with_prior.tolist()
+    return draw_nonsample_tally(sample_with_prior, nonsample_size, rs, timer)
+
+
+def draw_nonsample_tally(alphas, nonsample_size, rs, timer=None):
+    """
+    The inner step of dirichlet_multinomial: draw the unsampled votes of
+    a county from the Dirichlet multinomial distribution with the given
+    parameters.
+
+    Input Parameters:
+
+    -alphas gives the Dirichlet parameter of each candidate (the sample
+    tally plus the prior pseudocount), such as a row of
+    Contest.alpha_rows: a list of floats for up to
+    SCALAR_GAMMA_MAX_CANDIDATES candidates, or a float64 array.
+
+    -nonsample_size is the number of unsampled votes in the county.
+
+    -rs and timer are as for dirichlet_multinomial.
+
+    Returns:
+
+    -multinomial_sample is a numpy array of integers, which sums up to
+    nonsample_size.
+    """
+
+    if timer is not None:
+        start = time.perf_counter()
+
+    # Either way, one gamma variate is drawn per candidate, in candidate
+    # order, and the variates are summed as Python floats, so that the
+    # results of earlier versions of this module are reproduced exactly.
+    if len(alphas) <= SCALAR_GAMMA_MAX_CANDIDATES:
+        gamma_sample = [rs.standard_gamma(k) for k in alphas]
+        gamma_sample_sum = float(sum(gamma_sample))
+        gamma_sample = [k / gamma_sample_sum for k in gamma_sample]
+    else:
+        gamma_sample = rs.standard_gamma(alphas)
+        gamma_sample /= float(sum(gamma_sample.tolist()))
+    if timer is not None:
+        start = timer.lap("gamma", start)
+
+    multinomial_sample = rs.multinomial(nonsample_size, gamma_sample)
+    if timer is not None:
+        timer.lap("multinomial", start)
+
+    return multinomial_sample
+
+
+def generate_nonsample_tally(sample_tally, total_num_votes, seed,
+                             timer=None):
+    """
+    Given a sample_tally, the total number of votes in an election, and a seed,
+    generate the nonsample tally in the election using the Dirichlet multinomial
+    distribution.
+
+    Input Parameters:
+
+    -sample_tally is a list of integers, where the i'th index
+    in sample_tally corresponds to the number of votes that candidate
+    i received in the sample.
+
+    -total_num_votes is an integer representing the number of
+    ballots that were cast in this election within the county.
+
+    -seed is an integer or None. Assuming that it isn't None, we
+    use it to seed the random state for the audit.
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -nonsample_tally is list of integers, which sums up
+    to the total_num_votes - sample_size. The i'th index represents the
+    simulated number of votes for candidate i in the remaining, unsampled
+    votes.
+    """
+
+    if timer is not None:
+        start = time.perf_counter()
+    rs = create_rs(seed)
+    if timer is not None:
+        timer.lap("seeding", start)
+    nonsample_tally = dirichlet_multinomial(sample_tally, total_num_votes, rs,
+                                            timer)
+    return nonsample_tally
+
+
+def compute_winner(sample_tallies, total_num_votes, vote_for_n,
+                   seed, pretty_print=False, county_rs=None, timer=None):
+    """
+    Given a list of sample tallies (one sample tally per county)
+    a list giving the total number of votes cast in each county,
+    and a random seed (an integer)
+    compute the winner in a single simulation.
+    For each county, we use the Dirichlet-Multinomial distribution to generate
+    a nonsample tally. Then, we sum over all the counties to produce our
+    final tally and calculate the predicted winner over all the counties in
+    the election.
+
+    Input Parameters:
+
+    -sample_tallies is a list of lists. Each list represents the sample tally
+    for a given county. So, sample_tallies[i] represents the tally for county
+    i. Then, sample_tallies[i][j] represents the number of votes candidate
+    j receives in county i.  It may also be a Contest, in which case
+    total_num_votes is ignored.
+
+    -total_num_votes is a list of integers. Each integer represents the total
+    number of votes cast in a given county. So, total_num_votes[i] represents
+    the total votes for county i. The sum of all total_num_votes[i] is the
+    total number of votes in the entire election.
+
+    -seed is an integer or None. Assuming that it isn't None, we
+    use it to seed the random state for the audit.
+
+    -vote_for_n is an integer, parsed from the command-line args. Its default
+    value is 1, which means we only calculate a single winner for the election.
+    For other values n, we simulate the unnsampled votes and define a win
+    for candidate i as any time they are in the top n candidates in the final
+    tally.
+
+    -pretty_print is a Boolean, which defaults to False. When it's set to
+    True, we print the winning candidate, the number of votes they have
+    received and the final vote tally for all the candidates.
+
+    -county_rs is None, or a list giving one random state (a Numpy
+    RandomState or Generator) per county, followed by one per comparison
+    stratum of a Contest.  If it is given, the nonsample tally of county
+    i is drawn from county_rs[i] and seed is ignored; otherwise a fresh
+    random state is created from seed for each county.
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -winners is a list of integers, representing the indices of the candidate
+    who won the election. It's size equals the vote_for_n parameter, which
+    defaults to 1.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    final_tallies = contest.sample_total.copy()
+    # Fully audited counties have nothing to simulate.
+    for i in contest.simulated_counties:   # loop over counties
+        if county_rs is None:
+            if timer is not None:
+                start = time.perf_counter()
+            rs = create_rs(seed)
+            if timer is not None:
+                timer.lap("seeding", start)
+        else:
+            rs = county_rs[i]
+        nonsample_tally = draw_nonsample_tally(
+            contest.alpha_rows[i], contest.nonsample_sizes[i], rs, timer)
+        if timer is not None:
+            start = time.perf_counter()
+        final_tallies += nonsample_tally
+        if timer is not None:
+            timer.lap("tally", start)
+    for i, stratum in enumerate(contest.comparison_strata,
+                                contest.num_counties):
+        if county_rs is None:
+            if timer is not None:
+                start = time.perf_counter()
+            rs = create_rs(seed)
+            if timer is not None:
+                timer.lap("seeding", start)
+        else:
+            rs = county_rs[i]
+        final_tallies += draw_comparison_tally(stratum, rs, timer)
+    if timer is not None:
+        start = time.perf_counter()
+    # A stable sort, so ties go to the higher-numbered candidate.
+    order = np.argsort(final_tallies, kind="stable")
+    winners = [int(k) for k in order[-vote_for_n:]]
+    if timer is not None:
+        timer.lap("tally", start)
+    if pretty_print:
+        results_str = ''
+        for winner in winners:
+            results_str += (
+                "Candidate {} is a winner with {} votes. ".format(
+                winner, final_tallies[winner]))
+        results_str += (
+            "The final vote tally for all the candidates "
+            "was {}".format([int(k) for k in final_tallies]))
+        print(results_str)
+    return winners
+
+
+def compute_win_probs(sample_tallies,
+                      total_num_votes,
+                      seed,
+                      num_trials,
+                      candidate_names,
+                      vote_for_n,
+                      engine="loop",
+                      rng_mode="streams",
+                      workers=1,
+                      progress=None,
+                      timer=None):
+    """
+
+    Runs num_trials simulations of the Bayesian audit to estimate
+    the probability that each candidate would win a full recount.
+
+    In particular, we run a single iteration of a Bayesian audit
+    (extend each county's sample to simulate all the votes in the
+    county and calculate the overall winner across counties)
+    num_trials times.
+
+    Input Parameters:
+
+    -sample_tallies is a list of lists. Each list represents the sample tally
+    for a given county. So, sample_tallies[i] represents the tally for county
+    i. Then, sample_tallies[i][j] represents the number of votes candidate
+    j receives in county i.  It may also be a Contest (see Contest), which
+    is used as it is; lists are converted to a Contest once, here.
+
+    -total_num_votes is a list of integers representing the number of
+    ballots that were cast in this election. Each integer represents the total
+    number of votes cast in a given county. So, total_num_votes[i] represents
+    the total votes for county i. The sum of all total_num_votes[i] is the
+    total number of votes in the entire election.  It is ignored (and may
+    be None) if sample_tallies is a Contest.
+
+    -seed is an integer or None. Assuming that it isn't None, we
+    use it to seed the random state for the audit.
+
+    -num_trials is an integer which represents how many simulations
+    of the Bayesian audit we run, to estimate the win probabilities
+    of the candidates.
+
+    -candidate_names is an ordered list of strings, containing the name of
+    every candidate in the contest we are auditing (or None if
+    sample_tallies is a Contest).
+
+    -vote_for_n is an integer, parsed from the command-line args. Its default
+    value is 1, which means we only calculate a single winner for the election.
+    For other values n, we simulate the unnsampled votes and define a win
+    for candidate i as any time they are in the top n candidates in the final
+    tally.
+
+    -engine is a string, one of ENGINES, selecting how the trials are run.
+    "loop" (the default) runs the trials one at a time with compute_winner.
+    "vectorized" runs each block of trials with array operations (see
+    simulate_block_vectorized); it is much faster for large contests.
+    The two engines use their random streams differently, so their
+    results for the same seed differ.
+
+    -rng_mode is a string, one of RNG_MODES, selecting how random numbers
+    are generated.  "streams" (the default) uses one independent stream
+    per (trial block, county), derived from seed (see AuditStreams).
+    "legacy" reproduces exactly the results of earlier versions of this
+    module, which reseeded every county of every trial; it is only
+    supported by the "loop" engine.
+
+    -workers is a positive integer, the number of processes among which
+    the blocks of trials are divided.  Every block's random numbers are
+    derived from seed and the block index alone, and the blocks' win
+    counts are added up, so the results do not depend on workers.
+
+    -progress is None, or a function that is called with a ProgressEvent
+    after every block of trials (in block order).
+
+    -timer is None, or a PhaseTimer that is charged with the time spent
+    in each phase of the simulation (in all the worker processes).
+
+    Returns:
+
+    -win_probs is a list of pairs (i, p) where p is the fractional
+    representation of the number of trials that candidate i has won
+    out of the num_trials simulations.
+    """
+
+    if engine not in ENGINES:
+        raise ValueError("compute_win_probs: unknown engine {}; "
+                         "expected one of {}.".format(engine, ENGINES))
+    if rng_mode not in RNG_MODES:
+        raise ValueError("compute_win_probs: unknown rng_mode {}; "
+                         "expected one of {}.".format(rng_mode, RNG_MODES))
+    if engine == "vectorized" and rng_mode == "legacy":
+        raise ValueError("compute_win_probs: the vectorized engine "
+                         "does not support rng_mode legacy.")
+    if workers < 1:
+        raise ValueError("compute_win_probs: workers must be at least 1, "
+                         "not {}.".format(workers))
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    win_count = [0] + [int(k) for k in compute_win_count(
+        contest, None, seed, num_trials, vote_for_n,
+        engine, rng_mode, workers, progress, timer)]
+    win_probs = [(i, win_count[i]/float(num_trials))
+                 for i in range(1, len(win_count))]
+    return win_probs
+
+
+def compute_win_count(sample_tallies, total_num_votes, seed, num_trials,
+                      vote_for_n, engine, rng_mode, workers, progress=None,
+                      timer=None):
+    """
+    Run all the blocks of trials of an audit, in a pool of workers
+    processes if workers > 1, and add up their win counts.
+
+    Input Parameters:
+
+    -all parameters are as for compute_win_probs.
+
+    Returns:
+
+    -win_count is a numpy array of int64 with one entry per candidate,
+    giving the number of trials in which that candidate was among the
+    top vote_for_n candidates.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    if seed is None and rng_mode == "streams":
+        # All the blocks must share the same (fresh) entropy.
+        seed = np.random.SeedSequence().entropy
+    blocks = trial_blocks(num_trials)
+    block_indices = range(len(blocks))
+    workers = min(workers, len(blocks))
+    if timer is not None and workers > 1:
+        # Each worker times its block with a PhaseTimer of its own.
+        run_block = functools.partial(profiled_block_win_count,
+                                      contest, None, seed,
+                                      num_trials, vote_for_n,
+                                      engine=engine, rng_mode=rng_mode)
+    else:
+        run_block = functools.partial(compute_block_win_count,
+                                      contest, None, seed,
+                                      num_trials, vote_for_n,
+                                      engine=engine, rng_mode=rng_mode,
+                                      timer=timer)
+
+    win_count = np.zeros(contest.num_candidates, dtype=np.int64)
+    start_time = time.perf_counter()
+    executor = None
+    try:
+        if workers <= 1:
+            results = map(run_block, block_indices)
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            results = executor.map(run_block, block_indices)
+        for (_, _, stop), result in zip(blocks, results):
+            if timer is not None and workers > 1:
+                result, block_timer = result
+                timer.merge(block_timer)
+            win_count += result
+            if progress is not None:
+                elapsed = time.perf_counter() - start_time
+                progress(ProgressEvent(
+                    stop, num_trials, elapsed,
+                    stop / elapsed if elapsed > 0 else float("inf"),
+                    tuple(int(k) for k in win_count)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return win_count
+
+
+def profiled_block_win_count(*args, **kwargs):
+    """
+    Run compute_block_win_count with a new PhaseTimer, and return the
+    pair (win_count, timer).  This is used to profile blocks run in
+    worker processes.
+    """
+
+    timer = PhaseTimer()
+    return compute_block_win_count(*args, timer=timer, **kwargs), timer
+
+
+def compute_block_win_count(sample_tallies, total_num_votes, seed,
+                            num_trials, vote_for_n, block_index,
+                            engine, rng_mode, timer=None):
+    """
+    Run the trials of one block (see trial_blocks) of an audit of
+    num_trials trials, and count how often each candidate wins.
+    The counts only depend on the block, not on which other blocks are
+    run or in which order, so the blocks of an audit may be run
+    separately and their counts added up.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, vote_for_n,
+    engine, rng_mode and timer are as for compute_win_probs.
+
+    -block_index is the index of the block to run.
+
+    Returns:
+
+    -win_count is a numpy array of int64 with one entry per candidate,
+    giving the number of trials of the block in which that candidate
+    was among the top vote_for_n candidates.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    num_candidates = contest.num_candidates
+    _, start, stop = trial_blocks(num_trials)[block_index]
+    win_count = np.zeros(num_candidates, dtype=np.int64)
+
+    if rng_mode == "legacy":
+        for i in range(start, stop):
+            # We want a different seed per trial.
+            # Adding i to seed caused correlations, as numpy apparently
+            # adds one per trial, so we multiply i by 314...
+            seed_i = seed + i*314159265
+            winners = compute_winner(contest,
+                                     None,
+                                     vote_for_n,
+                                     seed_i,
+                                     timer=timer)
+            for winner in winners:
+                win_count[winner] += 1
+        return win_count
+
+    if timer is not None:
+        start_time = time.perf_counter()
+    county_rs = AuditStreams(seed).county_streams(block_index,
+                                                  contest.num_strata)
+    if timer is not None:
+        timer.lap("seeding", start_time)
+    if engine == "vectorized":
+        final_tallies = simulate_block_vectorized(
+            contest, None, stop - start, county_rs, timer)
+        if timer is not None:
+            start_time = time.perf_counter()
+        winners = top_n_candidates(final_tallies, vote_for_n)
+        win_count += np.bincount(winners.ravel(), minlength=num_candidates)
+        if timer is not None:
+            timer.lap("tally", start_time)
+    else:
+        for _ in range(start, stop):
+            winners = compute_winner(contest,
+                                     None,
+                                     vote_for_n,
+                                     None,
+                                     county_rs=county_rs,
+                                     timer=timer)
+            for winner in winners:
+                win_count[winner] += 1
+    return win_count
+
+
+##############################################################################
+## Vectorized simulation engine
+##############################################################################
+
+def dirichlet_multinomial_batch(sample_tally, total_num_votes,
+                                num_trials, rs, timer=None):
+    """
+    Vectorized version of dirichlet_multinomial: draw num_trials
+    independent simulations of the unsampled votes of one county at once.
+
+    Input Parameters:
+
+    -sample_tally and total_num_votes are as for dirichlet_multinomial.
+
+    -num_trials is the number of simulations to draw.
+
+    -rs is a numpy.random.Generator used for all the random draws.
+    (A RandomState will not do, as its multinomial method only draws
+    one sample per call.)
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -nonsample_tallies is a numpy array of int64 of shape
+    (num_trials, candidates), each row of which sums up to
+    total_num_votes - sample_size.
+    """
+
+    sample_tally = np.asarray(sample_tally, dtype=np.int64)
+    sample_size = int(sample_tally.sum())
+    if sample_size > total_num_votes:
+        raise ValueError("total_num_votes {} less than sample_size {}."
+                         .format(total_num_votes, sample_size))
+
+    nonsample_size = total_num_votes - sample_size
+    sample_with_prior = (sample_tally +
+                         Contest.pseudocount_for_prior).astype(np.float64)
+    return draw_nonsample_tallies(sample_with_prior, nonsample_size,
+                                  num_trials, rs, timer)
+
+
+def draw_nonsample_tallies(alphas, nonsample_size, num_trials, rs,
+                           timer=None):
+    """
+    The inner step of dirichlet_multinomial_batch: draw num_trials
+    simulations of the unsampled votes of a county, given the parameters
+    of its Dirichlet posterior (a row of Contest.alphas).  The other
+    parameters and the result are as for dirichlet_multinomial_batch.
+    """
+
+    if timer is not None:
+        start = time.perf_counter()
+    gamma_sample = rs.gamma(alphas, size=(num_trials, len(alphas)))
+    gamma_sample /= gamma_sample.sum(axis=1, keepdims=True)
+    if timer is not None:
+        start = timer.lap("gamma", start)
+
+    multinomial_sample = rs.multinomial(nonsample_size, gamma_sample)
+    if timer is not None:
+        timer.lap("multinomial", start)
+    return multinomial_sample
+
+
+def simulate_block_vectorized(sample_tallies, total_num_votes,
+                              num_trials, county_rs, timer=None):
+    """
+    Simulate the final tallies of num_trials trials with array operations.
+    Each county's unsampled votes are drawn for all the trials at once by
+    draw_nonsample_tallies, from that county's own random stream, and
+    added into a single (trials x candidates) array, so the memory used
+    does not grow with the number of counties.
+
+    Input Parameters:
+
+    -sample_tallies and total_num_votes are as for compute_win_probs.
+
+    -num_trials is the number of trials to simulate.
+
+    -county_rs is a list giving one numpy.random.Generator per county
+    (and per comparison stratum, see Contest).
+
+    -timer is None or a PhaseTimer, which is charged with the time spent.
+
+    Returns:
+
+    -final_tallies is a numpy array of int64 of shape
+    (num_trials, candidates); final_tallies[t, j] is the total number of
+    votes for candidate j, across all counties, in trial t.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes)
+    final_tallies = np.empty((num_trials, contest.num_candidates),
+                             dtype=np.int64)
+    final_tallies[:] = contest.sample_total
+    for i in contest.simulated_counties:
+        nonsample_tallies = draw_nonsample_tallies(
+            contest.alphas[i], contest.nonsample_sizes[i], num_trials,
+            county_rs[i], timer)
+        if timer is not None:
+            start = time.perf_counter()
+        final_tallies += nonsample_tallies
+        if timer is not None:
+            timer.lap("tally", start)
+    for i, stratum in enumerate(contest.comparison_strata,
+                                contest.num_counties):
+        final_tallies += draw_comparison_tallies(stratum, num_trials,
+                                                 county_rs[i], timer)
+    return final_tallies
+
+
+def top_n_candidates(final_tallies, vote_for_n):
+    """
+    Return the indices of the vote_for_n candidates with the largest
+    final tallies, for each row of final_tallies.  Ties are broken in
+    favor of the higher-numbered candidate, as in compute_winner.
+
+    Input Parameters:
+
+    -final_tallies is a numpy array of integers or floats whose last
+    axis is indexed by candidate.
+
+    -vote_for_n is the number of winners per row.
+
+    Returns:
+
+    -winners is a numpy array of candidate indices with the shape of
+    final_tallies, except that its last axis has length vote_for_n
+    (or the number of candidates, if that is smaller).  The winners in
+    a row are in no particular order.
+    """
+
+    num_candidates = final_tallies.shape[-1]
+    vote_for_n = min(vote_for_n, num_candidates)
+    kth = num_candidates - vote_for_n
+    if not np.issubdtype(final_tallies.dtype, np.integer):
+        # Scaled float tallies can differ by less than a candidate index,
+        # so rank them by a stable sort instead, which puts tied
+        # candidates in index order.
+        return np.argsort(final_tallies, axis=-1, kind="stable")[..., kth:]
+    # Adding the candidate index to the scaled tallies makes all keys
+    # distinct, so the partition breaks ties deterministically.
+    keys = final_tallies * num_candidates + np.arange(num_candidates)
+    return np.argpartition(keys, kth, axis=-1)[..., kth:]
+
+
+##############################################################################
+## Comparison (CVR) strata
+##############################################################################
+
+def draw_comparison_tally(stratum, rs, timer=None):
+    """
+    Draw the actual votes of the unsampled ballots of a comparison
+    stratum in one trial.
+
+    Input Parameters:
+
+    -stratum is a ComparisonStratum.
+
+    -rs and timer are as for dirichlet_multinomial.
+
+    Returns:
+
+    -nonsample_tally is a numpy array of int64 with one entry per
+    candidate, summing up to the number of unsampled ballots.
+    """
+
+    nonsample_tally = np.zeros(stratum.num_candidates, dtype=np.int64)
+    for r in range(stratum.num_candidates):
+        if stratum.nonsample_sizes[r] > 0:
+            nonsample_tally += draw_nonsample_tally(
+                stratum.alpha_rows[r], stratum.nonsample_sizes[r], rs,
+                timer)
+    return nonsample_tally
+
+
+def draw_comparison_tallies(stratum, num_trials, rs, timer=None):
+    """
+    Vectorized version of draw_comparison_tally: draw the actual votes of
+    the unsampled ballots of a comparison stratum in num_trials trials at
+    once, from a numpy.random.Generator rs.
+
+    Returns:
+
+    -nonsample_tallies is a numpy array of int64 of shape
+    (num_trials, candidates).
+    """
+
+    nonsample_tallies = np.zeros((num_trials, stratum.num_candidates),
+                                 dtype=np.int64)
+    for r in range(stratum.num_candidates):
+        if stratum.nonsample_sizes[r] > 0:
+            nonsample_tallies += draw_nonsample_tallies(
+                stratum.alphas[r], stratum.nonsample_sizes[r], num_trials,
+                rs, timer)
+    return nonsample_tallies
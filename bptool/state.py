@@ -0,0 +1,275 @@
+# bptool/state.py
+# python3
+
+"""
+Incremental audit state, which resimulates only the counties whose
+samples changed.
+"""
+
+import numpy as np
+
+from .contest import Contest, load_csv_arrays
+from .rng import AuditStreams, trial_blocks
+from .simulation import (dirichlet_multinomial_batch, draw_nonsample_tallies,
+                         top_n_candidates)
+
+
+##############################################################################
+## Incremental audit state
+##############################################################################
+
+def simulate_county_vectorized(sample_tally, total_num_votes, county_index,
+                               seed, num_trials, prior=None):
+    """
+    Simulate the unsampled votes of one county in every trial of an audit,
+    exactly as compute_win_probs does with the "vectorized" engine: block
+    by block, from the county's own stream for each block.
+
+    Input Parameters:
+
+    -sample_tally and total_num_votes are as for dirichlet_multinomial.
+
+    -county_index is the index of the county in the contest; it selects
+    the county's random streams.
+
+    -seed and num_trials are as for compute_win_probs.
+
+    -prior is None, or the county's row of the prior of its Contest; None
+    means the default pseudocount.
+
+    Returns:
+
+    -nonsample_tallies is a numpy array of int64 of shape
+    (num_trials, candidates), giving the county's simulated nonsample
+    tally in each trial.
+    """
+
+    streams = AuditStreams(seed)
+    nonsample_tallies = np.empty((num_trials, len(sample_tally)),
+                                 dtype=np.int64)
+    for block_index, start, stop in trial_blocks(num_trials):
+        rs = streams.county_stream(block_index, county_index)
+        if prior is None:
+            nonsample_tallies[start:stop] = dirichlet_multinomial_batch(
+                sample_tally, total_num_votes, stop - start, rs)
+        else:
+            nonsample_tallies[start:stop] = draw_nonsample_tallies(
+                sample_tally + prior,
+                total_num_votes - int(np.sum(sample_tally)), stop - start,
+                rs)
+    return nonsample_tallies
+
+
+class AuditState:
+    """
+    The state of a multi-county audit, kept between rounds so that new
+    sample batches only cost the simulation of the counties that changed.
+
+    The state holds every county's sample tally and total votes, and the
+    simulated final tallies (over all counties) of every trial.  Since
+    each county's simulation is drawn from its own random streams (see
+    simulate_county_vectorized), updating a county only requires
+    subtracting its old simulated contribution, which is recomputed
+    rather than stored, and adding its new one.  The final tallies are
+    thus always exactly those that compute_win_probs with the
+    "vectorized" engine, the same seed and the same num_trials would
+    simulate from scratch.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes and candidate_names are as for
+    compute_win_probs.
+
+    -county_names is a list of strings naming the counties; updates
+    identify counties by name.  If sample_tallies is a Contest, its own
+    candidate and county names are used when these are None, and its
+    prior is kept: a county keeps its prior across updates, and counties
+    added later get the default pseudocount.
+
+    -seed is a non-negative integer, or None for fresh entropy.
+
+    -num_trials is the number of trials to simulate.
+    """
+
+    def __init__(self, sample_tallies, total_num_votes, candidate_names,
+                 county_names, seed, num_trials):
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed = int(seed)
+        self.num_trials = num_trials
+        self.prior = None
+        if isinstance(sample_tallies, Contest):
+            contest = sample_tallies
+            if contest.comparison_strata:
+                raise ValueError("AuditState: contests with comparison "
+                                 "strata are not supported.")
+            sample_tallies = contest.sample_tallies
+            total_num_votes = contest.total_num_votes
+            if candidate_names is None:
+                candidate_names = contest.candidate_names
+            if county_names is None:
+                county_names = contest.county_names
+            if contest.prior is not None:
+                self.prior = np.array(contest.prior)
+        self.candidate_names = list(candidate_names)
+        self.county_names = list(county_names)
+        self.sample_tallies = np.array(sample_tallies, dtype=np.int64)
+        self.total_num_votes = np.array(total_num_votes, dtype=np.int64)
+        if len(set(self.county_names)) != len(self.county_names):
+            raise ValueError("AuditState: county names are not distinct.")
+        self.final_tallies = np.zeros(
+            (num_trials, len(self.candidate_names)), dtype=np.int64)
+        for i in range(len(self.county_names)):
+            self.final_tallies += self._county_final_tallies(i)
+
+    @classmethod
+    def from_csv(cls, path_to_csv, seed, num_trials):
+        """
+        Create the state for the contest given by a csv file in the
+        format of preprocess_csv.
+        """
+
+        return cls(Contest.from_csv(path_to_csv), None, None, None, seed,
+                   num_trials)
+
+    def _county_final_tallies(self, county_index):
+        """
+        Return the (trials x candidates) final tallies of one county: its
+        sample tally plus its simulated nonsample tally in each trial.
+        """
+
+        sample_tally = self.sample_tallies[county_index]
+        prior = None if self.prior is None else self.prior[county_index]
+        return sample_tally + simulate_county_vectorized(
+            sample_tally, int(self.total_num_votes[county_index]),
+            county_index, self.seed, self.num_trials, prior)
+
+    def update(self, sample_tallies, total_num_votes, county_names):
+        """
+        Replace the tallies of the named counties and resimulate just
+        those counties.  Counties not yet in the state are added to it.
+        Counties whose tally and total are unchanged are skipped.
+
+        Input Parameters:
+
+        -sample_tallies and total_num_votes give the new sample tally and
+        total votes of each county in county_names, as for
+        compute_win_probs.
+
+        -county_names is a list of strings naming the counties updated.
+
+        Returns:
+
+        -resimulated is the list of names of the counties resimulated.
+        """
+
+        resimulated = []
+        for name, sample_tally, total in zip(county_names, sample_tallies,
+                                             total_num_votes):
+            sample_tally = np.asarray(sample_tally, dtype=np.int64)
+            if len(sample_tally) != len(self.candidate_names):
+                raise ValueError("AuditState.update: county {} has {} "
+                                 "candidates, not {}."
+                                 .format(name, len(sample_tally),
+                                         len(self.candidate_names)))
+            if np.any(sample_tally < 0) or sample_tally.sum() > total:
+                raise ValueError("AuditState.update: county {} has a "
+                                 "negative count or a sample larger than "
+                                 "its total votes.".format(name))
+            if name in self.county_names:
+                i = self.county_names.index(name)
+                if (self.prior is not None and
+                        not (sample_tally + self.prior[i] > 0).all()):
+                    raise ValueError("AuditState.update: the prior of "
+                                     "county {} leaves non-positive "
+                                     "Dirichlet parameters for the sample "
+                                     "tally {}.".format(
+                                         name, sample_tally.tolist()))
+                if (self.total_num_votes[i] == total and
+                        np.array_equal(self.sample_tallies[i], sample_tally)):
+                    continue
+                old_final_tallies = self._county_final_tallies(i)
+                self.sample_tallies[i] = sample_tally
+                self.total_num_votes[i] = total
+                self.final_tallies -= old_final_tallies
+                self.final_tallies += self._county_final_tallies(i)
+            else:
+                i = len(self.county_names)
+                self.county_names.append(name)
+                self.sample_tallies = np.vstack([self.sample_tallies,
+                                                 sample_tally])
+                self.total_num_votes = np.append(self.total_num_votes, total)
+                if self.prior is not None:
+                    self.prior = np.vstack([
+                        self.prior,
+                        np.full(len(self.candidate_names),
+                                float(Contest.pseudocount_for_prior))])
+                self.final_tallies += self._county_final_tallies(i)
+            resimulated.append(name)
+        return resimulated
+
+    def update_from_csv(self, path_to_csv):
+        """
+        Apply the county tallies in a (delta) csv file, in the format of
+        preprocess_csv, with update.  The file's candidate columns must be
+        those of the state, and it needs a County Name column.
+        """
+
+        sample_tallies, total_num_votes, candidate_names, county_names = \
+            load_csv_arrays(path_to_csv, return_county_names=True)
+        if ([name.strip() for name in candidate_names] !=
+                [name.strip() for name in self.candidate_names]):
+            raise ValueError("AuditState.update_from_csv: the candidates "
+                             "of {} are not those of the audit."
+                             .format(path_to_csv))
+        return self.update(sample_tallies, total_num_votes, county_names)
+
+    def win_probs(self, vote_for_n):
+        """
+        Return the win probabilities, as a list of pairs (i, p) as for
+        compute_win_probs, computed from the simulated final tallies.
+        """
+
+        winners = top_n_candidates(self.final_tallies, vote_for_n)
+        win_count = np.bincount(winners.ravel(),
+                                minlength=len(self.candidate_names))
+        return [(i + 1, int(win_count[i])/float(self.num_trials))
+                for i in range(len(win_count))]
+
+    def save(self, path):
+        """
+        Save the state to the .npz file path.
+        """
+
+        arrays = {}
+        if self.prior is not None:
+            arrays["prior"] = self.prior
+        with open(path, "wb") as f:
+            np.savez(f,
+                     seed=np.array(str(self.seed)),
+                     num_trials=np.array(self.num_trials),
+                     candidate_names=np.array(self.candidate_names),
+                     county_names=np.array(self.county_names),
+                     sample_tallies=self.sample_tallies,
+                     total_num_votes=self.total_num_votes,
+                     final_tallies=self.final_tallies,
+                     **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a state saved by save.
+        """
+
+        with np.load(path) as data:
+            state = cls.__new__(cls)
+            state.seed = int(str(data["seed"]))
+            state.num_trials = int(data["num_trials"])
+            state.candidate_names = [str(name)
+                                     for name in data["candidate_names"]]
+            state.county_names = [str(name) for name in data["county_names"]]
+            state.sample_tallies = data["sample_tallies"]
+            state.total_num_votes = data["total_num_votes"]
+            state.final_tallies = data["final_tallies"]
+            state.prior = data["prior"] if "prior" in data else None
+        return state
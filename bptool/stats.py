@@ -0,0 +1,147 @@
+# bptool/stats.py
+# python3
+
+"""
+Contest statistics (win, rank, pairwise and margin) in one simulation
+pass.
+"""
+
+import collections
+import concurrent.futures
+import functools
+
+import numpy as np
+
+from .contest import as_contest
+from .outcomes import simulate_final_tallies_block
+from .rng import trial_blocks
+
+
+##############################################################################
+## Contest statistics in one simulation pass
+##############################################################################
+
+# The statistics computed by compute_contest_stats.
+#  -num_trials is the number of trials.
+#  -rank_probs is a (candidates x candidates) numpy array; rank_probs[i, r]
+#   is the probability that candidate i finishes in position r (0 for
+#   first place).
+#  -win_probs maps each n of vote_for_ns to the list of pairs (i, p), as
+#   returned by compute_win_probs with vote_for_n n.
+#  -pairwise_probs is a (candidates x candidates) numpy array;
+#   pairwise_probs[i, j] is the probability that candidate i gets more
+#   votes than candidate j.
+#  -margin_quantiles maps each n of vote_for_ns (smaller than the number
+#   of candidates) to the list of quantiles, at the requested fractions,
+#   of the margin between the candidates finishing n-th and (n+1)-th.
+ContestStats = collections.namedtuple(
+    "ContestStats",
+    ["num_trials", "rank_probs", "win_probs", "pairwise_probs",
+     "margin_quantiles"])
+
+
+def contest_stats_block(sample_tallies, total_num_votes, seed, num_trials,
+                        vote_for_ns, block_index):
+    """
+    Simulate one block of trials (as simulate_final_tallies_block does)
+    and return its contribution to compute_contest_stats: the triple
+    (rank_count, beats, margins), where rank_count[i, r] and beats[i, j]
+    count trials as described for ContestStats, and margins maps each n
+    to the numpy array of the block's n-th versus (n+1)-th margins.
+    """
+
+    final_tallies = simulate_final_tallies_block(
+        sample_tallies, total_num_votes, seed, num_trials, block_index)
+    num_candidates = final_tallies.shape[1]
+    # Rank with the same tie-breaking as top_n_candidates.
+    keys = final_tallies * num_candidates + np.arange(num_candidates)
+    order = np.argsort(keys, axis=1)[:, ::-1]
+    rank_count = np.bincount(
+        (order * num_candidates + np.arange(num_candidates)).ravel(),
+        minlength=num_candidates * num_candidates
+    ).reshape(num_candidates, num_candidates)
+    beats = (final_tallies[:, :, None] >
+             final_tallies[:, None, :]).sum(axis=0)
+    sorted_tallies = np.take_along_axis(final_tallies, order, axis=1)
+    margins = {n: sorted_tallies[:, n - 1] - sorted_tallies[:, n]
+               for n in vote_for_ns if n < num_candidates}
+    return rank_count, beats, margins
+
+
+def compute_contest_stats(sample_tallies,
+                          total_num_votes,
+                          seed,
+                          num_trials,
+                          candidate_names,
+                          vote_for_ns=(1,),
+                          quantiles=(0.05, 0.5, 0.95),
+                          workers=1):
+    """
+    Compute, from a single simulation pass, the win probabilities for
+    several values of vote_for_n, the probability that each candidate
+    beats each other, the distribution of each candidate's rank, and
+    quantiles of the deciding margins.  This replaces separate runs of
+    compute_win_probs for each vote_for_n and for each pair of
+    candidates.
+
+    The trials are those of compute_win_probs with the "vectorized"
+    engine and the same seed and num_trials, so win_probs[n] equals its
+    result for vote_for_n n.
+
+    Input Parameters:
+
+    -sample_tallies, total_num_votes, seed, num_trials, candidate_names
+    and workers are as for compute_win_probs.
+
+    -vote_for_ns is a sequence of values of vote_for_n.
+
+    -quantiles is a sequence of fractions between 0 and 1 at which the
+    margin quantiles are computed.
+
+    Returns:
+
+    -stats is a ContestStats.
+    """
+
+    contest = as_contest(sample_tallies, total_num_votes, candidate_names)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    num_candidates = contest.num_candidates
+    blocks = trial_blocks(num_trials)
+    run_block = functools.partial(contest_stats_block, contest, None,
+                                  seed, num_trials, tuple(vote_for_ns))
+    rank_count = np.zeros((num_candidates, num_candidates), dtype=np.int64)
+    beats = np.zeros((num_candidates, num_candidates), dtype=np.int64)
+    margins = {n: np.empty(num_trials, dtype=np.int64)
+               for n in vote_for_ns if n < num_candidates}
+    workers = min(workers, len(blocks))
+    executor = None
+    try:
+        if workers <= 1:
+            results = map(run_block, range(len(blocks)))
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            results = executor.map(run_block, range(len(blocks)))
+        for (_, start, stop), result in zip(blocks, results):
+            block_rank_count, block_beats, block_margins = result
+            rank_count += block_rank_count
+            beats += block_beats
+            for n in margins:
+                margins[n][start:stop] = block_margins[n]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    rank_probs = rank_count / float(num_trials)
+    win_probs = {}
+    for n in vote_for_ns:
+        wins = rank_count[:, :n].sum(axis=1)
+        win_probs[n] = [(i + 1, int(wins[i])/float(num_trials))
+                        for i in range(num_candidates)]
+    margin_quantiles = {}
+    for n in margins:
+        sorted_margins = np.sort(margins[n])
+        margin_quantiles[n] = [int(sorted_margins[int(q * (num_trials - 1))])
+                               for q in quantiles]
+    return ContestStats(num_trials, rank_probs, win_probs,
+                        beats / float(num_trials), margin_quantiles)
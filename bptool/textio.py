@@ -0,0 +1,368 @@
+# bptool/textio.py
+# python3
+
+"""
+Printing results, and parsing csv files, with the standard library
+only, so that these routines load quickly.
+"""
+
+import csv
+import sys
+
+
+##############################################################################
+## Routines for command-line interface and file (csv) input
+##############################################################################
+
+def print_results(candidate_names, win_probs, vote_for_n):
+    """
+    Given list of candidate_names and win_probs pairs, print summary
+    of the Bayesian audit simulations.
+
+    Input Parameters:
+
+    -candidate_names is an ordered list of strings, containing the name of
+    every candidate in the contest we are auditing.
+
+    -win_probs is a list of pairs (i, p) where p is the fractional
+    representation of the number of trials that candidate i has won
+    out of the num_trials simulations.
+
+    -vote_for_n is an integer, parsed from the command-line args. Its default
+    value is 1, which means we only calculate a single winner for the election.
+    For other values n, we simulate the unnsampled votes and define a win
+    for candidate i as any time they are in the top n candidates in the final
+    tally.
+
+    Returns:
+
+    -None, but prints a summary of how often each candidate has won in
+    the simulations.
+    """
+
+    print("BPTOOL (Bayesian ballot-polling tool version 0.8)")
+
+    want_sorted_results = True
+    if want_sorted_results:
+        sorted_win_probs = sorted(
+            win_probs, key=lambda tup: tup[1], reverse=True)
+    else:
+        sorted_win_probs = win_probs
+
+    if vote_for_n == 1:
+        print("{:<24s} \t {:<s}"
+              .format("Candidate name",
+                      "Estimated probability of winning a full recount"))
+    else:
+        print("{:<24s} \t {:<s} {} {:<s}"
+              .format("Candidate name",
+                      "Estimated probability of being among the top",
+                      vote_for_n,
+                      "winners in a full recount"))
+
+    for candidate_index, prob in sorted_win_probs:
+        candidate_name = str(candidate_names[candidate_index - 1])
+        print(" {:<24s} \t  {:6.2f} %  "
+              .format(candidate_name, 100*prob))
+
+
+def print_profile(timer, elapsed, file=sys.stdout):
+    """
+    Print the phase times collected by a PhaseTimer.
+
+    Input Parameters:
+
+    -timer is a PhaseTimer.
+
+    -elapsed is the wall-clock time of the whole run, in seconds.
+
+    -file is the file to print to.
+
+    Returns:
+
+    -None, but prints the time and number of calls of each phase.
+    With several workers, the phase times add up to more than elapsed.
+    """
+
+    print("{:<12s} {:>12s} {:>12s}".format("Phase", "Seconds", "Calls"),
+          file=file)
+    for phase, stats in timer.stats().items():
+        print("{:<12s} {:12.4f} {:12d}"
+              .format(phase, stats["seconds"], stats["calls"]), file=file)
+    print("{:<12s} {:12.4f}".format("elapsed", elapsed), file=file)
+
+
+def print_contest_stats(candidate_names, stats, quantiles):
+    """
+    Print the ContestStats returned by compute_contest_stats.
+
+    Input Parameters:
+
+    -candidate_names is as for compute_win_probs.
+
+    -stats is a ContestStats.
+
+    -quantiles is the sequence of fractions the margin quantiles are for.
+
+    Returns:
+
+    -None, but prints the win probabilities for each vote_for_n, the
+    rank distribution, the pairwise probabilities and the margin
+    quantiles, as percentages.
+    """
+
+    names = [str(name).strip()[:10] for name in candidate_names]
+    print("BPTOOL (Bayesian ballot-polling tool version 0.8)")
+    print("Estimated probability of being among the top n winners "
+          "in a full recount")
+    print("{:<24s}".format("Candidate name") +
+          "".join("  {:>8s}".format("n = {}".format(n))
+                  for n in stats.win_probs))
+    for i, name in enumerate(candidate_names):
+        print(" {:<23s}".format(str(name).strip()) +
+              "".join("  {:7.2f}%".format(100 * stats.win_probs[n][i][1])
+                      for n in stats.win_probs))
+    print("Estimated probability of finishing in each place")
+    print("{:<24s}".format("Candidate name") +
+          "".join("  {:>8d}".format(r + 1) for r in range(len(names))))
+    for i, name in enumerate(candidate_names):
+        print(" {:<23s}".format(str(name).strip()) +
+              "".join("  {:7.2f}%".format(100 * p)
+                      for p in stats.rank_probs[i]))
+    print("Estimated probability that the row candidate gets more votes "
+          "than the column candidate")
+    print("{:<24s}".format("Candidate name") +
+          "".join("  {:>8s}".format(name) for name in names))
+    for i, name in enumerate(candidate_names):
+        print(" {:<23s}".format(str(name).strip()) +
+              "".join("  {:7.2f}%".format(100 * p)
+                      for p in stats.pairwise_probs[i]))
+    for n, values in stats.margin_quantiles.items():
+        print("Margin between places {} and {}, quantiles {}: {}"
+              .format(n, n + 1, list(quantiles), values))
+
+
+def print_plan(candidate_names, county_names, sample_tallies, plan,
+               risk_limit):
+    """
+    Print the sample-size plan returned by plan_sample_sizes.
+
+    Input Parameters:
+
+    -candidate_names and sample_tallies are as for compute_win_probs.
+
+    -county_names is a list of strings naming the counties.
+
+    -plan is the dict returned by plan_sample_sizes.
+
+    -risk_limit is the risk limit the plan was made for.
+
+    Returns:
+
+    -None, but prints the expected number of additional ballots to sample
+    in each county.
+    """
+
+    print("BPTOOL (Bayesian ballot-polling tool version 0.8)")
+    print("Leading candidate(s): {}; current upper risk {:.2f} %"
+          .format(", ".join(str(candidate_names[i]).strip()
+                            for i in plan["leaders"]),
+                  100 * plan["current_upper_risk"]))
+    print("{:<24s} \t {:>12s} \t {:<s}"
+          .format("County name", "Sampled",
+                  "Expected additional ballots to reach the risk limit"))
+    for i, county_name in enumerate(county_names):
+        print(" {:<24s} \t {:>12d} \t {:12.1f}"
+              .format(str(county_name), int(sum(sample_tallies[i])),
+                      plan["expected_increment"][i]))
+    print("Median total additional ballots: {:.0f}"
+          .format(plan["median_total_increment"]))
+    print("Probability of reaching the {:.2f} % risk limit before a full "
+          "hand count: {:.2f} %"
+          .format(100 * risk_limit,
+                  100 * plan["probability_reaching_limit"]))
+
+
+def print_pooling(report, num_counties, num_simulated, file=sys.stdout):
+    """
+    Print the report of pool_counties.
+
+    Input Parameters:
+
+    -report is the list of PooledStratum returned by pool_counties.
+
+    -num_counties is the number of counties before pooling.
+
+    -num_simulated is the number of counties (and strata) of the pooled
+    contest that are simulated in every trial.
+
+    -file is the file to print to.
+
+    Returns:
+
+    -None, but prints the size and cost of every pooled stratum.
+    """
+
+    print("{:<24s} {:>10s} {:>12s} {:>10s} {:>12s} {:>12s}"
+          .format("Stratum", "Counties", "Votes", "Sampled",
+                  "Draws/trial", "Draws saved"), file=file)
+    for stratum in report:
+        print("{:<24s} {:>10d} {:>12d} {:>10d} {:>12d} {:>12d}"
+              .format(str(stratum.name)[:24], stratum.num_counties,
+                      stratum.total_num_votes, stratum.sample_size,
+                      stratum.draws_per_trial, stratum.draws_saved),
+              file=file)
+    print("Dirichlet-multinomial draws per trial: {} instead of {}"
+          .format(num_simulated, num_counties), file=file)
+
+
+def print_rare_win_probs(candidate_names, estimates, vote_for_n):
+    """
+    Print the RareWinProb estimates returned by compute_rare_win_probs.
+
+    Input Parameters:
+
+    -candidate_names and vote_for_n are as for compute_win_probs.
+
+    -estimates is a list of RareWinProb.
+
+    Returns:
+
+    -None, but prints each candidate's estimated probability of winning,
+    with its standard error, in scientific notation so that small
+    probabilities remain visible.
+    """
+
+    print("BPTOOL (Bayesian ballot-polling tool version 0.8)")
+    if vote_for_n == 1:
+        print("{:<24s} \t {:<s}"
+              .format("Candidate name",
+                      "Estimated probability of winning a full recount "
+                      "(standard error; rival, tilt)"))
+    else:
+        print("{:<24s} \t {:<s} {} {:<s}"
+              .format("Candidate name",
+                      "Estimated probability of being among the top",
+                      vote_for_n,
+                      "winners in a full recount (standard error; "
+                      "rival, tilt)"))
+    for estimate in sorted(estimates, key=lambda e: e.probability,
+                           reverse=True):
+        rival = ""
+        if estimate.rival is not None:
+            rival = "; {}, {:.2f}".format(
+                str(candidate_names[estimate.rival - 1]).strip(),
+                estimate.tilt)
+        print(" {:<24s} \t  {:.3e}  ({:.1e}{})"
+              .format(str(candidate_names[estimate.candidate - 1]),
+                      estimate.probability, estimate.standard_error, rival))
+
+
+def print_scenarios(candidate_names, sweep):
+    """
+    Print the ScenarioSweep returned by compute_scenario_win_probs.
+
+    Input Parameters:
+
+    -candidate_names is as for compute_win_probs.
+
+    -sweep is a ScenarioSweep.
+
+    Returns:
+
+    -None, but prints each scenario's win probabilities, their
+    differences from the first scenario with the standard errors of the
+    differences (from the paired trials, and as they would be for
+    independent runs of the same number of trials), as percentages.
+    """
+
+    names = [str(name).strip()[:10] for name in sweep.scenario_names]
+    header = ("{:<24s}".format("Candidate name") +
+              "".join("  {:>10s}".format(name) for name in names))
+    print("BPTOOL (Bayesian ballot-polling tool version 0.8)")
+    print("Estimated probability of winning a full recount, by scenario")
+    print(header)
+    for j, name in enumerate(candidate_names):
+        print(" {:<23s}".format(str(name).strip()) +
+              "".join("  {:9.2f}%".format(100 * sweep.win_probs[s][j])
+                      for s in range(len(names))))
+    print("Difference from scenario {} (standard error: paired trials / "
+          "independent runs)".format(sweep.scenario_names[0]))
+    print(header)
+    paired_variance = independent_variance = 0.0
+    for j, name in enumerate(candidate_names):
+        row = " {:<23s}".format(str(name).strip())
+        for s in range(len(names)):
+            difference = sweep.win_probs[s][j] - sweep.win_probs[0][j]
+            row += "  {:+9.2f}%".format(100 * difference)
+        print(row)
+        row = " " * 36
+        for s in range(1, len(names)):
+            paired = sweep.difference_standard_errors[s][0][j]
+            independent = (sweep.standard_errors[s][j] ** 2 +
+                           sweep.standard_errors[0][j] ** 2) ** 0.5
+            paired_variance += paired ** 2
+            independent_variance += independent ** 2
+            row += "  {:>10s}".format("{:.2f}/{:.2f}".format(
+                100 * paired, 100 * independent))
+        if len(names) > 1:
+            print(row)
+    if paired_variance > 0:
+        print("Common random numbers reduce the variance of the "
+              "differences {:.1f}-fold".format(
+                  independent_variance / paired_variance))
+
+
+def preprocess_csv(path_to_csv):
+    """
+    Preprocess a CSV file into the correct format for our
+    sample tallies. In particular, we ignore the county name column
+    and summarize the relevant information about the sample tallies
+    in each county, the total number of votes in each county, and
+    the candidate names.
+
+    Input Parameters:
+
+    -path_to_csv is a string, representing the full path to the CSV
+    file, containing sample tallies.
+
+    Returns:
+
+    -sample_tallies is a list of lists. Each list represents the sample tally
+    for a given county. So, sample_tallies[i] represents the tally for county
+    i. Then, sample_tallies[i][j] represents the number of votes candidate
+    j receives in county i.
+
+    -total_num_votes is a list of integers representing the number of
+    ballots that were cast in this election. Each integer represents the total
+    number of votes cast in a given county. So, total_num_votes[i] represents
+    the total votes for county i.
+
+    -candidate_names is an ordered list of strings, containing the name of
+    every candidate in the contest we are auditing.
+    """
+
+    with open(path_to_csv) as csvfile:
+        sample_tallies = []
+        total_num_votes = []
+        reader = csv.DictReader(csvfile)
+        candidate_names = [col for col in reader.fieldnames
+                           if col.strip().lower() not in
+                           ["county name", "total votes"]]
+        for row in reader:
+            sample_tally = []
+            for key in row:
+                if key.strip().lower() == "county name":
+                    continue
+                if key.strip().lower() == "total votes":
+                    total_num_votes.append(int(row[key]))
+                else:
+                    count = int(row[key].strip())
+                    assert count >= 0
+                    sample_tally.append(count)
+            sample_tallies.append(sample_tally)
+
+    for i, sample_tally in enumerate(sample_tallies):
+        assert 0 <= sum(sample_tally) <= total_num_votes[i]
+
+    return sample_tallies, total_num_votes, candidate_names
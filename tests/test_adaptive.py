@@ -0,0 +1,34 @@
+# tests/test_adaptive.py
+# python3
+
+"""
+Tests of the adaptive simulation (compute_win_probs_adaptive).
+"""
+
+import bptool
+
+
+def test_clear_contest_stops_after_first_batch():
+    for engine in bptool.ENGINES:
+        _, trials_used = bptool.compute_win_probs_adaptive(
+            [[300, 200, 50]], [100000], 3, 10000, None, 1,
+            target_width=0.05, risk_limit=0.05, engine=engine)
+        assert trials_used == bptool.ADAPTIVE_BATCH_TRIALS
+
+
+def test_loop_engine_runs_a_prefix_of_compute_win_probs():
+    win_probs, trials_used = bptool.compute_win_probs_adaptive(
+        [[51, 49]], [100000], 3, 10000, None, 1, target_width=0.03)
+    assert trials_used % bptool.ADAPTIVE_BATCH_TRIALS == 0
+    assert bptool.TRIALS_PER_BLOCK < trials_used < 10000
+    assert win_probs == bptool.compute_win_probs(
+        [[51, 49]], [100000], 3, trials_used, None, 1)
+
+
+def test_result_does_not_depend_on_workers():
+    for engine in bptool.ENGINES:
+        results = [bptool.compute_win_probs_adaptive(
+            [[51, 49], [20, 25]], [100000, 50000], 3, 10000, None, 1,
+            target_width=0.03, engine=engine, workers=workers)
+                   for workers in (1, 3)]
+        assert results[0] == results[1]
@@ -0,0 +1,61 @@
+# tests/test_analytic.py
+# python3
+
+"""
+Tests of the analytic approximation (compute_win_probs_analytic).
+"""
+
+import numpy as np
+
+import bptool
+
+
+def approximate_probs(contest, rs, num_samples):
+    """
+    Redo the Dirichlet approximation of compute_win_probs_analytic for a
+    single-county contest, with the given random stream.
+    """
+
+    shares = rs.dirichlet(contest.alphas[0], size=num_samples)
+    final_tallies = (contest.sample_tallies[0] +
+                     contest.nonsample_sizes[0] * shares)
+    winners = bptool.top_n_candidates(final_tallies, 1)
+    return (np.bincount(winners.ravel(), minlength=contest.num_candidates)
+            / float(num_samples)).tolist()
+
+
+def test_approximation_is_independent_of_check_run():
+    contest = bptool.Contest([[40, 35, 25]], [2000])
+    seed = 7
+    win_probs, _ = bptool.compute_win_probs_analytic(
+        contest, None, seed, None, 1, num_samples=2000, check_trials=0)
+    probs = [prob for _, prob in win_probs]
+    streams = bptool.AuditStreams(seed)
+    # The approximation draws from a stream of its own ...
+    assert probs == approximate_probs(
+        contest, streams.stream(bptool.ANALYTIC_STREAM_KEY), 2000)
+    # ... not from the stream of the check run's (only) county.
+    assert probs != approximate_probs(contest,
+                                      streams.county_stream(0, 0), 2000)
+
+
+def test_top_n_candidates_ranks_float_tallies():
+    # Scaling by the number of candidates and adding the index, as for
+    # integer tallies, would rank 10.0 above 10.2 here.
+    final_tallies = np.array([[10.2, 10.0], [3.0, 3.4], [7.5, 7.5]])
+    winners = bptool.top_n_candidates(final_tallies, 1)
+    assert winners.ravel().tolist() == [0, 1, 1]
+    final_tallies = np.array([[5.1, 5.3, 5.0, 5.2]])
+    winners = bptool.top_n_candidates(final_tallies, 2)
+    assert sorted(winners.ravel().tolist()) == [1, 3]
+
+
+def test_dirichlet_approximation_matches_simulation():
+    # Three candidates take the Dirichlet method.  With ten unsampled
+    # votes, the final tallies of the candidates differ by less than
+    # three, so a bias towards higher-numbered candidates would show.
+    contest = bptool.Contest([[30, 30, 30]], [100])
+    win_probs, _ = bptool.compute_win_probs_analytic(
+        contest, None, 3, None, 1, num_samples=100000, check_trials=0)
+    probs = np.array([prob for _, prob in win_probs])
+    assert np.abs(probs - 1.0 / 3.0).max() < 0.01
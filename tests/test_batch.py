@@ -0,0 +1,59 @@
+# tests/test_batch.py
+# python3
+
+"""
+Tests of the multi-contest batch runner (run_batch).
+"""
+
+import bptool
+
+
+CONTESTS = [
+    bptool.BatchContest("mayor", [[52, 48], [45, 50]], [1000, 2000],
+                        ["A", "B"], 1),
+    bptool.BatchContest("council", [[30, 25, 20, 5]], [4000],
+                        ["C", "D", "E", "F"], 2),
+    bptool.BatchContest("measure", [[10, 12], [40, 30], [5, 9]],
+                        [300, 900, 150], ["yes", "no"], 1),
+]
+
+
+def separate_runs(seed, num_trials, engine, rng_mode):
+    return [bptool.compute_win_probs(contest.sample_tallies,
+                                     contest.total_num_votes, seed,
+                                     num_trials, contest.candidate_names,
+                                     contest.vote_for_n, engine=engine,
+                                     rng_mode=rng_mode)
+            for contest in CONTESTS]
+
+
+def test_batch_equals_separate_runs():
+    for engine, rng_mode in [("loop", "streams"), ("vectorized", "streams"),
+                             ("loop", "legacy")]:
+        num_trials = 300 if rng_mode == "legacy" else 4500
+        expected = separate_runs(5, num_trials, engine, rng_mode)
+        for workers in (1, 2):
+            assert bptool.run_batch(CONTESTS, 5, num_trials, engine=engine,
+                                    rng_mode=rng_mode,
+                                    workers=workers) == expected
+
+
+def test_long_format_file(tmp_path):
+    path = tmp_path / "contests.csv"
+    path.write_text("contest,county name,total votes,candidate,votes,"
+                    "vote for n\n"
+                    "mayor,1,1000,A,52,1\n"
+                    "mayor,1,1000,B,48,1\n"
+                    "mayor,2,2000,A,45,1\n"
+                    "mayor,2,2000,B,50,1\n"
+                    "council,1,4000,C,30,2\n"
+                    "council,1,4000,D,25,2\n"
+                    "council,1,4000,E,20,2\n"
+                    "council,1,4000,F,5,2\n")
+    contests = bptool.read_batch_file(str(path))
+    assert [contest.name for contest in contests] == ["mayor", "council"]
+    for contest, expected in zip(contests, CONTESTS):
+        assert contest.sample_tallies.tolist() == expected.sample_tallies
+        assert contest.total_num_votes.tolist() == expected.total_num_votes
+        assert contest.candidate_names == expected.candidate_names
+        assert contest.vote_for_n == expected.vote_for_n
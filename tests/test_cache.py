@@ -0,0 +1,85 @@
+# tests/test_cache.py
+# python3
+
+"""
+Tests of the result cache (ResultCache).
+"""
+
+import os
+
+import numpy as np
+
+import bptool
+
+
+SAMPLE_TALLIES = [[52, 48], [45, 50]]
+TOTAL_NUM_VOTES = [1000, 2000]
+
+
+def cached_win_probs(cache, seed):
+    return cache.compute_win_probs(SAMPLE_TALLIES, TOTAL_NUM_VOTES, seed,
+                                   500, None, 1, engine="vectorized")
+
+
+def test_hits_and_misses():
+    cache = bptool.ResultCache()
+    first = cached_win_probs(cache, 1)
+    assert first == bptool.compute_win_probs(
+        SAMPLE_TALLIES, TOTAL_NUM_VOTES, 1, 500, None, 1,
+        engine="vectorized")
+    assert cached_win_probs(cache, 1) == first
+    cached_win_probs(cache, 2)
+    assert (cache.hits, cache.misses) == (1, 2)
+    # Calls with seed None are never cached.
+    cached_win_probs(cache, None)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_key_ignores_the_form_of_the_tallies():
+    keys = {bptool.ResultCache.key(tallies, totals, 1, 500, 1,
+                                   "vectorized", "streams")
+            for tallies, totals in [
+                (SAMPLE_TALLIES, TOTAL_NUM_VOTES),
+                (np.array(SAMPLE_TALLIES, dtype=np.int32),
+                 np.array(TOTAL_NUM_VOTES)),
+                (bptool.Contest(SAMPLE_TALLIES, TOTAL_NUM_VOTES), None)]}
+    assert len(keys) == 1
+    assert bptool.ResultCache.key(SAMPLE_TALLIES, TOTAL_NUM_VOTES, 2, 500,
+                                  1, "vectorized", "streams") not in keys
+
+
+def test_memory_is_least_recently_used():
+    cache = bptool.ResultCache(max_entries=2)
+    cache.put("a", [(1, 0.5)])
+    cache.put("b", [(1, 0.6)])
+    assert cache.get("a") == [(1, 0.5)]
+    cache.put("c", [(1, 0.7)])
+    # "b" was the least recently used.
+    assert cache.get("b") is None
+    assert cache.get("a") == [(1, 0.5)]
+    assert cache.get("c") == [(1, 0.7)]
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_directory_persists_and_evicts_least_recently_used(tmp_path):
+    directory = str(tmp_path)
+    cache = bptool.ResultCache(directory=directory)
+    result = cached_win_probs(cache, 1)
+    # A new cache (as in a new run) finds the result on disk.
+    cache = bptool.ResultCache(directory=directory)
+    assert cached_win_probs(cache, 1) == result
+    assert (cache.hits, cache.misses) == (1, 0)
+
+    file_size = os.path.getsize(os.path.join(directory,
+                                             os.listdir(directory)[0]))
+    directory = str(tmp_path / "small")
+    cache = bptool.ResultCache(max_entries=1, directory=directory,
+                               max_bytes=2 * file_size)
+    for age, key in enumerate(["old", "new"]):
+        cache.put(key, result)
+        path = os.path.join(directory, key + ".json")
+        os.utime(path, (1000 + age, 1000 + age))
+    # Reading "old" from disk makes it the most recently used file.
+    assert cache.get("old") == result
+    cache.put("newest", result)
+    assert sorted(os.listdir(directory)) == ["newest.json", "old.json"]
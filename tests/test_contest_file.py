@@ -0,0 +1,99 @@
+# tests/test_contest_file.py
+# python3
+
+"""
+Tests of binary contest files: read_contest_file must give back the
+Contest written by write_contest_file, comparison strata and prior
+included.
+"""
+
+import pickle
+
+import numpy as np
+import pytest
+
+import bptool
+
+
+def full_contest():
+    """
+    Return a contest with three polling counties, a per-county prior and
+    two comparison strata.
+    """
+
+    strata = [bptool.ComparisonStratum("Cvr east", [500, 400, 50],
+                                       [[40, 1, 0], [2, 30, 0], [0, 0, 5]]),
+              bptool.ComparisonStratum("Cvr west", [300, 350, 20],
+                                       [[20, 0, 1], [1, 25, 0], [0, 0, 2]],
+                                       match_pseudocount=10,
+                                       error_pseudocount=0.5)]
+    prior = [[0.5, 0.5, 0.5], [2.0, 1.0, 0.25], [1.0, 1.0, 1.0]]
+    return bptool.Contest([[52, 48, 5], [45, 50, 3], [0, 0, 0]],
+                          [1000, 2000, 300], ["Alice", "Bob", "Write-in"],
+                          ["Adams", "Clark", "Dodge"], strata, prior)
+
+
+def assert_same_contest(contest, expected):
+    assert contest.candidate_names == expected.candidate_names
+    assert contest.county_names == expected.county_names
+    assert np.array_equal(contest.sample_tallies, expected.sample_tallies)
+    assert np.array_equal(contest.total_num_votes, expected.total_num_votes)
+    assert np.array_equal(contest.prior, expected.prior)
+    assert np.array_equal(contest.alphas, expected.alphas)
+    assert len(contest.comparison_strata) == len(expected.comparison_strata)
+    for stratum, expected_stratum in zip(contest.comparison_strata,
+                                         expected.comparison_strata):
+        assert stratum.name == expected_stratum.name
+        assert np.array_equal(stratum.reported_tally,
+                              expected_stratum.reported_tally)
+        assert np.array_equal(stratum.sample_matrix,
+                              expected_stratum.sample_matrix)
+        assert np.array_equal(stratum.alphas, expected_stratum.alphas)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, mmap):
+    expected = full_contest()
+    path = str(tmp_path / "contest.bin")
+    bptool.write_contest_file(path, expected)
+    contest = bptool.read_contest_file(path, mmap=mmap)
+    assert_same_contest(contest, expected)
+    assert (contest.path is not None) == mmap
+    for engine in ("loop", "vectorized"):
+        assert bptool.compute_win_probs(contest, None, 5, 3000, None, 1,
+                                        engine=engine) == \
+            bptool.compute_win_probs(expected, None, 5, 3000, None, 1,
+                                     engine=engine)
+
+
+def test_memory_mapped_contest_pickles_as_its_path(tmp_path):
+    expected = full_contest()
+    path = str(tmp_path / "contest.bin")
+    bptool.write_contest_file(path, expected)
+    contest = pickle.loads(pickle.dumps(bptool.read_contest_file(path)))
+    assert_same_contest(contest, expected)
+
+
+def test_contest_without_strata_or_prior(tmp_path):
+    expected = bptool.Contest([[5, 3], [7, 1]], [100, 80])
+    path = str(tmp_path / "contest.bin")
+    bptool.write_contest_file(path, expected)
+    contest = bptool.read_contest_file(path)
+    assert contest.prior is None
+    assert contest.comparison_strata == []
+    assert np.array_equal(contest.alphas, expected.alphas)
+
+
+def test_bad_files(tmp_path):
+    path = str(tmp_path / "contest.bin")
+    bptool.write_contest_file(path, full_contest())
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-8])
+    with pytest.raises(ValueError):
+        bptool.read_contest_file(path, mmap=False)
+    with open(path, "wb") as f:
+        f.write(b"not a contest file")
+    with pytest.raises(ValueError):
+        bptool.read_contest_file(path)
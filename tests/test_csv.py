@@ -0,0 +1,35 @@
+# tests/test_csv.py
+# python3
+
+"""
+Tests of the fast csv loader (load_csv_arrays) against preprocess_csv.
+"""
+
+import bptool
+
+
+CSV_TEXT = ('County Name,Total Votes,Alice,Bob\n'
+            'Ward #1,1000,30,15\n'
+            '"Adams, East",2000,25,40\n'
+            '# 3,500,5,5\n')
+
+
+def test_load_csv_arrays_matches_preprocess_csv(tmp_path):
+    path = tmp_path / "contest.csv"
+    path.write_text(CSV_TEXT)
+    sample_tallies, total_num_votes, candidate_names, county_names = \
+        bptool.load_csv_arrays(str(path), return_county_names=True)
+    expected = bptool.preprocess_csv(str(path))
+    assert sample_tallies.tolist() == expected[0]
+    assert total_num_votes.tolist() == expected[1]
+    assert candidate_names == expected[2]
+    assert county_names == ["Ward #1", "Adams, East", "# 3"]
+
+
+def test_load_csv_arrays_chunks(tmp_path):
+    path = tmp_path / "contest.csv"
+    path.write_text(CSV_TEXT)
+    chunked = bptool.load_csv_arrays(str(path), chunk_rows=1)
+    whole = bptool.load_csv_arrays(str(path))
+    assert chunked[0].tolist() == whole[0].tolist()
+    assert chunked[1].tolist() == whole[1].tolist()
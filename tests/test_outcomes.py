@@ -0,0 +1,75 @@
+# tests/test_outcomes.py
+# python3
+
+"""
+Tests of recorded trial outcomes: record_trial_outcomes must agree with
+compute_win_probs, and the chunked statistics of TrialOutcomes with the
+same statistics computed in memory.
+"""
+
+import numpy as np
+import pytest
+
+import bptool
+
+
+SAMPLE_TALLIES = [[52, 48, 5], [45, 50, 3], [10, 12, 1]]
+TOTAL_NUM_VOTES = [100000, 20000, 3000]
+NUM_TRIALS = 5000
+
+
+@pytest.fixture(scope="module")
+def recorded(tmp_path_factory):
+    """
+    Record the outcomes of a contest, and return the directory, the
+    win_probs returned, and the final tallies simulated in memory.
+    """
+
+    directory = str(tmp_path_factory.mktemp("outcomes"))
+    win_probs = bptool.record_trial_outcomes(
+        SAMPLE_TALLIES, TOTAL_NUM_VOTES, 11, NUM_TRIALS, None, 1, directory,
+        workers=2)
+    final_tallies = np.concatenate([
+        bptool.simulate_final_tallies_block(SAMPLE_TALLIES, TOTAL_NUM_VOTES,
+                                            11, NUM_TRIALS, block_index)
+        for block_index in range(len(bptool.trial_blocks(NUM_TRIALS)))])
+    return directory, win_probs, final_tallies
+
+
+def test_win_probs_equal_compute_win_probs(recorded):
+    directory, win_probs, _ = recorded
+    expected = bptool.compute_win_probs(SAMPLE_TALLIES, TOTAL_NUM_VOTES, 11,
+                                        NUM_TRIALS, None, 1,
+                                        engine="vectorized")
+    assert win_probs == expected
+    assert bptool.TrialOutcomes(directory).win_probs() == expected
+
+
+@pytest.mark.parametrize("chunk_trials", [2 ** 16, 777])
+@pytest.mark.parametrize("candidate", [0, 2, None])
+def test_statistics_equal_in_memory(recorded, chunk_trials, candidate):
+    directory, _, final_tallies = recorded
+    outcomes = bptool.TrialOutcomes(directory, chunk_trials=chunk_trials)
+    if candidate is None:
+        values = bptool.trial_margins(final_tallies)
+    else:
+        values = final_tallies[:, candidate]
+    assert np.array_equal(outcomes.column(candidate), values)
+
+    qs = [0.0, 0.01, 0.25, 0.5, 0.9, 0.999, 1.0]
+    sorted_values = np.sort(values)
+    assert outcomes.quantiles(qs, candidate) == [
+        int(sorted_values[int(q * (NUM_TRIALS - 1))]) for q in qs]
+
+    counts, edges = outcomes.histogram(candidate, bins=30)
+    expected_counts, expected_edges = np.histogram(values, bins=30)
+    assert np.array_equal(counts, expected_counts)
+    assert np.array_equal(edges, expected_edges)
+
+
+def test_pairwise_win_probs_equal_in_memory(recorded):
+    directory, _, final_tallies = recorded
+    outcomes = bptool.TrialOutcomes(directory, chunk_trials=777)
+    expected = ((final_tallies[:, :, None] > final_tallies[:, None, :])
+                .mean(axis=0))
+    assert np.array_equal(outcomes.pairwise_win_probs(), expected)
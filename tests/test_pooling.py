@@ -0,0 +1,73 @@
+# tests/test_pooling.py
+# python3
+
+"""
+Tests of pooled contests (pool_counties): every mode must simulate a
+pooled stratum from its prior, as the "vectorized" engine does.
+"""
+
+import numpy as np
+
+import bptool
+
+
+def pooled_contest():
+    """
+    Return a contest of 60 precincts, most with tiny samples, pooled at
+    max_sample_size 3, with one precinct alone in its stratum.
+    """
+
+    rs = np.random.default_rng(2018)
+    sample_sizes = rs.integers(0, 4, size=60)
+    sample_sizes[:6] = 40
+    sample_tallies = np.array(
+        [rs.multinomial(n, [0.46, 0.44, 0.10]) for n in sample_sizes])
+    total_num_votes = sample_sizes + rs.integers(200, 400, size=60)
+    total_num_votes[6] = sample_sizes[6]
+    pool_keys = ["east"] * 30 + ["west"] * 29 + ["north"]
+    contest, _ = bptool.pool_counties(sample_tallies, total_num_votes,
+                                      ["A", "B", "C"], max_sample_size=3,
+                                      pool_keys=pool_keys)
+    return contest
+
+
+def engine_win_probs(contest, seed, num_trials):
+    return bptool.compute_win_probs(contest, None, seed, num_trials, None, 1,
+                                    engine="vectorized")
+
+
+def test_one_county_strata_are_not_pooled():
+    contest = pooled_contest()
+    assert "pooled north" not in contest.county_names
+    assert contest.county_names[-3:] == ["pooled east", "pooled west",
+                                         "fully audited"]
+    assert contest.num_counties == 6 + 1 + 3
+
+
+def test_scenarios_use_the_prior():
+    contest = pooled_contest()
+    sweep = bptool.compute_scenario_win_probs(
+        contest, None, 5, 2000, None, [bptool.Scenario("baseline")])
+    assert sweep.win_probs[0].tolist() == [
+        prob for _, prob in engine_win_probs(contest, 5, 2000)]
+
+
+def test_audit_state_uses_the_prior():
+    contest = pooled_contest()
+    state = bptool.AuditState(contest, None, None, None, 5, 2000)
+    assert state.win_probs(1) == engine_win_probs(contest, 5, 2000)
+
+
+def test_plan_risk_uses_the_prior():
+    contest = pooled_contest()
+    # At level 0 (no extra ballots), with the streams of the engine's
+    # first block, level_upper_risk redoes the engine's trials.
+    county_rs = bptool.AuditStreams(5).county_streams(0,
+                                                      contest.num_counties)
+    gammas = {i: county_rs[i].gamma(contest.alphas[i], size=(2000, 3))
+              for i in contest.simulated_counties}
+    risk = bptool.level_upper_risk(
+        contest, np.zeros_like(contest.sample_tallies),
+        contest.nonsample_sizes, gammas, county_rs, 2000, 1, [0])
+    assert risk == bptool.upper_risk(engine_win_probs(contest, 5, 2000),
+                                     [0])
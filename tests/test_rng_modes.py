@@ -0,0 +1,69 @@
+# tests/test_rng_modes.py
+# python3
+
+"""
+Tests pinning the results of compute_win_probs for fixed seeds: in
+"legacy" mode, to those of the original bptool (version 0.8), which is
+what the mode exists for, and in "streams" mode, to those recorded when
+the streams were introduced.
+"""
+
+import pytest
+
+import bptool
+
+
+# Each case is (sample_tallies, total_num_votes, seed, num_trials,
+# vote_for_n, win counts of the original bptool).
+LEGACY_CASES = [
+    ([[52, 48], [45, 50], [10, 12]], [1000, 2000, 300], 1, 500, 1,
+     [184, 316]),
+    ([[60, 50, 30]], [10000], 7, 300, 2, [299, 297, 4]),
+    ([[30, 25, 20, 5]], [4000], 123456789, 400, 1, [296, 76, 28, 0]),
+]
+
+# Each case is (sample_tallies, total_num_votes, seed, num_trials,
+# vote_for_n, engine, recorded win counts).
+STREAMS_CASES = [
+    ([[52, 48], [45, 50], [10, 12]], [1000, 2000, 300], 1, 3000, 1,
+     "loop", [1051, 1949]),
+    ([[52, 48], [45, 50], [10, 12]], [1000, 2000, 300], 1, 3000, 1,
+     "vectorized", [970, 2030]),
+    ([[60, 50, 30]], [10000], 7, 300, 2, "vectorized", [300, 297, 3]),
+]
+
+
+def win_counts(win_probs, num_trials):
+    return [round(prob * num_trials) for _, prob in win_probs]
+
+
+@pytest.mark.parametrize("case", LEGACY_CASES)
+def test_legacy_mode_reproduces_original_bptool(case):
+    sample_tallies, total_num_votes, seed, num_trials, vote_for_n, \
+        expected = case
+    candidate_names = list(range(1, len(expected) + 1))
+    for workers in (1, 2):
+        win_probs = bptool.compute_win_probs(
+            sample_tallies, total_num_votes, seed, num_trials,
+            candidate_names, vote_for_n, engine="loop", rng_mode="legacy",
+            workers=workers)
+        assert win_probs == [(i + 1, count / float(num_trials))
+                             for i, count in enumerate(expected)]
+
+
+def test_vectorized_engine_rejects_legacy_mode():
+    # The legacy mode reseeds every county in every trial, which the
+    # vectorized engine cannot do; it must refuse rather than differ.
+    with pytest.raises(ValueError):
+        bptool.compute_win_probs([[60, 50, 30]], [10000], 7, 300, None, 2,
+                                 engine="vectorized", rng_mode="legacy")
+
+
+@pytest.mark.parametrize("case", STREAMS_CASES)
+def test_streams_mode_is_stable(case):
+    sample_tallies, total_num_votes, seed, num_trials, vote_for_n, \
+        engine, expected = case
+    win_probs = bptool.compute_win_probs(
+        sample_tallies, total_num_votes, seed, num_trials, None,
+        vote_for_n, engine=engine)
+    assert win_counts(win_probs, num_trials) == expected
@@ -0,0 +1,156 @@
+# tests/test_service.py
+# python3
+
+"""
+Tests of the audit service: a round trip through AuditServer and
+AuditClient must give the win probabilities of compute_win_probs, and
+bad requests must be answered with status 400.
+"""
+
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+import bptool
+
+
+SAMPLE_TALLIES = [[52, 48], [45, 50], [10, 12]]
+TOTAL_NUM_VOTES = [1000, 2000, 300]
+
+
+@pytest.fixture(scope="module")
+def server_port():
+    """
+    Run an AuditServer with two workers on a free local port, in an event
+    loop of its own thread, and yield the port.
+    """
+
+    loop = asyncio.new_event_loop()
+    server = bptool.AuditServer(workers=2)
+    started = threading.Event()
+    ports = []
+
+    async def run():
+        listener = await server.start("127.0.0.1", 0)
+        ports.append(listener.sockets[0].getsockname()[1])
+        started.set()
+        async with listener:
+            await listener.serve_forever()
+
+    def run_loop():
+        task = loop.create_task(run())
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run_loop, daemon=True)
+    thread.start()
+    assert started.wait(30)
+    yield ports[0]
+    for task in asyncio.all_tasks(loop):
+        loop.call_soon_threadsafe(task.cancel)
+    thread.join(30)
+    server.executor.shutdown(cancel_futures=True)
+    loop.close()
+
+
+def raw_request(port, data):
+    """
+    Send data, as bytes, to the server and return the status and the
+    decoded JSON body of its response.
+    """
+
+    with socket.create_connection(("127.0.0.1", port), timeout=30) as s:
+        s.sendall(data)
+        s.shutdown(socket.SHUT_WR)
+        response = b""
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body.decode("utf-8"))
+
+
+def post(port, body):
+    """
+    POST body, as bytes, to /win_probs, and return the status and the
+    decoded JSON body of the response.
+    """
+
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        connection.request("POST", "/win_probs", body,
+                           {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("engine", ["vectorized", "loop"])
+def test_round_trip_equals_compute_win_probs(server_port, engine):
+    client = bptool.AuditClient(port=server_port, timeout=60)
+    win_probs = client.win_probs(SAMPLE_TALLIES, TOTAL_NUM_VOTES, seed=3,
+                                 num_trials=5000, engine=engine)
+    contest = bptool.Contest(SAMPLE_TALLIES, TOTAL_NUM_VOTES)
+    assert win_probs == bptool.compute_win_probs(
+        contest, None, 3, 5000, None, 1, engine=engine)
+
+
+def test_streamed_round_trip(server_port):
+    client = bptool.AuditClient(port=server_port, timeout=60)
+    events = []
+    win_probs = client.win_probs(SAMPLE_TALLIES, TOTAL_NUM_VOTES, seed=4,
+                                 num_trials=5000, progress=events.append)
+    contest = bptool.Contest(SAMPLE_TALLIES, TOTAL_NUM_VOTES)
+    assert win_probs == bptool.compute_win_probs(
+        contest, None, 4, 5000, None, 1, engine="vectorized")
+    assert events[-1] == {"trials_done": 5000, "num_trials": 5000}
+
+
+def test_health(server_port):
+    status, body = raw_request(server_port,
+                               b"GET /health HTTP/1.1\r\n\r\n")
+    assert status == 200
+    assert body["status"] == "ok"
+
+
+def test_malformed_request(server_port):
+    status, body = raw_request(
+        server_port,
+        b"POST /win_probs HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+    assert status == 400
+    assert body == {"error": "malformed request"}
+
+
+@pytest.mark.parametrize("data", [
+    b"not json",
+    json.dumps([1, 2]).encode("utf-8"),
+    json.dumps({"sample_tallies": SAMPLE_TALLIES}).encode("utf-8"),
+    json.dumps({"sample_tallies": [[5, 5]],
+                "total_num_votes": [3]}).encode("utf-8"),
+    json.dumps({"sample_tallies": SAMPLE_TALLIES,
+                "total_num_votes": TOTAL_NUM_VOTES,
+                "seed": True}).encode("utf-8"),
+    json.dumps({"sample_tallies": SAMPLE_TALLIES,
+                "total_num_votes": TOTAL_NUM_VOTES,
+                "engine": "vectorized",
+                "rng_mode": "legacy"}).encode("utf-8"),
+])
+def test_invalid_body(server_port, data):
+    status, body = post(server_port, data)
+    assert status == 400
+    assert "error" in body
+
+
+def test_client_raises_value_error(server_port):
+    client = bptool.AuditClient(port=server_port, timeout=60)
+    with pytest.raises(ValueError):
+        client.win_probs(SAMPLE_TALLIES, TOTAL_NUM_VOTES, seed=True)
@@ -0,0 +1,18 @@
+# tests/test_simulation.py
+# python3
+
+"""
+Tests of compute_win_probs.
+"""
+
+import bptool
+
+
+def test_results_do_not_depend_on_workers():
+    # 5000 trials make three blocks, the last one shorter.
+    for engine in bptool.ENGINES:
+        results = [bptool.compute_win_probs(
+            [[52, 48, 5], [45, 50, 3], [10, 12, 1]], [1000, 2000, 300], 11,
+            5000, None, 1, engine=engine, workers=workers)
+                   for workers in (1, 2, 4)]
+        assert results[0] == results[1] == results[2]
@@ -0,0 +1,42 @@
+# tests/test_startup.py
+# python3
+
+"""
+Tests of the startup budget checked by benchmarks/check_startup.py:
+importing bptool, its light routines and the command-line interface for
+--help or invalid arguments must not import numpy, and must stay within
+the import-time budget.
+"""
+
+import os
+import subprocess
+import sys
+
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          os.pardir, "benchmarks")
+
+# Run in a fresh interpreter, so that the modules this test process has
+# already imported (numpy among them) do not hide anything.
+MEASURE_SCRIPT = """
+import sys
+sys.path.insert(0, {benchmarks!r})
+import check_startup
+_, baseline = check_startup.import_times(["-c", "pass"])
+for name, case_args in check_startup.CASES:
+    ms, modules = check_startup.measure(case_args, baseline, 3)
+    print("{{}}|{{}}|{{}}|{{}}".format(name, ms, check_startup.BUDGET_MS,
+                                   " ".join(modules)))
+"""
+
+
+def test_startup_does_not_import_numpy_and_is_within_budget():
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SCRIPT.format(benchmarks=BENCHMARKS)],
+        capture_output=True, text=True, check=True).stdout
+    cases = [line.split("|") for line in output.splitlines()]
+    assert len(cases) == 4
+    for name, ms, budget_ms, modules in cases:
+        assert not any(module == "numpy" or module.startswith("numpy.")
+                       for module in modules.split()), name
+        assert float(ms) <= float(budget_ms), name
@@ -0,0 +1,47 @@
+# tests/test_state.py
+# python3
+
+"""
+Tests of the incremental audit state (AuditState).
+"""
+
+import bptool
+
+
+SAMPLE_TALLIES = [[52, 48, 5], [45, 50, 3], [10, 12, 1]]
+TOTAL_NUM_VOTES = [1000, 2000, 300]
+COUNTY_NAMES = ["Adams", "Baker", "Clark"]
+
+
+def fresh_win_probs(sample_tallies, total_num_votes, seed, num_trials,
+                    vote_for_n=1):
+    return bptool.compute_win_probs(sample_tallies, total_num_votes, seed,
+                                    num_trials, None, vote_for_n,
+                                    engine="vectorized")
+
+
+def test_new_state_equals_fresh_run():
+    state = bptool.AuditState(SAMPLE_TALLIES, TOTAL_NUM_VOTES,
+                              ["A", "B", "C"], COUNTY_NAMES, 3, 4500)
+    for vote_for_n in (1, 2):
+        assert state.win_probs(vote_for_n) == fresh_win_probs(
+            SAMPLE_TALLIES, TOTAL_NUM_VOTES, 3, 4500, vote_for_n)
+
+
+def test_updated_state_equals_fresh_run(tmp_path):
+    state = bptool.AuditState(SAMPLE_TALLIES, TOTAL_NUM_VOTES,
+                              ["A", "B", "C"], COUNTY_NAMES, 3, 4500)
+    path = str(tmp_path / "state.npz")
+    state.save(path)
+    state = bptool.AuditState.load(path)
+    resimulated = state.update([[60, 55, 6], [10, 12, 1], [30, 20, 2]],
+                               [1000, 300, 500],
+                               ["Adams", "Clark", "Dodge"])
+    # Clark is unchanged; Dodge is new.
+    assert resimulated == ["Adams", "Dodge"]
+    sample_tallies = [[60, 55, 6], [45, 50, 3], [10, 12, 1], [30, 20, 2]]
+    total_num_votes = [1000, 2000, 300, 500]
+    expected = fresh_win_probs(sample_tallies, total_num_votes, 3, 4500)
+    assert state.win_probs(1) == expected
+    state.save(path)
+    assert bptool.AuditState.load(path).win_probs(1) == expected